@@ -0,0 +1,52 @@
+"""
+Gunicorn settings, read from the working directory whenever gunicorn starts.
+
+The worker count comes from the database connection budget, DB_POOL_SIZE.
+Each WSGI thread keeps one persistent connection (CONN_MAX_AGE), and the
+async dashboards and lists borrow up to ASYNC_QUERY_THREADS more per
+worker. Workers are therefore capped so that
+workers × (GUNICORN_THREADS + ASYNC_QUERY_THREADS) <= DB_POOL_SIZE, and no
+request ever waits on the database for a free connection.
+
+With SERVER_MODE=asgi, uvicorn workers close their connections after
+every request (see settings.py). The same cap then bounds concurrent
+requests per worker only loosely, so put PgBouncer in front of the
+database and set DB_PGBOUNCER=true.
+"""
+import multiprocessing
+import os
+
+
+pool_size = int(os.getenv('DB_POOL_SIZE', '20'))
+threads = max(int(os.getenv('GUNICORN_THREADS', '4')), 1)
+async_query_threads = int(os.getenv('ASYNC_QUERY_THREADS', '4'))
+connections_per_worker = threads + max(async_query_threads, 0)
+
+requested_workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+workers = max(min(requested_workers, pool_size // connections_per_worker), 1)
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    worker_class = 'gthread'
+
+# Recycle workers now and then so a leaked connection can't outlive them
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    server.log.info(
+        "DB sizing: %s workers × (%s threads + %s query threads) = %s connections of DB_POOL_SIZE=%s",
+        workers, threads, async_query_threads, workers * connections_per_worker, pool_size,
+    )
+    if workers < requested_workers:
+        server.log.warning(
+            "Capped workers at %s (WEB_CONCURRENCY=%s) to stay within DB_POOL_SIZE=%s",
+            workers, requested_workers, pool_size,
+        )
+    if workers * connections_per_worker > pool_size:
+        server.log.warning(
+            "One worker needs %s connections, more than DB_POOL_SIZE=%s",
+            connections_per_worker, pool_size,
+        )
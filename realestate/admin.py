@@ -1,22 +1,115 @@
 from django.contrib import admin
-from .models import Agent, Customer, Payment, Gift, AgentGift, Project
+from django.db.models import Q
+from django.forms.models import BaseInlineFormSet
+from .models import Agent, Customer, Payment, Gift, AgentGift, Project, Job, SearchEntry
+from .pagination import EstimatedCountPaginator
+from .search import matching_ids
+from .stats import invalidate_dashboard_stats
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 
 
+class LargeTableMixin:
+    """
+    Changelist settings for tables that grow without bound.
+
+    Page counts come from the planner estimate instead of ``COUNT(*)``,
+    the second, unfiltered count is skipped, and searches (the changelist
+    box and the autocomplete widgets) read the SearchEntry index instead of
+    running ``icontains`` over every row. ``indexed_search`` maps each
+    SearchEntry kind to the field its ids are matched against.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    indexed_search = {}
+
+    def search_filter(self, search_term):
+        matches = Q()
+        for kind, field in self.indexed_search.items():
+            matches |= Q(**{f'{field}__in': matching_ids(kind, search_term)})
+        return matches
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.indexed_search or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(self.search_filter(search_term)), False
+
+
+class AgentFilter(admin.SimpleListFilter):
+    """
+    Filter by agent without listing every agent in the sidebar.
+
+    Only the agent already chosen (by following an agent link in the list)
+    is offered, so the filter costs one primary-key lookup.
+    """
+    title = 'agent'
+    parameter_name = 'agent'
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or '').isdigit():
+            return []
+        agent = Agent.objects.filter(pk=self.value()).only('username').first()
+        return [(str(agent.pk), agent.username)] if agent else []
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(agent_id=int(self.value()))
+        return queryset
+
+
+class GiftLevelFilter(admin.SimpleListFilter):
+    """Star levels from the small gift catalog, not a DISTINCT over every agent gift."""
+    title = 'star level'
+    parameter_name = 'star_level'
+
+    def lookups(self, request, model_admin):
+        levels = Gift.objects.order_by('required_star_level').values_list('required_star_level', flat=True).distinct()
+        return [(str(level), f"{level} ⭐") for level in levels]
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(gift__required_star_level=int(self.value()))
+        return queryset
+
+
+def agent_link(obj):
+    # Filters the list down to this agent
+    return format_html('<a href="?agent={}">{}</a>', obj.agent_id, obj.agent.username)
+agent_link.short_description = "Agent"
+agent_link.admin_order_field = "agent__username"
+
+
+# Gifts shown on an agent's page, newest first
+AGENT_GIFT_INLINE_LIMIT = 20
+
+
+class RecentAgentGiftFormSet(BaseInlineFormSet):
+    def get_queryset(self):
+        if not hasattr(self, '_recent'):
+            self._recent = super().get_queryset()[:AGENT_GIFT_INLINE_LIMIT]
+        return self._recent
+
+
 class AgentGiftInline(admin.TabularInline):
     model = AgentGift
+    formset = RecentAgentGiftFormSet
     extra = 0
     readonly_fields = ('agent', 'gift', 'date_earned', 'date_delivered')
     fields = ('agent', 'gift', 'status', 'date_earned', 'date_delivered')
+    ordering = ('-date_earned', '-id')
+    verbose_name_plural = f"Agent gifts (latest {AGENT_GIFT_INLINE_LIMIT})"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('agent', 'gift')
     
     def has_add_permission(self, request, obj=None):
         return False  # Prevent adding gifts manually
 
 
 @admin.register(Agent)
-class AgentAdmin(UserAdmin):
+class AgentAdmin(LargeTableMixin, UserAdmin):
     model = Agent
+    indexed_search = {SearchEntry.KIND_AGENT: 'pk'}
     list_display = ('username','agent_number', 'email', 'total_points', 'star_level', 'next_milestone_display')
     readonly_fields = ('total_points', 'star_level','agent_number')
     
@@ -39,18 +132,27 @@ class AgentAdmin(UserAdmin):
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
-    list_display = ("name", "email", "agent")
+class CustomerAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ("name", "email", agent_link)
+    list_select_related = ("agent",)
     search_fields = ("name", "email", "agent__username")
-    list_filter = ("agent",)
+    indexed_search = {SearchEntry.KIND_CUSTOMER: 'pk', SearchEntry.KIND_AGENT: 'agent_id'}
+    list_filter = (AgentFilter,)
+    autocomplete_fields = ("agent",)
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
-    list_display = ("customer", "agent", "project", "amount", "points", "receipt_number", "date")
+class PaymentAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ("customer", agent_link, "project", "amount", "points", "receipt_number", "date")
+    list_select_related = ("customer", "agent", "project")
     readonly_fields = ("points", "date")
     search_fields = ("customer__name", "agent__username", "receipt_number", "project__name")
-    list_filter = ("date", "agent", "project__project_type")
+    indexed_search = {SearchEntry.KIND_PAYMENT: 'pk'}
+    list_filter = (AgentFilter, "project__project_type")
+    autocomplete_fields = ("customer", "agent", "project")
+    # Year → month → day links, each a range scan on payment_date_id_idx
+    date_hierarchy = "date"
+    ordering = ("-date",)
 
 
 @admin.register(Gift)
@@ -61,12 +163,21 @@ class GiftAdmin(admin.ModelAdmin):
 
 
 @admin.register(AgentGift)
-class AgentGiftAdmin(admin.ModelAdmin):
+class AgentGiftAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ("agent", "gift", "star_level", "status", "date_earned", "date_delivered")
-    list_filter = ("status", "gift__required_star_level", "date_earned")
+    list_select_related = ("agent", "gift")
+    list_filter = ("status", GiftLevelFilter)
     search_fields = ("agent__username", "gift__name")
+    indexed_search = {SearchEntry.KIND_AGENT: 'agent_id'}
     readonly_fields = ("agent", "gift", "date_earned")
     actions = ['mark_as_delivered']
+    # Ranges on agentgift_date_earned_id_idx
+    date_hierarchy = "date_earned"
+    ordering = ("-date_earned",)
+
+    def search_filter(self, search_term):
+        # The gift catalog is small enough to match by name directly
+        return super().search_filter(search_term) | Q(gift__in=Gift.objects.filter(name__icontains=search_term))
     
     def star_level(self, obj):
         return obj.gift.required_star_level
@@ -75,16 +186,34 @@ class AgentGiftAdmin(admin.ModelAdmin):
     def mark_as_delivered(self, request, queryset):
         from django.utils import timezone
         updated = queryset.update(status='delivered', date_delivered=timezone.now())
+        # update() bypasses post_save, so drop the cached pending-gift count here
+        invalidate_dashboard_stats()
         self.message_user(request, f'{updated} gift(s) marked as delivered.')
     mark_as_delivered.short_description = "Mark selected gifts as delivered"
 
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ("name", "project_type", "created_at")
     list_filter = ("project_type",)
     search_fields = ("name",)
+    indexed_search = {SearchEntry.KIND_PROJECT: 'pk'}
 
 
+@admin.register(Job)
+class JobAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ("key", "task", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("key",)
+    readonly_fields = ("key", "task", "payload", "attempts", "locked_by", "locked_at", "last_error",
+                       "created_at", "finished_at")
+    actions = ['retry_now']
 
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status__in=[Job.STATUS_DONE, Job.STATUS_RUNNING]).update(
+            status=Job.STATUS_PENDING, run_at=timezone.now(), attempts=0, finished_at=None,
+        )
+        self.message_user(request, f'{updated} job(s) queued to run again.')
+    retry_now.short_description = "Retry selected failed or pending jobs now"
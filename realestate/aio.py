@@ -0,0 +1,99 @@
+"""
+Helpers for the ``async def`` views: concurrent queries, login checks and rendering.
+
+Django's async ORM methods (``acount()``, ``async for`` ...) hand every
+query to ``sync_to_async(thread_sensitive=True)``, i.e. to one shared
+thread, so ``asyncio.gather()`` over them still runs the queries one after
+another. :func:`gather_queries` runs each callable on a small pool of
+worker threads instead, each with its own database connection, so a
+dashboard's independent queries overlap and the page costs roughly its
+slowest query rather than the sum of all of them.
+
+The views work the same under WSGI (Django runs them in a per-request
+event loop) and ASGI; see "Async serving" in the README.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections, connections
+from django.shortcuts import render
+
+from . import dbpool
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_QUERY_THREADS, thread_name_prefix='realestate-query',
+        )
+    return _executor
+
+
+def _run(func):
+    # Pool threads live outside the request cycle, so they honour
+    # CONN_MAX_AGE themselves the way request_started/finished would
+    close_old_connections()
+    dbpool.checkout()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+        dbpool.checkin()
+
+
+def _in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _run_all(funcs):
+    return [func() for func in funcs]
+
+
+async def gather_queries(*funcs):
+    """
+    Call the blocking, query-running ``funcs`` concurrently and return their results in order.
+
+    Each callable must fully evaluate what it returns (``list(qs)``, not
+    ``qs``): lazy querysets would run later on the rendering thread. Runs
+    them one by one on the request's thread instead when
+    ``ASYNC_QUERY_THREADS`` is 0 or a transaction is open, as other
+    connections can't see its uncommitted rows.
+    """
+    if settings.ASYNC_QUERY_THREADS < 1 or len(funcs) < 2 or await sync_to_async(_in_transaction)():
+        return await sync_to_async(_run_all)(funcs)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    # copy_context() carries the request profile (profiling.py) into the pool
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, contextvars.copy_context().run, _run, func)
+        for func in funcs
+    ))
+
+
+def login_required(login_url):
+    """``django.contrib.auth.decorators.login_required`` for ``async def`` views."""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if not user.is_authenticated:
+                return redirect_to_login(request.get_full_path(), login_url)
+            return await view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+async def render_async(request, template_name, context):
+    """``render()`` on the request's sync thread, where templates may still touch the ORM."""
+    return await sync_to_async(render)(request, template_name, context)
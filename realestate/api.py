@@ -0,0 +1,194 @@
+"""
+Read-only JSON API for the field-agent mobile app.
+
+``GET /api/<resource>/`` lists agents, customers, projects, payments or
+agent-gifts, and ``GET /api/<resource>/<id>/`` returns one of them.
+
+* ``?fields=name,email`` picks the fields returned. Only those columns
+  (plus ``id``) are selected, and only their relations are joined.
+* ``?sort=``, ``?search=`` and the filters use the same vocabularies as
+  the "View All" pages (``listing.py``).
+* Lists are cursor-paginated like those pages. ``next`` / ``previous``
+  are the links to follow, and ``?limit=`` sets the page size, up to
+  ``API_MAX_PAGE_SIZE``. A cursor that was altered, or issued for another
+  ``?sort=``, is a 400.
+* Every response carries a strong ``ETag`` (a hash of the body). Sending
+  it back in ``If-None-Match`` gets an empty 304 while the result is
+  unchanged. The server still runs the page query to hash the body, but
+  polling an unchanged list transfers no payload.
+
+Requests authenticate with the agent's session, as the HTML pages do.
+Staff see every row. An agent sees their own profile, customers,
+payments and gifts, plus every project.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from .exports import AGENT_EXPORT_COLUMNS, CUSTOMER_EXPORT_COLUMNS, PAYMENT_EXPORT_COLUMNS, PROJECT_EXPORT_COLUMNS
+from .listing import (
+    AGENT_GIFT_SORTS, AGENT_SORTS, CUSTOMER_SORTS, PAYMENT_SORTS, PROJECT_SORTS,
+    filter_agent_gifts, filter_agents, filter_customers, filter_payments, filter_projects,
+)
+from .models import Agent, AgentGift, Customer, Payment, Project
+from .pagination import InvalidCursor, paginate_keyset, querystring_without_cursor
+
+
+class Resource:
+    """One API collection: its rows, its fields (name → lookup) and its list vocabulary."""
+
+    def __init__(self, queryset, fields, sorts, default_sort, filter_rows, owner=None):
+        self.queryset = queryset
+        self.fields = fields
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.filter_rows = filter_rows
+        # Lookup tying a row to its agent; non-staff users only see their own
+        self.owner = owner
+
+    def visible_to(self, user):
+        queryset = self.queryset.all()
+        if self.owner and not user.is_staff:
+            queryset = queryset.filter(**{self.owner: user.pk})
+        return queryset
+
+
+RESOURCES = {
+    'agents': Resource(
+        Agent.objects.all(), dict(AGENT_EXPORT_COLUMNS),
+        AGENT_SORTS, '-id', filter_agents, owner='pk',
+    ),
+    'customers': Resource(
+        Customer.objects.all(), {**dict(CUSTOMER_EXPORT_COLUMNS), 'agent_id': 'agent_id'},
+        CUSTOMER_SORTS, '-id', filter_customers, owner='agent_id',
+    ),
+    'projects': Resource(
+        Project.objects.all(), dict(PROJECT_EXPORT_COLUMNS),
+        PROJECT_SORTS, '-id', filter_projects,
+    ),
+    'payments': Resource(
+        Payment.objects.all(),
+        {**dict(PAYMENT_EXPORT_COLUMNS), 'customer_id': 'customer_id', 'agent_id': 'agent_id',
+         'project_id': 'project_id'},
+        PAYMENT_SORTS, '-date', filter_payments, owner='agent_id',
+    ),
+    'agent-gifts': Resource(
+        AgentGift.objects.all(),
+        {
+            'id': 'id',
+            'agent_id': 'agent_id',
+            'agent': 'agent__username',
+            'gift_id': 'gift_id',
+            'gift': 'gift__name',
+            'required_star_level': 'gift__required_star_level',
+            'status': 'status',
+            'date_earned': 'date_earned',
+            'date_delivered': 'date_delivered',
+        },
+        AGENT_GIFT_SORTS, '-date_earned', filter_agent_gifts, owner='agent_id',
+    ),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """GET/HEAD only, JSON errors, and ``resource`` resolved to its :class:`Resource`."""
+
+    @require_safe
+    @wraps(view)
+    def wrapper(request, resource, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required', 401)
+        if resource not in RESOURCES:
+            return _error(f'Unknown resource {resource!r}', 404)
+        try:
+            return view(request, RESOURCES[resource], **kwargs)
+        except BadRequest as e:
+            return _error(str(e), 400)
+
+    return wrapper
+
+
+def _selected_fields(request, resource):
+    """``[(name, lookup)]`` for ``?fields=``, always starting with ``id``; every field by default."""
+    names = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    if not names:
+        return list(resource.fields.items())
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(resource.fields)}")
+    return [('id', 'id')] + [(name, resource.fields[name]) for name in dict.fromkeys(names) if name != 'id']
+
+
+def _page_size(request):
+    try:
+        limit = int(request.GET.get('limit') or settings.LIST_PAGE_SIZE)
+    except ValueError:
+        raise BadRequest('limit must be a number') from None
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def _serialize(row, fields):
+    return {name: row[lookup] for name, lookup in fields}
+
+
+def _page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = querystring_without_cursor(request)
+    return f"{request.path}?{query + '&' if query else ''}cursor={cursor}"
+
+
+def etag_response(request, data):
+    """``data`` as JSON with a strong ETag, or an empty 304 if it matches ``If-None-Match``."""
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode()
+    etag = quote_etag(hashlib.md5(body, usedforsecurity=False).hexdigest())
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Per-user data: clients may keep it but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+@api_view
+def resource_list(request, resource):
+    fields = _selected_fields(request, resource)
+    sort_field = resource.sorts.get(request.GET.get('sort'), resource.default_sort)
+    rows = resource.filter_rows(resource.visible_to(request.user), request.GET)
+    try:
+        page = paginate_keyset(
+            rows.values(*dict.fromkeys(lookup for _, lookup in fields)),
+            sort_field, request.GET.get('cursor'), per_page=_page_size(request), strict=True,
+        )
+    except InvalidCursor as e:
+        raise BadRequest(f"{e}; follow the next/previous links of a list with the same sort") from None
+    return etag_response(request, {
+        'results': [_serialize(row, fields) for row in page],
+        'next': _page_link(request, page.next_cursor),
+        'previous': _page_link(request, page.previous_cursor),
+    })
+
+
+@api_view
+def resource_detail(request, resource, pk):
+    fields = _selected_fields(request, resource)
+    rows = resource.visible_to(request.user).filter(pk=pk)
+    row = rows.values(*dict.fromkeys(lookup for _, lookup in fields)).first()
+    if row is None:
+        return _error('Not found', 404)
+    return etag_response(request, _serialize(row, fields))
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from realestate.dbpool import TrackedConnectionMixin
+
+
+class DatabaseWrapper(TrackedConnectionMixin, base.DatabaseWrapper):
+    """Django's PostgreSQL backend, reporting connection use to ``realestate.dbpool``."""
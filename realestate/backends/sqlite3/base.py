@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from realestate.dbpool import TrackedConnectionMixin
+
+
+class DatabaseWrapper(TrackedConnectionMixin, base.DatabaseWrapper):
+    """Django's SQLite backend, reporting connection use to ``realestate.dbpool``."""
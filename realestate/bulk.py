@@ -0,0 +1,29 @@
+"""
+Bulk write helpers shared by the data loading commands.
+
+``import_data`` restores exported rows and ``generate_load_data`` writes
+synthetic ones; both insert with ``bulk_create`` and need the dates they
+supply to survive the insert.
+"""
+
+
+def bulk_create_dated(model, objects, **kwargs):
+    """
+    ``bulk_create`` that keeps the dates set on ``auto_now_add`` fields.
+
+    The insert stamps those fields with the current time; the values the
+    objects carried are written back with one ``bulk_update``.
+    """
+    fields = [f.attname for f in model._meta.concrete_fields if getattr(f, 'auto_now_add', False)]
+    stamps = [[getattr(obj, field) for field in fields] for obj in objects]
+    created = model.objects.bulk_create(objects, **kwargs)
+    dated = []
+    for obj, values in zip(created, stamps):
+        if any(value is not None for value in values):
+            for field, value in zip(fields, values):
+                if value is not None:
+                    setattr(obj, field, value)
+            dated.append(obj)
+    if fields:
+        model.objects.bulk_update(dated, fields)
+    return created
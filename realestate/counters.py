@@ -0,0 +1,119 @@
+"""
+Denormalized per-agent and per-customer counters.
+
+``Agent.customer_count``, ``Agent.payment_count`` / ``total_amount`` and
+``Customer.payment_count`` / ``total_amount`` are incremented in place,
+inside the same transaction as the customer or payment write that moves
+them, so listing pages can show and sort by them without aggregating.
+:func:`reconcile` recomputes them in chunks should they ever drift.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+
+from .models import Agent, Customer, Payment
+
+
+def _increment(model, deltas):
+    """
+    Add ``{pk: {field: delta}}`` to each row in one UPDATE per field.
+
+    The increments are evaluated in the database, so concurrent writers
+    never overwrite each other's counts.
+    """
+    by_field = {}
+    for pk, changes in deltas.items():
+        for field, delta in changes.items():
+            if delta:
+                by_field.setdefault(field, {})[pk] = delta
+    for field, changes in by_field.items():
+        if len(changes) == 1:
+            (pk, delta), = changes.items()
+            model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+            continue
+        increment = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in changes.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        model.objects.filter(pk__in=changes).update(**{field: F(field) + increment})
+
+
+def move_payment(agent_id, customer_id, count, amount):
+    """Add ``count`` payments worth ``amount`` (both possibly negative) to an agent and customer."""
+    _increment(Agent, {agent_id: {'payment_count': count, 'total_amount': amount}})
+    if customer_id is not None:
+        _increment(Customer, {customer_id: {'payment_count': count, 'total_amount': amount}})
+
+
+def move_customers(deltas):
+    """Add ``{agent_id: customers}`` to each agent's customer_count."""
+    _increment(Agent, {agent_id: {'customer_count': delta} for agent_id, delta in deltas.items()})
+
+
+def apply_payments(payments):
+    """Fold a batch of newly inserted payments into their agents' and customers' counters."""
+    agents, customers = {}, {}
+    for payment in payments:
+        for deltas, pk in ((agents, payment.agent_id), (customers, payment.customer_id)):
+            changes = deltas.setdefault(pk, {'payment_count': 0, 'total_amount': Decimal(0)})
+            changes['payment_count'] += 1
+            changes['total_amount'] += payment.amount
+    _increment(Agent, agents)
+    _increment(Customer, customers)
+
+
+def _actual(model, key, pks, **aggregates):
+    """``{pk: {name: value}}`` for ``aggregates`` over ``model`` rows grouped by ``key``."""
+    rows = model.objects.filter(**{f'{key}__in': pks}).values(key).annotate(**aggregates).order_by()
+    return {row.pop(key): row for row in rows}
+
+
+def _reconcile_chunk(model, pks):
+    """Correct the counters of ``model`` rows ``pks``; returns how many were wrong."""
+    if model is Agent:
+        fields = ['customer_count', 'payment_count', 'total_amount']
+        actual = _actual(Payment, 'agent_id', pks, payment_count=Count('id'), total_amount=Sum('amount'))
+        for agent_id, row in _actual(Customer, 'agent_id', pks, customer_count=Count('id')).items():
+            actual.setdefault(agent_id, {}).update(row)
+    else:
+        fields = ['payment_count', 'total_amount']
+        actual = _actual(Payment, 'customer_id', pks, payment_count=Count('id'), total_amount=Sum('amount'))
+
+    wrong = []
+    # Locked, so a payment written meanwhile waits instead of being overwritten
+    for obj in model.objects.select_for_update().filter(pk__in=pks).only(*fields):
+        expected = actual.get(obj.pk, {})
+        changed = False
+        for field in fields:
+            value = expected.get(field) or 0
+            if getattr(obj, field) != value:
+                setattr(obj, field, value)
+                changed = True
+        if changed:
+            wrong.append(obj)
+    model.objects.bulk_update(wrong, fields)
+    return len(wrong)
+
+
+def reconcile(batch_size=1000):
+    """
+    Recompute every counter from the payments and customers tables.
+
+    Agents and customers are walked in id order, ``batch_size`` at a time,
+    each chunk in its own short transaction. Returns
+    ``{'agents': corrected, 'customers': corrected}``.
+    """
+    corrected = {}
+    for label, model in (('agents', Agent), ('customers', Customer)):
+        corrected[label] = 0
+        last_pk = 0
+        while True:
+            pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                corrected[label] += _reconcile_chunk(model, pks)
+            last_pk = pks[-1]
+    return corrected
@@ -0,0 +1,153 @@
+"""
+Per-process statistics for the persistent database connections.
+
+Django 5.0 has no connection pool of its own. With ``CONN_MAX_AGE`` every
+gunicorn thread keeps one connection open across requests, and
+``CONN_HEALTH_CHECKS`` tests it before reuse. Those per-thread connections
+(plus the ones ``aio``'s query threads hold) are the pool, and
+``gunicorn.conf.py`` sizes workers and threads so they fit in
+``DB_POOL_SIZE``.
+
+The ``realestate.backends`` database engines report every connect and
+close here, and a connection counts as in use while its thread serves a
+request or an ``aio`` query. :func:`snapshot` reports how many connections
+are open, in use and idle, how many checkouts reused an open connection,
+and how long checkouts waited for a new one. The staff-only
+``/ops/db-pool/`` page returns it as JSON, together with the server-side
+view from ``pg_stat_activity`` on PostgreSQL.
+"""
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+
+
+_lock = threading.Lock()
+_local = threading.local()
+# Weak, so a connection left open by a finished thread drops out with it
+_open = weakref.WeakSet()
+_in_use = weakref.WeakSet()
+_counters = {'connects': 0, 'closes': 0, 'checkouts': 0, 'reused': 0}
+_wait = {'total': 0.0, 'max': 0.0}
+
+
+class TrackedConnectionMixin:
+    """``DatabaseWrapper`` mixin reporting connects (with their duration) and closes."""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        connection_opened(self, time.perf_counter() - started)
+
+    def close(self):
+        was_open = self.connection is not None
+        super().close()
+        # SQLite ignores close() on an in-memory database
+        if was_open and self.connection is None:
+            connection_closed(self)
+
+
+def _thread_connections():
+    return [conn for conn in connections.all(initialized_only=True) if conn.connection is not None]
+
+
+def connection_opened(wrapper, seconds):
+    with _lock:
+        _open.add(wrapper)
+        _counters['connects'] += 1
+        _wait['total'] += seconds
+        _wait['max'] = max(_wait['max'], seconds)
+        if getattr(_local, 'depth', 0):
+            _in_use.add(wrapper)
+
+
+def connection_closed(wrapper):
+    with _lock:
+        _open.discard(wrapper)
+        _in_use.discard(wrapper)
+        _counters['closes'] += 1
+
+
+def checkout():
+    """Mark this thread's connections, and any it opens next, in use."""
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    if _local.depth > 1:
+        return
+    already_open = _thread_connections()
+    with _lock:
+        _counters['checkouts'] += 1
+        if already_open:
+            _counters['reused'] += 1
+        for wrapper in already_open:
+            _in_use.add(wrapper)
+
+
+def checkin():
+    """Mark this thread's connections idle again."""
+    _local.depth = max(getattr(_local, 'depth', 0) - 1, 0)
+    if _local.depth:
+        return
+    with _lock:
+        for wrapper in connections.all(initialized_only=True):
+            _in_use.discard(wrapper)
+
+
+def _request_started(**kwargs):
+    checkout()
+
+
+def _request_finished(**kwargs):
+    checkin()
+
+
+# Connected after django.db's close_old_connections, so checkout() sees the
+# connections that survived CONN_MAX_AGE and checkin() the ones kept open
+request_started.connect(_request_started, dispatch_uid='realestate.dbpool.checkout')
+request_finished.connect(_request_finished, dispatch_uid='realestate.dbpool.checkin')
+
+
+def snapshot():
+    """This process's connection statistics, as a JSON-ready dict."""
+    with _lock:
+        open_count, in_use = len(_open), len(_in_use)
+        counters, wait = dict(_counters), dict(_wait)
+    connects = counters['connects']
+    return {
+        'pid': os.getpid(),
+        'open': open_count,
+        'in_use': in_use,
+        'idle': open_count - in_use,
+        **counters,
+        'reuse_ratio': round(counters['reused'] / counters['checkouts'], 3) if counters['checkouts'] else None,
+        'connect_wait_ms': {
+            'total': round(wait['total'] * 1000, 2),
+            'avg': round(wait['total'] * 1000 / connects, 2) if connects else 0.0,
+            'max': round(wait['max'] * 1000, 2),
+        },
+    }
+
+
+def server_connections():
+    """
+    ``{state: {'count', 'longest_s'}}`` for this app's connections across all
+    workers, from ``pg_stat_activity``; ``None`` on other databases.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(state, 'unknown'), COUNT(*),
+                   COALESCE(MAX(EXTRACT(EPOCH FROM now() - state_change)), 0)
+            FROM pg_stat_activity
+            WHERE datname = current_database() AND application_name = %s
+            GROUP BY 1
+            """,
+            [settings.DATABASES['default'].get('OPTIONS', {}).get('application_name', '')],
+        )
+        return {state: {'count': count, 'longest_s': round(float(longest), 1)}
+                for state, count, longest in cursor.fetchall()}
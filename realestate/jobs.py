@@ -0,0 +1,157 @@
+"""
+A small job queue kept in the database, for work that can follow a request.
+
+:func:`enqueue` writes a Job row in the caller's transaction, so the job
+exists exactly when the write that needs it commits; no broker is
+involved. ``manage.py run_workers`` claims due jobs and runs each one in a
+transaction that also marks it done. Failures are retried with
+exponential backoff up to ``JOB_MAX_ATTEMPTS``.
+
+Every job has a unique ``key``: enqueueing an existing key is a no-op, and
+because a job's effects commit together with its ``done`` status, a retry
+after a crash never applies them twice.
+
+Deployed, jobs wait for ``manage.py run_workers`` and requests return
+as soon as the write commits. With ``JOBS_EAGER`` (the default under
+DEBUG, and in the tests) :func:`enqueue` runs the task at once, inside
+the caller's transaction, exactly like inline code.
+
+Tasks are plain functions taking the JSON payload, registered with
+:func:`task` in the modules listed in ``TASK_MODULES``.
+"""
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger('realestate.jobs')
+
+# Modules whose @task functions are loaded before a job runs
+TASK_MODULES = ['realestate.ledger']
+TASKS = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs named ``name``."""
+
+    def register(func):
+        TASKS[name] = func
+        return func
+
+    return register
+
+
+def get_task(name):
+    if name not in TASKS:
+        for module in TASK_MODULES:
+            import_module(module)
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise ValueError(f"Unknown job task {name!r}") from None
+
+
+def enqueue(name, payload, key=None, run_at=None):
+    """
+    Queue ``name(payload)``; returns the job key, or ``None`` when run eagerly.
+
+    ``key`` defaults to a fresh one; pass a stable key for work that must
+    be queued at most once.
+    """
+    handler = get_task(name)
+    if settings.JOBS_EAGER:
+        handler(payload)
+        return None
+    key = key or f'{name}:{uuid.uuid4().hex}'
+    Job.objects.bulk_create(
+        [Job(key=key, task=name, payload=payload, run_at=run_at or timezone.now(),
+             max_attempts=settings.JOB_MAX_ATTEMPTS)],
+        ignore_conflicts=True,
+    )
+    return key
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit):
+    """
+    Mark up to ``limit`` due pending jobs as running for ``worker``; returns their ids.
+
+    Each job is taken with a conditional UPDATE, so when several workers
+    race for one only the first gets it.
+    """
+    now = timezone.now()
+    due = list(
+        Job.objects.filter(status=Job.STATUS_PENDING, run_at__lte=now)
+        .order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    return [
+        job_id for job_id in due
+        if Job.objects.filter(pk=job_id, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+    ]
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling from JOB_RETRY_BASE_SECONDS, capped."""
+    seconds = settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, settings.JOB_RETRY_MAX_SECONDS))
+
+
+class _Superseded(Exception):
+    pass
+
+
+def run_job(job_id):
+    """Run one claimed job; returns True if it succeeded."""
+    job = Job.objects.get(pk=job_id)
+    # Still ours? A job requeued as stale may have been claimed again
+    ours = Job.objects.filter(
+        pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by, attempts=job.attempts,
+    )
+    try:
+        with transaction.atomic():
+            get_task(job.task)(job.payload)
+            if not ours.update(status=Job.STATUS_DONE, finished_at=timezone.now(), last_error=''):
+                # Roll back rather than apply its effects a second time
+                raise _Superseded
+        return True
+    except _Superseded:
+        logger.warning("Job %s was claimed again while running; discarded this run", job.key)
+        return False
+    except Exception:
+        logger.warning("Job %s (%s) failed on attempt %s", job.key, job.task, job.attempts, exc_info=True)
+        if job.attempts >= job.max_attempts:
+            changes = {'status': Job.STATUS_FAILED, 'finished_at': timezone.now()}
+        else:
+            changes = {'status': Job.STATUS_PENDING, 'run_at': timezone.now() + backoff(job.attempts)}
+        ours.update(last_error=traceback.format_exc(), locked_by='', locked_at=None, **changes)
+        return False
+
+
+def requeue_stale(timeout):
+    """Put jobs left running longer than ``timeout`` seconds (a worker died) back in the queue."""
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=Job.STATUS_PENDING, locked_by='', locked_at=None)
+
+
+def purge_finished(days):
+    """Delete done jobs finished more than ``days`` ago; failed ones are kept for inspection."""
+    return Job.objects.filter(
+        status=Job.STATUS_DONE, finished_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()[0]
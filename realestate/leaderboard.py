@@ -0,0 +1,214 @@
+"""
+Agent rankings: overall, within each star level, and per calendar month.
+
+Ranks follow SQL ``RANK()`` semantics (equal PV share a rank, the next
+rank skips). The overall and per-level standings are built from a
+window-function query and cached as sorted ``(-points, agent_id)`` lists
+under a version number that every change bumps. Each process keeps the
+board it last read while the version stands, so an agent's rank is one
+small cache read plus a binary search. Point changes move that agent's
+entry in place (:func:`update_standing`); when two processes move agents
+at once, only the first writes its board and the next read rebuilds it
+rather than losing a move. Monthly rankings are computed from the
+AgentMonthlyStats rollup and cached per month until a payment in that
+month changes.
+"""
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum, Window
+from django.db.models.functions import Rank
+
+
+LEADERBOARD_CACHE_KEY = 'realestate:leaderboard'
+# Version of the overall/per-level standings; the board is cached per version
+BOARD_VERSION_CACHE_KEY = 'realestate:leaderboard:version'
+# Bumped by invalidate_leaderboard() so every cached month goes stale at once
+GENERATION_CACHE_KEY = 'realestate:leaderboard:generation'
+
+
+def ranked_agents():
+    """All agents with ``overall_rank`` and ``level_rank`` window annotations, best first."""
+    from .models import Agent
+
+    points = F('total_points').desc()
+    return Agent.objects.annotate(
+        overall_rank=Window(Rank(), order_by=points),
+        level_rank=Window(Rank(), partition_by=F('star_level'), order_by=points),
+    ).order_by('-total_points', 'id')
+
+
+def monthly_ranking(month):
+    """Agents ranked by PV earned from payments dated in ``month`` (first day of the month)."""
+    from .models import AgentMonthlyStats
+
+    return (
+        AgentMonthlyStats.objects
+        .filter(month=month, payment_count__gt=0)
+        .values('agent_id')
+        .annotate(
+            month_points=Sum('points'),
+            month_amount=Sum('amount'),
+            month_rank=Window(Rank(), order_by=Sum('points').desc()),
+        )
+        .order_by('month_rank', 'agent_id')
+    )
+
+
+def _build_board():
+    board = {'overall': [], 'levels': {}}
+    # Already in (-points, id) order, so the lists come out sorted
+    for agent_id, points, level in ranked_agents().values_list('id', 'total_points', 'star_level'):
+        entry = (-points, agent_id)
+        board['overall'].append(entry)
+        board['levels'].setdefault(level, []).append(entry)
+    return board
+
+
+def _board_key(version):
+    return f'{LEADERBOARD_CACHE_KEY}:board:{version}'
+
+
+def board_version():
+    version = cache.get(BOARD_VERSION_CACHE_KEY)
+    if version is None:
+        # Start past any version a lost counter may have handed out
+        cache.add(BOARD_VERSION_CACHE_KEY, time.time_ns() // 1000, None)
+        version = cache.get(BOARD_VERSION_CACHE_KEY)
+    return version
+
+
+def _bump_version():
+    """Advance the board version atomically; returns the new version."""
+    try:
+        return cache.incr(BOARD_VERSION_CACHE_KEY)
+    except ValueError:
+        board_version()
+        return cache.incr(BOARD_VERSION_CACHE_KEY)
+
+
+# (version, loaded_at, board) last read by this process
+_local_board = None
+
+
+def get_board():
+    """The cached overall/per-level standings, built on first use."""
+    global _local_board
+    version = board_version()
+    local = _local_board
+    if local is not None and local[0] == version and time.monotonic() - local[1] < settings.LEADERBOARD_TTL:
+        return local[2]
+    board = cache.get(_board_key(version))
+    if board is None:
+        board = _build_board()
+        cache.set(_board_key(version), board, settings.LEADERBOARD_TTL)
+    _local_board = (version, time.monotonic(), board)
+    return board
+
+
+def _month_key(month):
+    generation = cache.get_or_set(GENERATION_CACHE_KEY, 1, None)
+    return f'realestate:leaderboard:{generation}:{month:%Y-%m}'
+
+
+def get_monthly(month):
+    """``{'rows': [...], 'ranks': {agent_id: rank}}`` for ``month``, cached."""
+    key = _month_key(month)
+    monthly = cache.get(key)
+    if monthly is None:
+        rows = list(monthly_ranking(month))
+        monthly = {'rows': rows, 'ranks': {row['agent_id']: row['month_rank'] for row in rows}}
+        cache.set(key, monthly, settings.LEADERBOARD_TTL)
+    return monthly
+
+
+def rank_of(entries, points):
+    """1-based rank of a PV total within sorted ``(-points, id)`` entries."""
+    return bisect_left(entries, (-points,)) + 1
+
+
+def ranked_entries(entries, limit):
+    """The first ``limit`` entries as ``(rank, points, agent_id)``, ties sharing a rank."""
+    ranked = []
+    for index, (negative_points, agent_id) in enumerate(entries[:limit]):
+        if ranked and ranked[-1][1] == -negative_points:
+            rank = ranked[-1][0]
+        else:
+            rank = index + 1
+        ranked.append((rank, -negative_points, agent_id))
+    return ranked
+
+
+def agent_rank(agent, month):
+    """An agent's overall, star-level and monthly rank (each with the field size)."""
+    board = get_board()
+    level_entries = board['levels'].get(agent.star_level, [])
+    monthly = get_monthly(month)
+    return {
+        'overall': rank_of(board['overall'], agent.total_points),
+        'overall_of': len(board['overall']),
+        'level': rank_of(level_entries, agent.total_points),
+        'level_of': len(level_entries),
+        'month': monthly['ranks'].get(agent.pk),
+        'month_of': len(monthly['rows']),
+    }
+
+
+def _discard(entries, entry):
+    index = bisect_left(entries, entry)
+    if index == len(entries) or entries[index] != entry:
+        raise ValueError(entry)
+    del entries[index]
+
+
+def _move(agent_id, old, new):
+    version = board_version()
+    board = cache.get(_board_key(version))
+    # Bumped first, so no process keeps reading the board without this move
+    moved_to = _bump_version()
+    if board is None or moved_to != version + 1:
+        # Nothing cached, or another process moved an agent since the board
+        # was read: writing it would lose that move, so the next read rebuilds
+        return
+    try:
+        if old is not None:
+            points, level = old
+            _discard(board['overall'], (-points, agent_id))
+            _discard(board['levels'].get(level, []), (-points, agent_id))
+    except ValueError:
+        # The cached copy had drifted; the next read rebuilds
+        return
+    if new is not None:
+        points, level = new
+        insort(board['overall'], (-points, agent_id))
+        insort(board['levels'].setdefault(level, []), (-points, agent_id))
+    cache.set(_board_key(moved_to), board, settings.LEADERBOARD_TTL)
+
+
+def update_standing(agent_id, old=None, new=None):
+    """
+    Move one agent in the cached standings once the transaction commits.
+
+    ``old`` and ``new`` are ``(total_points, star_level)``; pass None for
+    an agent being added or removed.
+    """
+    transaction.on_commit(lambda: _move(agent_id, old, new))
+
+
+def invalidate_month(month):
+    """Drop the cached ranking for ``month`` once the transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_month_key(month)))
+
+
+def invalidate_leaderboard():
+    """Drop every cached ranking once the transaction commits (for bulk writes)."""
+    def drop():
+        _bump_version()
+        try:
+            cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            pass
+    transaction.on_commit(drop)
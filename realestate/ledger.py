@@ -0,0 +1,284 @@
+"""
+Set-based versions of the per-payment ledger updates in ``Payment.save``.
+
+Bulk writers (imports, batch entry) insert many payments at once and then
+bring the affected agents up to date with a handful of statements instead
+of one agent update and one gift lookup per payment.
+
+The gift catalog is read through :func:`gift_catalog`, an in-process copy
+dropped whenever a Gift is saved or deleted (see ``models.py``);
+``GIFT_CATALOG_TTL`` bounds how long other processes keep theirs.
+"""
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters, rollups
+from .jobs import task
+from .leaderboard import invalidate_leaderboard
+from .models import Agent, AgentGift, Gift, Payment, star_level_case
+
+
+@task('payment.ledger')
+def apply_payment(payload):
+    """
+    Bring the rollup, the counters, the agent's PV and tier, and their gifts
+    in line with one payment save or delete.
+
+    ``payload`` (built by ``Payment.save`` or the delete receiver) holds the
+    payment's figures before and after, ``None`` for a side that doesn't
+    exist; only the change is applied, so re-saving a payment doesn't count
+    it twice. Every update is a signed increment, so jobs for the same
+    payment may run in any order: a delete or edit that overtakes the job
+    adding the payment (still queued, or waiting to retry) leaves a negative
+    rollup row for that job to cancel.
+    """
+    from .stats import invalidate_dashboard_stats
+
+    sides = [
+        (figures, sign) for figures, sign in ((payload['previous'], -1), (payload.get('current'), 1))
+        if figures is not None
+    ]
+    # A queued job can outlive the agent it was queued for
+    agent_ids = {figures['agent_id'] for figures, _ in sides}
+    live = set(Agent.objects.filter(pk__in=agent_ids).values_list('pk', flat=True))
+
+    deltas = {}
+    for figures, sign in sides:
+        agent_id = figures['agent_id']
+        if agent_id not in live:
+            continue
+        move = rollups.add_payment if sign > 0 else rollups.remove_payment
+        move(
+            agent_id, datetime.fromisoformat(figures['date']), figures['project_type'],
+            Decimal(figures['amount']), figures['points'],
+        )
+        # Payloads queued before customer_id was recorded leave the customer alone
+        counters.move_payment(agent_id, figures.get('customer_id'), sign, sign * Decimal(figures['amount']))
+        deltas[agent_id] = deltas.get(agent_id, 0) + sign * figures['points']
+
+    for agent_id, delta in deltas.items():
+        if delta:
+            Agent(pk=agent_id).add_points(delta)
+    # The dashboard totals are read from the rollup just moved
+    invalidate_dashboard_stats()
+
+
+def apply_points_deltas(deltas):
+    """
+    Add ``{agent_id: pv}`` to each agent's total_points in one UPDATE.
+
+    The increment is evaluated in the database, so it is safe against
+    concurrent ``Payment.save`` calls for the same agents.
+    """
+    deltas = {agent_id: delta for agent_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    increment = Case(
+        *[When(pk=agent_id, then=Value(delta)) for agent_id, delta in deltas.items()],
+        default=Value(0),
+    )
+    invalidate_leaderboard()
+    return Agent.objects.filter(pk__in=deltas).update(total_points=F('total_points') + increment)
+
+
+def retier_agents(agent_ids, batch_size=1000):
+    """
+    Recompute star_level for ``agent_ids`` from their stored total_points.
+
+    Only agents whose level actually changes are written. Returns
+    ``{agent_id: star_level}`` for every agent looked at.
+    """
+    levels = {}
+    agent_ids = list(agent_ids)
+    for start in range(0, len(agent_ids), batch_size):
+        agents = list(
+            Agent.objects.filter(pk__in=agent_ids[start:start + batch_size])
+            .only('id', 'total_points', 'star_level')
+        )
+        changed = []
+        for agent in agents:
+            previous = agent.star_level
+            agent.update_star_level()
+            if agent.star_level != previous:
+                changed.append(agent)
+            levels[agent.pk] = agent.star_level
+        Agent.objects.bulk_update(changed, ['star_level'], batch_size=batch_size)
+        if changed:
+            invalidate_leaderboard()
+    return levels
+
+
+# (loaded_at, {star_level: (gift_id, ...)}) for this process, or None
+_catalog = None
+# Set while a transaction that changed gifts may still roll back; the
+# catalog read meanwhile isn't kept
+_catalog_dirty = False
+
+
+def gift_catalog():
+    """``{star_level: (gift_id, ...)}`` for every gift, from the in-process cache."""
+    global _catalog, _catalog_dirty
+    cached = _catalog
+    if cached is not None and time.monotonic() - cached[0] < settings.GIFT_CATALOG_TTL:
+        return cached[1]
+    if _catalog_dirty and not connection.in_atomic_block:
+        _catalog_dirty = False
+    gifts_by_level = {}
+    for gift_id, level in Gift.objects.order_by('required_star_level', 'id').values_list('id', 'required_star_level'):
+        gifts_by_level.setdefault(level, []).append(gift_id)
+    catalog = {level: tuple(gift_ids) for level, gift_ids in gifts_by_level.items()}
+    if not _catalog_dirty:
+        _catalog = (time.monotonic(), catalog)
+    return catalog
+
+
+def invalidate_gift_catalog():
+    """Reload the catalog on next use, and again once the transaction changing it commits."""
+    global _catalog, _catalog_dirty
+    _catalog, _catalog_dirty = None, True
+
+    def drop():
+        global _catalog, _catalog_dirty
+        _catalog, _catalog_dirty = None, False
+    transaction.on_commit(drop)
+
+
+def award_gifts(agent_levels, batch_size=1000):
+    """
+    Create the pending AgentGift rows implied by ``{agent_id: star_level}``.
+
+    Agents receive the gifts of every level from 1★ up to their own, so
+    one that jumps several levels at once gets all of them. Rows that
+    already exist are skipped by the (agent, gift) unique constraint, in
+    one ``INSERT`` per ``batch_size`` rows.
+    """
+    catalog = gift_catalog()
+    awards = [
+        AgentGift(agent_id=agent_id, gift_id=gift_id, status='pending')
+        for agent_id, level in agent_levels.items()
+        for gift_level, gift_ids in catalog.items()
+        if 1 <= gift_level <= level
+        for gift_id in gift_ids
+    ]
+    AgentGift.objects.bulk_create(awards, batch_size=batch_size, ignore_conflicts=True)
+    return len(awards)
+
+
+def revoke_unearned_gifts(agent_levels):
+    """
+    Apply ``UNEARNED_GIFT_POLICY`` to agents who dropped to ``{agent_id: star_level}``.
+
+    ``'keep'`` leaves every awarded gift in place. ``'revoke_pending'``
+    withdraws the gifts above the new level that have not been delivered
+    yet; delivered gifts always stay. One DELETE per distinct level.
+    Returns the number of gifts withdrawn.
+    """
+    if settings.UNEARNED_GIFT_POLICY == 'keep':
+        return 0
+    agents_by_level = {}
+    for agent_id, level in agent_levels.items():
+        agents_by_level.setdefault(level, []).append(agent_id)
+    revoked = 0
+    for level, agent_ids in agents_by_level.items():
+        revoked += AgentGift.objects.filter(
+            agent_id__in=agent_ids, status='pending', gift__required_star_level__gt=level,
+        ).delete()[0]
+    return revoked
+
+
+def _agent_range(min_id=None, max_id=None):
+    agents = Agent.objects.all()
+    if min_id is not None:
+        agents = agents.filter(pk__gte=min_id)
+    if max_id is not None:
+        agents = agents.filter(pk__lte=max_id)
+    return agents
+
+
+def retier_all(min_id=None, max_id=None):
+    """
+    Re-tier every agent (optionally within an id range) in one statement.
+
+    ``UPDATE ... SET star_level = CASE ... END`` over the tier table, touching
+    only rows whose level actually changes. Returns the number of agents updated.
+    """
+    tier = star_level_case()
+    updated = _agent_range(min_id, max_id).exclude(star_level=tier).update(star_level=tier)
+    if updated:
+        invalidate_leaderboard()
+    return updated
+
+
+def award_gifts_for_tiers(min_id=None, max_id=None):
+    """
+    Insert every missing pending AgentGift implied by the agents' current tiers.
+
+    One ``INSERT ... SELECT`` joins agents to the gifts of every level up to
+    their own and skips pairs that already exist. Returns the number of
+    rows inserted.
+    """
+    qn = connection.ops.quote_name
+    agent_gift, agent, gift = (
+        qn(AgentGift._meta.db_table), qn(Agent._meta.db_table), qn(Gift._meta.db_table)
+    )
+    conditions, params = [f"a.{qn('star_level')} >= 1"], [connection.ops.adapt_datetimefield_value(timezone.now())]
+    if min_id is not None:
+        conditions.append(f"a.{qn('id')} >= %s")
+        params.append(min_id)
+    if max_id is not None:
+        conditions.append(f"a.{qn('id')} <= %s")
+        params.append(max_id)
+    sql = f"""
+        INSERT INTO {agent_gift} ({qn('agent_id')}, {qn('gift_id')}, {qn('status')}, {qn('date_earned')})
+        SELECT a.{qn('id')}, g.{qn('id')}, 'pending', %s
+        FROM {agent} a
+        JOIN {gift} g ON g.{qn('required_star_level')} BETWEEN 1 AND a.{qn('star_level')}
+        WHERE {' AND '.join(conditions)}
+          AND NOT EXISTS (
+              SELECT 1 FROM {agent_gift} ag
+              WHERE ag.{qn('agent_id')} = a.{qn('id')} AND ag.{qn('gift_id')} = g.{qn('id')}
+          )
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def reconcile_points(min_id=None, max_id=None):
+    """
+    Reset total_points to the sum of each agent's payments where they differ.
+
+    A safety net for the incremental updates (``Agent.add_points``): one
+    ``UPDATE ... SET total_points = (SELECT SUM(points) ...)`` touching only
+    the agents that drifted. Returns the number of agents corrected.
+    """
+    paid = (
+        Payment.objects.filter(agent=OuterRef('pk')).order_by()
+        .values('agent').annotate(total=Sum('points')).values('total')
+    )
+    expected = Coalesce(Subquery(paid), 0)
+    corrected = _agent_range(min_id, max_id).exclude(total_points=expected).update(total_points=expected)
+    if corrected:
+        invalidate_leaderboard()
+    return corrected
+
+
+def revoke_gifts_for_tiers(min_id=None, max_id=None):
+    """
+    Apply ``UNEARNED_GIFT_POLICY`` to every agent's pending gifts above their current tier.
+
+    Returns the number of gifts withdrawn (always 0 under ``'keep'``).
+    """
+    if settings.UNEARNED_GIFT_POLICY == 'keep':
+        return 0
+    return AgentGift.objects.filter(
+        agent__in=_agent_range(min_id, max_id), status='pending',
+        gift__required_star_level__gt=F('agent__star_level'),
+    ).delete()[0]
@@ -0,0 +1,129 @@
+"""
+Search, filter and sort vocabularies shared by the "View All" pages and the JSON API.
+
+Each ``*_SORTS`` dict maps a ``?sort=`` key to the model field it orders
+by, and each ``filter_*`` function applies the list's ``?search=`` and
+filter parameters to a queryset, so a URL means the same on both.
+"""
+from .models import SearchEntry
+from .search import matching_ids
+
+
+AGENT_SORTS = {
+    'name': 'username',
+    '-name': '-username',
+    'email': 'email',
+    '-email': '-email',
+    'points': 'total_points',
+    '-points': '-total_points',
+    'star': 'star_level',
+    '-star': '-star_level',
+    'customers': 'customer_count',
+    '-customers': '-customer_count',
+    'payments': 'payment_count',
+    '-payments': '-payment_count',
+    'amount': 'total_amount',
+    '-amount': '-total_amount',
+    'id': 'id',
+    '-id': '-id'
+}
+CUSTOMER_SORTS = {
+    'name': 'name',
+    '-name': '-name',
+    'email': 'email',
+    '-email': '-email',
+    'agent': 'agent__username',
+    '-agent': '-agent__username',
+    'payments': 'payment_count',
+    '-payments': '-payment_count',
+    'amount': 'total_amount',
+    '-amount': '-total_amount',
+    'id': 'id',
+    '-id': '-id'
+}
+PROJECT_SORTS = {
+    'name': 'name',
+    '-name': '-name',
+    'type': 'project_type',
+    '-type': '-project_type',
+    'created': 'created_at',
+    '-created': '-created_at',
+    'id': 'id',
+    '-id': '-id'
+}
+PAYMENT_SORTS = {
+    'customer': 'customer__name',
+    '-customer': '-customer__name',
+    'agent': 'agent__username',
+    '-agent': '-agent__username',
+    'amount': 'amount',
+    '-amount': '-amount',
+    'points': 'points',
+    '-points': '-points',
+    'project': 'project__name',
+    '-project': '-project__name',
+    'date': 'date',
+    '-date': '-date',
+    'id': 'id',
+    '-id': '-id'
+}
+AGENT_GIFT_SORTS = {
+    'earned': 'date_earned',
+    '-earned': '-date_earned',
+    'delivered': 'date_delivered',
+    '-delivered': '-date_delivered',
+    'status': 'status',
+    '-status': '-status',
+    'id': 'id',
+    '-id': '-id'
+}
+
+
+def _search(queryset, kind, params):
+    search_query = params.get('search', '').strip()
+    if search_query:
+        queryset = queryset.filter(pk__in=matching_ids(kind, search_query))
+    return queryset
+
+
+def _id_filter(queryset, field, value):
+    if value and value.isdigit():
+        queryset = queryset.filter(**{field: int(value)})
+    return queryset
+
+
+def filter_agents(queryset, params):
+    """``?search=`` and ``?star_level=``."""
+    queryset = _search(queryset, SearchEntry.KIND_AGENT, params)
+    return _id_filter(queryset, 'star_level', params.get('star_level', ''))
+
+
+def filter_customers(queryset, params):
+    """``?search=`` and ``?agent=`` (an agent id)."""
+    queryset = _search(queryset, SearchEntry.KIND_CUSTOMER, params)
+    return _id_filter(queryset, 'agent_id', params.get('agent', ''))
+
+
+def filter_projects(queryset, params):
+    """``?search=`` and ``?project_type=``."""
+    queryset = _search(queryset, SearchEntry.KIND_PROJECT, params)
+    project_type = params.get('project_type', '')
+    if project_type:
+        queryset = queryset.filter(project_type=project_type)
+    return queryset
+
+
+def filter_payments(queryset, params):
+    """``?search=``, ``?agent=`` and ``?project=`` (ids)."""
+    queryset = _search(queryset, SearchEntry.KIND_PAYMENT, params)
+    queryset = _id_filter(queryset, 'agent_id', params.get('agent', ''))
+    return _id_filter(queryset, 'project_id', params.get('project', ''))
+
+
+def filter_agent_gifts(queryset, params):
+    """``?agent=`` (an agent id) and ``?status=``."""
+    queryset = _id_filter(queryset, 'agent_id', params.get('agent', ''))
+    status = params.get('status', '')
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
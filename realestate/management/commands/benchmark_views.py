@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import URLPattern, reverse
+from statistics import median, quantiles
+import asyncio
+import json
+import time
+
+from realestate.profiling import capture
+
+
+# Views that change data or end the session are not benchmarked
+SKIPPED_VIEWS = {
+    'delete_agent', 'delete_customer', 'delete_project', 'delete_payment',
+    'update_gift_status', 'agent_logout', 'admin-logout',
+}
+# Views served to a logged-in agent rather than to staff
+AGENT_VIEWS = {'agent_dashboard', 'leaderboard'}
+# Extra query strings timed alongside the bare URL
+VARIANTS = {
+    'all_agents': ['sort=-total_points', 'star_level=3'],
+    'all_customers': ['search=reddy', 'sort=name'],
+    'all_payments': ['search=kumar', 'sort=-amount'],
+    'all_projects': ['search=green'],
+    'leaderboard': ['board=level', 'board=month'],
+    'global_search': ['q=ravi', 'q=AG0000'],
+    'search_suggest': ['q=sur'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every GET view in realestate/urls.py and report p50/p95 latency and query counts, '
+        'through the WSGI or ASGI handler and optionally under concurrent load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per URL (per worker)')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Serve requests through the WSGI handler (threads) or the ASGI handler (event loop)')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Workers requesting each URL at the same time')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per URL first')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Fail if results regress against this JSON baseline')
+        parser.add_argument('--tolerance', type=float, default=1.25, help='Allowed p95 growth factor when comparing')
+
+    def handle(self, *args, **options):
+        # The test clients send "Host: testserver", as Django's test runner allows
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.run(options)
+
+    def run(self, options):
+        from realestate import urls
+        from realestate.models import Agent
+
+        staff = Agent.objects.filter(is_staff=True).first()
+        # The agent with the most business is the worst case for per-agent pages
+        agent = Agent.objects.filter(is_staff=False).order_by('-total_points').first()
+        if staff is None or agent is None:
+            raise CommandError("Need a staff user and an agent; run generate_load_data and createsuperuser first")
+
+        # One logged-in client per worker and role, like separate browsers
+        client_class = AsyncClient if options['mode'] == 'asgi' else Client
+        clients = {'staff': [], 'agent': []}
+        for role, user in (('staff', staff), ('agent', agent)):
+            for _ in range(max(options['concurrency'], 1)):
+                client = client_class()
+                client.force_login(user)
+                clients[role].append(client)
+        self.stdout.write(f"⏱️  {options['mode'].upper()} handler, {len(clients['staff'])} concurrent worker(s)")
+
+        results = []
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED_VIEWS:
+                continue
+            url = self.build_url(pattern)
+            if url is None:
+                self.stdout.write(self.style.WARNING(f"⚠️  Skipping {pattern.name}: no row to point it at"))
+                continue
+            role = 'agent' if pattern.name in AGENT_VIEWS else 'staff'
+            for query in ['', *VARIANTS.get(pattern.name, [])]:
+                full_url = f'{url}?{query}' if query else url
+                results.append(self.measure(pattern.name, full_url, clients[role], options))
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"💾 Results written to {options['output']}")
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def build_url(self, pattern):
+        """Reverse ``pattern``, filling any ``<int:x_id>`` argument with an existing row."""
+        from realestate.models import Agent, AgentGift, Customer, Payment, Project
+
+        sources = {
+            'agent_id': Agent.objects.filter(is_staff=False),
+            'customer_id': Customer.objects.all(),
+            'project_id': Project.objects.all(),
+            'payment_id': Payment.objects.all(),
+            'gift_id': AgentGift.objects.all(),
+        }
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            pk = sources[name].order_by('pk').values_list('pk', flat=True).first() if name in sources else None
+            if pk is None:
+                return None
+            kwargs[name] = pk
+        return reverse(pattern.name, kwargs=kwargs)
+
+    def measure(self, name, url, clients, options):
+        """Time ``url`` with every client requesting it at once; samples are ``(ms, queries, status)``."""
+        started = time.perf_counter()
+        if options['mode'] == 'asgi':
+            samples = asyncio.run(self.run_async(clients, url, options))
+        else:
+            samples = self.run_threads(clients, url, options)
+        elapsed = time.perf_counter() - started
+
+        timings = [ms for ms, _, _ in samples]
+        p95 = quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        return {
+            'view': name,
+            'url': url,
+            'mode': options['mode'],
+            'concurrency': len(clients),
+            'status': samples[-1][2],
+            'p50_ms': round(median(timings), 2),
+            'p95_ms': round(p95, 2),
+            'rps': round(len(samples) / elapsed, 1),
+            # Counted through the profiler, so queries on aio's pool threads are included
+            'queries': max(queries for _, queries, _ in samples),
+        }
+
+    def run_threads(self, clients, url, options):
+        def timed_get(client):
+            with capture() as profile:
+                started = time.perf_counter()
+                response = client.get(url)
+                ms = (time.perf_counter() - started) * 1000
+            return ms, len(profile.queries), response.status_code
+
+        def worker(client):
+            for _ in range(options['warmup']):
+                client.get(url)
+            return [timed_get(client) for _ in range(options['iterations'])]
+
+        if len(clients) == 1:
+            return worker(clients[0])
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            return [sample for samples in pool.map(worker, clients) for sample in samples]
+
+    async def run_async(self, clients, url, options):
+        async def timed_get(client):
+            with capture() as profile:
+                started = time.perf_counter()
+                response = await client.get(url)
+                ms = (time.perf_counter() - started) * 1000
+            return ms, len(profile.queries), response.status_code
+
+        async def worker(client):
+            for _ in range(options['warmup']):
+                await client.get(url)
+            return [await timed_get(client) for _ in range(options['iterations'])]
+
+        results = await asyncio.gather(*(worker(client) for client in clients))
+        return [sample for samples in results for sample in samples]
+
+    def report(self, results):
+        width = max(len(result['url']) for result in results)
+        self.stdout.write(
+            f"{'URL':<{width}}  {'status':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'req/s':>8}  {'queries':>7}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['url']:<{width}}  {result['status']:>6}  {result['p50_ms']:>9.2f}  "
+                f"{result['p95_ms']:>9.2f}  {result['rps']:>8.1f}  {result['queries']:>7}"
+            )
+
+    def compare(self, results, baseline_file, tolerance):
+        with open(baseline_file, encoding='utf-8') as f:
+            baseline = {entry['url']: entry for entry in json.load(f)}
+        regressions = []
+        for result in results:
+            before = baseline.get(result['url'])
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{result['url']}: {before['queries']} → {result['queries']} queries")
+            if result['p95_ms'] > before['p95_ms'] * tolerance:
+                regressions.append(f"{result['url']}: p95 {before['p95_ms']:.1f} → {result['p95_ms']:.1f} ms")
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(f"❌ {line}"))
+            raise CommandError(f"{len(regressions)} regressions against {baseline_file}")
+        self.stdout.write(self.style.SUCCESS(f"✅ No regressions against {baseline_file}"))
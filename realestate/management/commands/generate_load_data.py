@@ -0,0 +1,217 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat, LPad
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+import random
+import time
+
+from realestate.bulk import bulk_create_dated
+
+
+# agents, customers, projects, payments
+SIZES = {
+    'tiny': (50, 500, 10, 5_000),
+    'small': (1_000, 10_000, 50, 100_000),
+    'medium': (10_000, 100_000, 200, 1_000_000),
+    'large': (20_000, 500_000, 500, 5_000_000),
+}
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Anil', 'Anjali', 'Arjun', 'Bhavana', 'Chaitanya', 'Deepa', 'Divya', 'Ganesh',
+    'Harini', 'Karthik', 'Kavya', 'Lakshmi', 'Mahesh', 'Meera', 'Naveen', 'Neha', 'Pooja', 'Pradeep',
+    'Priya', 'Rahul', 'Ramesh', 'Ravi', 'Sai', 'Sandeep', 'Sangeetha', 'Srinivas', 'Suresh', 'Swathi',
+    'Teja', 'Uma', 'Varun', 'Venkat', 'Vijay', 'Vikram', 'Yamini',
+]
+LAST_NAMES = [
+    'Reddy', 'Rao', 'Naidu', 'Sharma', 'Varma', 'Kumar', 'Goud', 'Chowdary', 'Patel', 'Iyer',
+    'Nair', 'Menon', 'Gupta', 'Shetty', 'Pillai', 'Murthy', 'Prasad', 'Raju', 'Yadav', 'Singh',
+]
+PROJECT_WORDS = [
+    'Green', 'Meadows', 'Sunrise', 'Lake', 'View', 'Royal', 'Palms', 'Heights', 'Orchid', 'Valley',
+    'Silver', 'Oak', 'Garden', 'City', 'Enclave', 'Residency', 'Pearl', 'Grove', 'Hills', 'Park',
+]
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with seeded synthetic agents, customers, projects, payments and gifts for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=SIZES, default='small', help='Preset volumes (default: small)')
+        parser.add_argument('--agents', type=int, help='Override the number of agents')
+        parser.add_argument('--customers', type=int, help='Override the number of customers')
+        parser.add_argument('--projects', type=int, help='Override the number of projects')
+        parser.add_argument('--payments', type=int, help='Override the number of payments')
+        parser.add_argument('--months', type=int, default=24, help='Spread payment dates over this many past months')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted and committed per batch')
+        parser.add_argument('--password', default='loadtest', help='Password for every generated agent')
+
+    def handle(self, *args, **options):
+        from realestate.models import Agent, AgentGift, Gift
+        from realestate.ledger import apply_points_deltas, retier_all, award_gifts_for_tiers
+        from realestate import counters, rollups, search
+        from realestate.stats import invalidate_dashboard_stats
+
+        agents, customers, projects, payments = SIZES[options['size']]
+        agents = options['agents'] or agents
+        customers = options['customers'] or customers
+        projects = options['projects'] or projects
+        payments = options['payments'] if options['payments'] is not None else payments
+        if min(agents, customers, projects) < 1:
+            raise CommandError("Need at least one agent, customer and project")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = f"ld{options['seed']}"
+        self.now = timezone.now()
+        self.span = timedelta(days=30 * options['months']).total_seconds()
+        if Agent.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(f"Load data for seed {options['seed']} already exists; use another --seed")
+
+        self.stdout.write(
+            f"🔄 Generating {agents:,} agents, {customers:,} customers, {projects:,} projects "
+            f"and {payments:,} payments (seed {options['seed']})..."
+        )
+        started = time.monotonic()
+        Gift.create_default_gifts()
+
+        project_rows = self.create_projects(projects)
+        agent_ids = self.create_agents(agents, make_password(options['password']))
+        customer_agents = self.create_customers(customers, agent_ids)
+        deltas = self.create_payments(payments, customer_agents, project_rows)
+
+        self.stdout.write("⭐ Applying points, star levels and gifts...")
+        with transaction.atomic():
+            items = list(deltas.items())
+            for start in range(0, len(items), 1000):
+                apply_points_deltas(dict(items[start:start + 1000]))
+            retier_all(min(agent_ids), max(agent_ids))
+            award_gifts_for_tiers(min(agent_ids), max(agent_ids))
+            gifts = AgentGift.objects.filter(agent__gte=min(agent_ids), agent__lte=max(agent_ids))
+            # Roughly a third of earned gifts have been handed over
+            delivered = (
+                gifts.alias(bucket=F('id') % 3).filter(bucket=0)
+                .update(status='delivered', date_delivered=self.now)
+            )
+        self.stdout.write(f"  ✅ {gifts.count():,} agent gifts ({delivered:,} delivered)")
+
+        self.stdout.write("📈 Rebuilding monthly rollup, counters and search index...")
+        rollups.rebuild(batch_size=self.batch_size)
+        counters.reconcile(batch_size=self.batch_size)
+        with transaction.atomic():
+            search.rebuild(batch_size=self.batch_size)
+        invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 Load data generated in {time.monotonic() - started:.1f}s. "
+            f"Agents log in as {self.prefix}_agent<N> / {options['password']}"
+        ))
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.span)
+
+    def insert(self, label, model, rows, total):
+        """Bulk insert ``rows`` (a generator) in committed batches; return the created objects' ids."""
+        started = time.monotonic()
+        ids, batch = [], []
+
+        def flush():
+            with transaction.atomic():
+                ids.extend(obj.pk for obj in bulk_create_dated(model, batch))
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  … {len(ids):,}/{total:,} {label} ({len(ids) / elapsed:,.0f}/s)")
+
+        for obj in rows:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+        self.stdout.write(self.style.SUCCESS(f"  ✅ {len(ids):,} {label}"))
+        return ids
+
+    def create_projects(self, count):
+        from realestate.models import Project
+
+        types = [Project.TYPE_LAYOUT, Project.TYPE_CONSTRUCTION]
+        rows = [
+            Project(
+                name=f"{' '.join(self.rng.sample(PROJECT_WORDS, 2))} {self.prefix.upper()}-{i}",
+                project_type=self.rng.choice(types),
+                created_at=self.random_date(),
+            )
+            for i in range(count)
+        ]
+        ids = self.insert('projects', Project, iter(rows), count)
+        return [(pk, project.project_type) for pk, project in zip(ids, rows)]
+
+    def create_agents(self, count, password):
+        from realestate.models import Agent
+
+        rows = (
+            Agent(
+                username=f'{self.prefix}_agent{i}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                email=f'{self.prefix}.agent{i}@example.com',
+                password=password,
+            )
+            for i in range(count)
+        )
+        ids = self.insert('agents', Agent, rows, count)
+        # bulk_create skips Agent.save(), which assigns agent numbers
+        Agent.objects.filter(pk__in=ids, agent_number__isnull=True).update(
+            agent_number=Concat(Value('AG'), LPad(Cast('id', CharField()), 6, Value('0')))
+        )
+        return ids
+
+    def create_customers(self, count, agent_ids):
+        """Customers spread over agents with a long tail (a few agents have most of them)."""
+        from realestate.models import Customer
+
+        cumulative = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(agent_ids))))
+        owners = self.rng.choices(agent_ids, cum_weights=cumulative, k=count)
+        rows = (
+            Customer(
+                name=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                email=f'{self.prefix}.customer{i}@example.com',
+                agent_id=owners[i],
+                created_at=self.random_date(),
+            )
+            for i in range(count)
+        )
+        ids = self.insert('customers', Customer, rows, count)
+        return list(zip(ids, owners))
+
+    def create_payments(self, count, customer_agents, projects):
+        """Insert payments and return the PV they add per agent."""
+        from realestate.models import Payment
+
+        deltas = {}
+
+        def rows():
+            for i in range(count):
+                customer_id, agent_id = self.rng.choice(customer_agents)
+                project_id, project_type = self.rng.choice(projects)
+                # Log-normal amounts: median around ₹2.7 lakh, rounded to the thousand
+                amount = Decimal(max(10_000, round(self.rng.lognormvariate(12.5, 0.8), -3)))
+                points = Payment.calculate_points(amount, project_type)
+                deltas[agent_id] = deltas.get(agent_id, 0) + points
+                yield Payment(
+                    customer_id=customer_id,
+                    agent_id=agent_id,
+                    project_id=project_id,
+                    amount=amount,
+                    points=points,
+                    receipt_number=f'{self.prefix.upper()}-{i:09d}',
+                    date=self.random_date(),
+                )
+
+        self.insert('payments', Payment, rows(), count)
+        return deltas
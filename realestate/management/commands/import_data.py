@@ -1,80 +1,166 @@
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
 import json
-from django.db import transaction
+import time
+
+from realestate.bulk import bulk_create_dated
+
+
+class ExportStream:
+    """
+    Walks a ``{"section": [obj, ...], ...}`` export file without loading it.
+
+    Objects are decoded one at a time from a sliding buffer, so memory use
+    depends on the size of one record, not of the file.
+    """
+
+    def __init__(self, path, read_size=1 << 16):
+        self.path = path
+        self.read_size = read_size
+
+    def sections(self):
+        """Yield ``(name, items)`` for each top-level key; ``items`` must be consumed in order."""
+        self.decoder = json.JSONDecoder()
+        with open(self.path, 'r', encoding='utf-8') as self.file:
+            self.buffer, self.pos, self.eof = '', 0, False
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                name = self._decode()
+                self._expect(':')
+                if self._peek() == '[':
+                    items = self._items()
+                    yield name, items
+                    for _ in items:  # drain anything the caller skipped
+                        pass
+                else:
+                    self._decode()
+                if self._peek() == ',':
+                    self.pos += 1
+                    continue
+                self._expect('}')
+                return
+
+    def _items(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect(']')
+            return
+
+    def _fill(self):
+        chunk = self.file.read(self.read_size)
+        if not chunk:
+            self.eof = True
+        # Drop what has been consumed so the buffer stays small
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise json.JSONDecodeError('Unexpected end of file', self.buffer, self.pos)
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expected '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+class SectionFailed(Exception):
+    pass
+
 
 class Command(BaseCommand):
     help = 'Import data from Render export file'
 
     def add_arguments(self, parser):
         parser.add_argument('export_file', type=str, nargs='?', default='data_export/render_data_export_20251003_192946.json', help='Path to the export file')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Objects inserted per statement')
 
     def handle(self, *args, **options):
         """Import data from export file - only if database is empty"""
-        
+
         from realestate.models import Agent, Customer, Payment, Project, Gift, AgentGift
-        
+
         # Check if database already has data
-        total_records = (
-            Agent.objects.count() + 
-            Customer.objects.count() + 
-            Project.objects.count() + 
-            Payment.objects.count() + 
-            AgentGift.objects.count()
-        )
-        
-        if total_records > 0:
+        if any(model.objects.exists() for model in (Agent, Customer, Project, Payment, AgentGift)):
             self.stdout.write(self.style.WARNING("⚠️  Database already contains data. Skipping import to prevent data loss."))
             self.stdout.write(f"📊 Current data: Agents={Agent.objects.count()}, Customers={Customer.objects.count()}, Projects={Project.objects.count()}, Payments={Payment.objects.count()}, Agent Gifts={AgentGift.objects.count()}")
             return
-        
+
         export_file = options['export_file']
-        
+        batch_size = options['batch_size']
+
+        self.stdout.write("🔄 Starting initial data import from Render...")
+        self.stdout.write("ℹ️  This will only run once when database is empty.")
+
+        # Sections and the sections they reference, so each is imported only
+        # once its foreign keys exist
+        dependencies = {
+            'gifts': (Gift, []),
+            'projects': (Project, []),
+            'agents': (Agent, []),
+            'customers': (Customer, ['agents']),
+            'payments': (Payment, ['customers', 'agents', 'projects']),
+            'agent_gifts': (AgentGift, ['agents', 'gifts']),
+        }
+
+        started = time.monotonic()
         try:
-            with open(export_file, 'r') as f:
-                export_data = json.load(f)
+            # All or nothing: a section that fails rolls the whole import
+            # back, so the database stays empty and the command can simply
+            # be run again once the export is fixed
+            with transaction.atomic():
+                self.import_sections(export_file, dependencies, batch_size)
+                self.finish_import([model for model, _ in dependencies.values()])
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"❌ Export file not found: {export_file}"))
             return
         except json.JSONDecodeError as e:
             self.stdout.write(self.style.ERROR(f"❌ Invalid JSON file: {e}"))
             return
-        
-        from django.core import serializers
-        
-        self.stdout.write("🔄 Starting initial data import from Render...")
-        self.stdout.write("ℹ️  This will only run once when database is empty.")
-        
-        # Import in correct order (respecting foreign key dependencies)
-        import_order = [
-            ('gifts', Gift),
-            ('projects', Project),
-            ('agents', Agent),
-            ('customers', Customer),
-            ('payments', Payment),
-            ('agent_gifts', AgentGift),
-        ]
-        
-        with transaction.atomic():
-            for model_name, model_class in import_order:
-                if model_name in export_data and export_data[model_name]:
-                    try:
-                        # Deserialize and save objects
-                        serialized_data = json.dumps(export_data[model_name])
-                        objects = serializers.deserialize('json', serialized_data)
-                        
-                        count = 0
-                        for obj in objects:
-                            obj.save()
-                            count += 1
-                        
-                        self.stdout.write(self.style.SUCCESS(f"✅ Imported {count} {model_name}"))
-                        
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"❌ Error importing {model_name}: {e}"))
-                        # Continue with other models
-        
-        self.stdout.write("🎉 Initial data import completed successfully!")
-        
+        except SectionFailed:
+            self.stdout.write(self.style.ERROR(
+                "❌ Import rolled back; nothing was imported. Fix the export file and run the command again."
+            ))
+            return
+
+        self.stdout.write(f"🎉 Initial data import completed in {time.monotonic() - started:.1f}s!")
+
         # Verify import
         self.stdout.write("🔍 Verifying import...")
         self.stdout.write(f"Agents: {Agent.objects.count()}")
@@ -83,3 +169,92 @@ class Command(BaseCommand):
         self.stdout.write(f"Payments: {Payment.objects.count()}")
         self.stdout.write(f"Gifts: {Gift.objects.count()}")
         self.stdout.write(f"Agent Gifts: {AgentGift.objects.count()}")
+
+    def import_sections(self, export_file, dependencies, batch_size):
+        """Import every known section once the sections it references are in."""
+        done = set()
+        # Sections are imported in file order when their dependencies are
+        # met; an export written in a different order takes extra passes.
+        while len(done) < len(dependencies):
+            progressed = False
+            for name, items in ExportStream(export_file).sections():
+                if name not in dependencies or name in done:
+                    continue
+                model, requires = dependencies[name]
+                if not all(dep in done for dep in requires):
+                    continue
+                try:
+                    self.import_section(name, model, items, batch_size)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"❌ Error importing {name}: {e}"))
+                    raise SectionFailed(name) from e
+                done.add(name)
+                progressed = True
+            if not progressed:
+                break
+
+    def finish_import(self, models):
+        """Fill in what the bulk inserts skipped: agent numbers, sequences and derived tables."""
+        from realestate.models import Agent
+
+        # bulk_create skips Agent.save(), which assigns agent numbers
+        Agent.objects.filter(agent_number__isnull=True).update(
+            agent_number=Concat(Value('AG'), LPad(Cast('id', CharField()), 6, Value('0')))
+        )
+
+        # Explicit primary keys were inserted, so move sequences past them
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        # Payments were inserted without Payment.save(), so build their rollup in one pass
+        from realestate.rollups import rebuild
+        rebuild()
+        # ...recount agents' and customers' business
+        from realestate.counters import reconcile
+        reconcile()
+        # ...and likewise their search entries
+        from realestate.search import rebuild as rebuild_search_index
+        rebuild_search_index()
+
+        from realestate.stats import invalidate_dashboard_stats
+        invalidate_dashboard_stats()
+
+    def import_section(self, name, model, items, batch_size):
+        """Deserialize ``items`` and bulk insert them ``batch_size`` objects at a time."""
+        update_fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+        started = time.monotonic()
+        count = 0
+        batch = []
+
+        def flush():
+            # Upsert on the primary key, like the save() this replaces
+            bulk_create_dated(
+                model,
+                [obj.object for obj in batch],
+                update_conflicts=True,
+                unique_fields=[model._meta.pk.name],
+                update_fields=update_fields,
+            )
+            for obj in batch:
+                for field_name, values in obj.m2m_data.items():
+                    if values:
+                        getattr(obj.object, field_name).set(values)
+
+        for obj in Deserializer(items, handle_forward_references=False):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                flush()
+                count += len(batch)
+                batch = []
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"  … {count} {name} ({count / elapsed:,.0f}/s)")
+        if batch:
+            flush()
+            count += len(batch)
+
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"✅ Imported {count} {name} ({rate:,.0f}/s)"))
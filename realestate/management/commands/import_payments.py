@@ -0,0 +1,132 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+import csv
+import json
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Bulk import payments from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input_file', type=str, help='CSV or NDJSON file of payments')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and inserted per transaction')
+        parser.add_argument('--rejects', type=str, help='Where to write rejected rows (default: <input>.rejected.<ext>)')
+
+    def handle(self, *args, **options):
+        """
+        Stream payments in, validate them a chunk at a time and bulk insert.
+
+        Rows are checked by ``payment_batches.validate_payment_rows``.
+        Agent points, the counters and the monthly rollup are incremented
+        per chunk; star levels and gifts are recomputed once per affected
+        agent at the end, including when a later chunk fails.
+        """
+        from realestate.payment_batches import insert_payments, settle_agents, validate_payment_rows
+        from realestate.stats import invalidate_dashboard_stats
+
+        input_file = options['input_file']
+        if not os.path.exists(input_file):
+            raise CommandError(f"Input file not found: {input_file}")
+        fmt = options['format'] or ('ndjson' if input_file.endswith(('.ndjson', '.jsonl')) else 'csv')
+        rejects_file = options['rejects'] or f"{os.path.splitext(input_file)[0]}.rejected.{fmt}"
+        chunk_size = options['chunk_size']
+
+        self.stdout.write(f"🔄 Importing payments from {input_file} ({fmt}, chunks of {chunk_size})...")
+
+        started = time.monotonic()
+        imported = rejected = 0
+        affected_agents = set()
+        seen_receipts = set()
+
+        try:
+            with open(input_file, newline='', encoding='utf-8') as source, \
+                    open(rejects_file, 'w', newline='', encoding='utf-8') as rejects:
+                rows = self.read_rows(source, fmt)
+                reject_writer = RejectWriter(rejects, fmt)
+
+                for chunk in self.chunked(rows, chunk_size):
+                    payments, dates, errors = validate_payment_rows(chunk, seen_receipts)
+                    for row, error in errors:
+                        reject_writer.write(row, error)
+
+                    with transaction.atomic():
+                        deltas = insert_payments(payments, dates, batch_size=chunk_size)
+
+                    affected_agents.update(deltas)
+                    imported += len(payments)
+                    rejected += len(errors)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"  ✅ {imported} imported, {rejected} rejected "
+                        f"({(imported + rejected) / elapsed:,.0f} rows/s)"
+                    )
+        finally:
+            # Chunks that committed before a failure still need settling
+            if affected_agents:
+                self.stdout.write(f"⭐ Recomputing star levels and gifts for {len(affected_agents)} agents...")
+                with transaction.atomic():
+                    settle_agents(affected_agents)
+            invalidate_dashboard_stats()
+
+        elapsed = time.monotonic() - started
+        rate = (imported + rejected) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 Imported {imported} payments in {elapsed:.1f}s ({rate:,.0f} rows/s)"
+        ))
+        if rejected:
+            self.stdout.write(self.style.WARNING(f"⚠️  {rejected} rows rejected, see {rejects_file}"))
+        else:
+            os.remove(rejects_file)
+
+    def read_rows(self, source, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {'_raw': line.rstrip('\n'), '_error': f"line {line_number}: invalid JSON ({e})"}
+                continue
+            if not isinstance(row, dict):
+                yield {'_raw': line.rstrip('\n'), '_error': f"line {line_number}: expected a JSON object"}
+                continue
+            yield row
+
+    def chunked(self, rows, size):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class RejectWriter:
+    """Writes rejected rows in the input format with an extra ``error`` field."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self.csv_writer = None
+
+    def write(self, row, error):
+        if self.fmt == 'ndjson':
+            if '_raw' in row:
+                self.stream.write(json.dumps({'raw': row['_raw'], 'error': error}) + '\n')
+            else:
+                self.stream.write(json.dumps({**row, 'error': error}, default=str) + '\n')
+            return
+        if self.csv_writer is None:
+            fieldnames = [k for k in row if k is not None] + ['error']
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction='ignore')
+            self.csv_writer.writeheader()
+        self.csv_writer.writerow({**row, 'error': error})
+
@@ -0,0 +1,19 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Drop the cached public pages (home, oxygen club) so the next request renders them again'
+
+    def handle(self, *args, **options):
+        from realestate.pagecache import purge
+
+        if isinstance(caches['default'], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                "⚠️  Nothing purged: the local-memory cache is private to each process. "
+                "Set REDIS_URL to share it, or restart the web processes."
+            ))
+            return
+        purge()
+        self.stdout.write(self.style.SUCCESS("✅ Page cache purged"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the per-agent monthly payment rollup from the payments table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rollup rows inserted per statement')
+
+    def handle(self, *args, **options):
+        from realestate.rollups import rebuild
+        from realestate.stats import invalidate_dashboard_stats
+
+        self.stdout.write("🔄 Rebuilding agent monthly stats...")
+        started = time.monotonic()
+        written = rebuild(batch_size=options['batch_size'])
+        invalidate_dashboard_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {written} rollup rows in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the full-text search entries for agents, customers, projects and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Entries written per statement')
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+        from realestate.search import rebuild
+
+        self.stdout.write("🔄 Rebuilding search index...")
+        started = time.monotonic()
+        with transaction.atomic():
+            counts = rebuild(batch_size=options['batch_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f"  {kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Indexed {sum(counts.values())} rows in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Recompute every agent star level from total PV and award the gifts the new tiers imply'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-id', type=int, help='Only agents with id >= this')
+        parser.add_argument('--max-id', type=int, help='Only agents with id <= this')
+
+    def handle(self, *args, **options):
+        from realestate.ledger import retier_all, award_gifts_for_tiers
+        from realestate.stats import invalidate_dashboard_stats
+
+        min_id, max_id = options['min_id'], options['max_id']
+        scope = 'all agents'
+        if min_id is not None or max_id is not None:
+            scope = f"agents {min_id if min_id is not None else '…'}–{max_id if max_id is not None else '…'}"
+        self.stdout.write(f"⭐ Recomputing star levels for {scope}...")
+
+        with transaction.atomic():
+            retiered = retier_all(min_id, max_id)
+            awarded = award_gifts_for_tiers(min_id, max_id)
+        invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {retiered} agent(s) changed level"))
+        self.stdout.write(self.style.SUCCESS(f"🎁 {awarded} gift(s) awarded"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = "Recompute agents' and customers' payment and customer counters, correcting any that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Agents or customers checked per transaction')
+
+    def handle(self, *args, **options):
+        from realestate.counters import reconcile
+
+        self.stdout.write("🧮 Reconciling agent and customer counters...")
+        started = time.monotonic()
+        corrected = reconcile(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+
+        if any(corrected.values()):
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  Corrected {corrected['agents']} agent(s) and {corrected['customers']} customer(s) "
+                f"in {elapsed:.1f}s"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Every counter matches in {elapsed:.1f}s"))
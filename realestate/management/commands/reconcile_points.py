@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Reset agent PV totals that drifted from the sum of their payments, re-tier, '
+        'and award or withdraw gifts to match'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-id', type=int, help='Only agents with id >= this')
+        parser.add_argument('--max-id', type=int, help='Only agents with id <= this')
+
+    def handle(self, *args, **options):
+        from realestate.ledger import (
+            reconcile_points, retier_all, award_gifts_for_tiers, revoke_gifts_for_tiers,
+        )
+        from realestate.stats import invalidate_dashboard_stats
+
+        min_id, max_id = options['min_id'], options['max_id']
+        self.stdout.write("🧮 Reconciling agent PV with their payments...")
+
+        with transaction.atomic():
+            corrected = reconcile_points(min_id, max_id)
+            retiered = retier_all(min_id, max_id)
+            awarded = award_gifts_for_tiers(min_id, max_id)
+            revoked = revoke_gifts_for_tiers(min_id, max_id)
+        invalidate_dashboard_stats()
+
+        if corrected:
+            self.stdout.write(self.style.WARNING(f"⚠️  {corrected} agent total(s) had drifted and were corrected"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Every agent total matches their payments"))
+        self.stdout.write(self.style.SUCCESS(f"⭐ {retiered} agent(s) changed level"))
+        self.stdout.write(self.style.SUCCESS(f"🎁 {awarded} gift(s) awarded, {revoked} withdrawn"))
@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+import django
+import signal
+import time
+
+
+def _run(job_id):
+    # Pool threads and processes live outside the request cycle, so they
+    # honour CONN_MAX_AGE themselves, like aio's query threads
+    from realestate.jobs import run_job
+
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def _init_process():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (payment side effects) with a thread or process pool, until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOB_WORKERS, help='Jobs run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Run jobs on threads (I/O-bound work) or separate processes (CPU-bound work)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per round')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        from realestate.jobs import claim, purge_finished, requeue_stale, worker_name
+
+        self.stopping = False
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+        worker = worker_name()
+        workers = max(options['workers'], 1)
+        self.stdout.write(f"👷 {worker}: {workers} {options['pool']} worker(s)")
+        if settings.JOBS_EAGER:
+            self.stdout.write(self.style.WARNING(
+                "⚠️  JOBS_EAGER is on here: new jobs run inline in the web process, "
+                "so this worker only picks up ones queued while it was off"
+            ))
+
+        if options['pool'] == 'process':
+            # Children must open their own database connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='realestate-job')
+
+        done = failed = 0
+        last_maintenance = 0.0
+        try:
+            while not self.stopping:
+                if time.monotonic() - last_maintenance > 60:
+                    requeued = requeue_stale(settings.JOB_LOCK_TIMEOUT)
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f"⚠️  Requeued {requeued} stale job(s)"))
+                    purge_finished(settings.JOB_RETENTION_DAYS)
+                    last_maintenance = time.monotonic()
+
+                job_ids = claim(worker, options['batch_size'])
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                if workers == 1 and options['pool'] == 'thread':
+                    results = [_run(job_id) for job_id in job_ids]
+                else:
+                    results = list(pool.map(_run, job_ids))
+                done += sum(results)
+                failed += len(results) - sum(results)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {done} job(s) done, {failed} failed or deferred"))
+
+    def stop(self, signum, frame):
+        # Finish the jobs in hand, then exit
+        self.stopping = True
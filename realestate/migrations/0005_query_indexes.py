@@ -0,0 +1,60 @@
+# Generated by Django 5.0.3 on 2026-10-18 02:27
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('realestate', '0004_agent_agent_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['star_level', 'id'], name='agent_star_level_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['total_points', 'id'], name='agent_total_points_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentgift',
+            index=models.Index(fields=['status', 'date_earned'], name='agentgift_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['agent', 'id'], name='customer_agent_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='customer_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['agent', 'date', 'id'], name='payment_agent_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['project', 'date', 'id'], name='payment_project_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='agent',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='customers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='agent',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='project',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='payments', to='realestate.project'),
+        ),
+    ]
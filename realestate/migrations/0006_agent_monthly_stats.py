@@ -0,0 +1,65 @@
+# Generated by Django 5.0.3 on 2026-10-18 02:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollup(apps, schema_editor):
+    """Seed the rollup from existing payments; later writes keep it current."""
+    Payment = apps.get_model('realestate', 'Payment')
+    AgentMonthlyStats = apps.get_model('realestate', 'AgentMonthlyStats')
+    totals = (
+        Payment.objects
+        .annotate(month=TruncMonth('date', output_field=models.DateField()))
+        .values('agent_id', 'month', 'project__project_type')
+        .annotate(amount=Sum('amount'), points=Sum('points'), payment_count=Count('id'))
+        .order_by()
+    )
+    AgentMonthlyStats.objects.bulk_create(
+        [
+            AgentMonthlyStats(
+                agent_id=row['agent_id'],
+                month=row['month'],
+                project_type=row['project__project_type'] or '',
+                amount=row['amount'],
+                points=row['points'],
+                payment_count=row['payment_count'],
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realestate', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('project_type', models.CharField(blank=True, choices=[('layout', 'Layout'), ('construction', 'Construction')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('points', models.IntegerField(default=0)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('agent', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'agent monthly stats',
+                'indexes': [models.Index(fields=['month', 'project_type'], name='monthly_stats_month_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agentmonthlystats',
+            constraint=models.UniqueConstraint(fields=('agent', 'month', 'project_type'), name='agent_month_type_uniq'),
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
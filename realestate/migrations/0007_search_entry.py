@@ -0,0 +1,158 @@
+# Generated by Django 5.0.3 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+FTS_TABLE = 'realestate_searchentry_fts'
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Titles (names, receipt numbers) weigh more than the rest of the text
+    """
+    ALTER TABLE realestate_searchentry ADD COLUMN document tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce("title", '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce("text", '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX search_entry_document_idx ON realestate_searchentry USING gin (document)",
+    'CREATE INDEX search_entry_text_trgm_idx ON realestate_searchentry USING gin ("text" gin_trgm_ops)',
+]
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS search_entry_text_trgm_idx",
+    "DROP INDEX IF EXISTS search_entry_document_idx",
+    "ALTER TABLE realestate_searchentry DROP COLUMN IF EXISTS document",
+]
+
+# External-content FTS5 table kept in sync with the entries by triggers
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, text, content='realestate_searchentry', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER realestate_searchentry_ai AFTER INSERT ON realestate_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER realestate_searchentry_ad AFTER DELETE ON realestate_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER realestate_searchentry_au AFTER UPDATE ON realestate_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS realestate_searchentry_au",
+    "DROP TRIGGER IF EXISTS realestate_searchentry_ad",
+    "DROP TRIGGER IF EXISTS realestate_searchentry_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_FORWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_REVERSE)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def populate_search_entries(apps, schema_editor):
+    """Index the rows that already exist; the model receivers take over from here."""
+    Agent = apps.get_model('realestate', 'Agent')
+    Customer = apps.get_model('realestate', 'Customer')
+    Project = apps.get_model('realestate', 'Project')
+    Payment = apps.get_model('realestate', 'Payment')
+    SearchEntry = apps.get_model('realestate', 'SearchEntry')
+    project_types = dict(Project._meta.get_field('project_type').choices)
+
+    def entries():
+        for a in Agent.objects.values('id', 'username', 'first_name', 'last_name', 'email', 'agent_number').iterator():
+            full_name = _join(a['first_name'], a['last_name'])
+            yield SearchEntry(
+                kind='agent', object_id=a['id'], title=a['username'],
+                detail=' · '.join(part for part in (a['agent_number'], full_name, a['email']) if part),
+                text=_join(a['username'], a['first_name'], a['last_name'], a['email'], a['agent_number']),
+            )
+        for c in Customer.objects.values('id', 'name', 'email').iterator():
+            yield SearchEntry(
+                kind='customer', object_id=c['id'], title=c['name'], detail=c['email'],
+                text=_join(c['name'], c['email']),
+            )
+        for p in Project.objects.values('id', 'name', 'project_type').iterator():
+            yield SearchEntry(
+                kind='project', object_id=p['id'], title=p['name'],
+                detail=project_types.get(p['project_type'], p['project_type']), text=p['name'],
+            )
+        payments = Payment.objects.values(
+            'id', 'receipt_number', 'amount', 'customer__name', 'agent__username', 'project__name',
+        )
+        for p in payments.iterator():
+            project_name = p['project__name'] or ''
+            yield SearchEntry(
+                kind='payment', object_id=p['id'], title=p['receipt_number'],
+                detail=' · '.join(part for part in (p['customer__name'], f"₹{p['amount']}", project_name) if part),
+                text=_join(p['receipt_number'], p['customer__name'], p['agent__username'], project_name),
+            )
+
+    batch = []
+    for entry in entries():
+        batch.append(entry)
+        if len(batch) >= 1000:
+            SearchEntry.objects.bulk_create(batch)
+            batch = []
+    SearchEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realestate', '0006_agent_monthly_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('agent', 'Agent'), ('customer', 'Customer'), ('project', 'Project'), ('payment', 'Payment')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('detail', models.CharField(blank=True, max_length=300)),
+                ('text', models.TextField()),
+            ],
+            options={
+                'verbose_name_plural': 'search entries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_kind_object_uniq'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.0.3 on 2026-10-18 03:19
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def count_business(apps, schema_editor):
+    """Seed the counters from existing rows; later writes keep them current."""
+    Agent = apps.get_model('realestate', 'Agent')
+    Customer = apps.get_model('realestate', 'Customer')
+    Payment = apps.get_model('realestate', 'Payment')
+
+    def total(model, key, aggregate, output_field):
+        rows = (
+            model.objects.filter(**{key: OuterRef('pk')}).order_by()
+            .values(key).annotate(total=aggregate).values('total')
+        )
+        return Coalesce(Subquery(rows, output_field=output_field), Value(0), output_field=output_field)
+
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    Agent.objects.update(
+        customer_count=total(Customer, 'agent', Count('id'), IntegerField()),
+        payment_count=total(Payment, 'agent', Count('id'), IntegerField()),
+        total_amount=total(Payment, 'agent', Sum('amount'), amount),
+    )
+    Customer.objects.update(
+        payment_count=total(Payment, 'customer', Count('id'), IntegerField()),
+        total_amount=total(Payment, 'customer', Sum('amount'), amount),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('realestate', '0008_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='customer_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='payment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='payment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(count_business, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['customer_count', 'id'], name='agent_customer_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['payment_count', 'id'], name='agent_payment_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['total_amount', 'id'], name='agent_total_amount_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['payment_count', 'id'], name='customer_payment_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['total_amount', 'id'], name='customer_total_amount_id_idx'),
+        ),
+    ]
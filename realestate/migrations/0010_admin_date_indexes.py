@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('realestate', '0009_agent_customer_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentgift',
+            index=models.Index(fields=['date_earned', 'id'], name='agentgift_date_earned_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['date', 'id'], name='payment_date_id_idx'),
+        ),
+    ]
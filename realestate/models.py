@@ -1,7 +1,35 @@
-from django.db import models
+from bisect import bisect_right
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+
+# PV (points) needed for each star level: STAR_THRESHOLDS[n - 1] unlocks n★.
+# 1★: 2,500; 2★: 7,500; 3★: 20,000; 4★: 50,000; 5★: 100,000; 6★: 250,000; 7★: 500,000
+STAR_THRESHOLDS = (2500, 7500, 20000, 50000, 100000, 250000, 500000)
+MAX_STAR_LEVEL = len(STAR_THRESHOLDS)
+
+
+def star_level_for(points):
+    """Star level (0-7) for a PV total, by binary search over STAR_THRESHOLDS."""
+    return bisect_right(STAR_THRESHOLDS, points)
+
+
+def star_level_case(points_field='total_points'):
+    """The same tier table as a SQL CASE expression, for set-based updates."""
+    return Case(
+        *[
+            When(**{f'{points_field}__gte': threshold}, then=Value(level))
+            for level, threshold in reversed(list(enumerate(STAR_THRESHOLDS, start=1)))
+        ],
+        default=Value(0),
+        output_field=models.IntegerField(),
+    )
 
 
 class Agent(AbstractUser):
@@ -14,42 +42,32 @@ class Agent(AbstractUser):
     total_points = models.IntegerField(default=0)
     # Star levels: 0 (no star) to 7. 1-star unlocked at 2,500 PV
     star_level = models.IntegerField(default=0)
+    # Maintained in place by counters.py; `manage.py reconcile_counters` repairs them
+    customer_count = models.IntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # all_agents: ?star_level= filter, and the points leaderboard sort;
+            # id is the keyset pagination tie-breaker.
+            models.Index(fields=['star_level', 'id'], name='agent_star_level_id_idx'),
+            models.Index(fields=['total_points', 'id'], name='agent_total_points_id_idx'),
+            # all_agents: sorts by the counters
+            models.Index(fields=['customer_count', 'id'], name='agent_customer_count_id_idx'),
+            models.Index(fields=['payment_count', 'id'], name='agent_payment_count_id_idx'),
+            models.Index(fields=['total_amount', 'id'], name='agent_total_amount_id_idx'),
+        ]
 
     def update_star_level(self):
         """Update star level based on total PV (points)."""
-        # New thresholds (PV):
-        # 1★: 2,500; 2★: 7,500; 3★: 20,000; 4★: 50,000; 5★: 100,000; 6★: 250,000; 7★: 500,000
-        if self.total_points >= 500000:
-            self.star_level = 7
-        elif self.total_points >= 250000:
-            self.star_level = 6
-        elif self.total_points >= 100000:
-            self.star_level = 5
-        elif self.total_points >= 50000:
-            self.star_level = 4
-        elif self.total_points >= 20000:
-            self.star_level = 3
-        elif self.total_points >= 7500:
-            self.star_level = 2
-        elif self.total_points >= 2500:
-            self.star_level = 1
-        else:
-            self.star_level = 0
+        self.star_level = star_level_for(self.total_points)
 
     def next_milestone(self):
         """Points needed for next star level based on thresholds."""
-        thresholds = {
-            0: 2500,
-            1: 7500,
-            2: 20000,
-            3: 50000,
-            4: 100000,
-            5: 250000,
-            6: 500000,
-        }
-        if self.star_level >= 7:
+        if self.star_level >= MAX_STAR_LEVEL:
             return 0
-        target = thresholds.get(self.star_level, 2500)
+        target = STAR_THRESHOLDS[max(self.star_level, 0)]
         return max(0, target - self.total_points)
 
     def next_milestone_display(self):
@@ -57,7 +75,39 @@ class Agent(AbstractUser):
         next_points = self.next_milestone()
         if next_points == 0:
             return "🎉 Max Level!"
-        return f"{next_points} PV to Level {min(self.star_level + 1, 7)}"
+        return f"{next_points} PV to Level {min(self.star_level + 1, MAX_STAR_LEVEL)}"
+
+    def add_points(self, delta):
+        """
+        Add ``delta`` PV (may be negative) and re-tier, race-free.
+
+        The increment is a single ``UPDATE ... SET total_points = total_points + n``
+        so concurrent payments for the same agent cannot overwrite each other;
+        the row lock it takes is held until the caller's transaction ends, so
+        the star level is recomputed from the committed-to value. Only the
+        changed columns are written. Reaching a new level awards the gifts of
+        every level up to it; dropping one applies ``UNEARNED_GIFT_POLICY``
+        to the gifts of the levels lost.
+        """
+        from .leaderboard import update_standing
+
+        Agent.objects.filter(pk=self.pk).update(total_points=F('total_points') + delta)
+        self.total_points, previous_level = (
+            Agent.objects.values_list('total_points', 'star_level').get(pk=self.pk)
+        )
+        self.update_star_level()
+        if self.star_level != previous_level:
+            self.save(update_fields=['star_level'])
+        if self.star_level > previous_level:
+            from .ledger import award_gifts
+            award_gifts({self.pk: self.star_level})
+        elif self.star_level < previous_level:
+            from .ledger import revoke_unearned_gifts
+            revoke_unearned_gifts({self.pk: self.star_level})
+        if delta:
+            update_standing(
+                self.pk, (self.total_points - delta, previous_level), (self.total_points, self.star_level)
+            )
 
     def save(self,*args,**kwargs):
         is_new = self.pk is None
@@ -74,8 +124,22 @@ class Agent(AbstractUser):
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
-    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="customers")
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="customers", db_index=False)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Maintained in place by counters.py; `manage.py reconcile_counters` repairs them
+    payment_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Replaces the plain agent_id FK index: agent filter + -id ordering.
+            models.Index(fields=['agent', 'id'], name='customer_agent_id_idx'),
+            # customer_login matches e-mails case-insensitively.
+            models.Index(Lower('email'), name='customer_email_lower_idx'),
+            # all_customers: sorts by the counters
+            models.Index(fields=['payment_count', 'id'], name='customer_payment_count_id_idx'),
+            models.Index(fields=['total_amount', 'id'], name='customer_total_amount_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -96,48 +160,80 @@ class Project(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_project_type_display()})"
 
+def _ledger_figures(agent_id, customer_id, date, project_type, amount, points):
+    """One side of a payment change, as a JSON-ready job payload."""
+    return {
+        'agent_id': agent_id, 'customer_id': customer_id, 'date': date.isoformat(),
+        'project_type': project_type, 'amount': str(amount), 'points': points,
+    }
+
+
 class Payment(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="payments")
-    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="payments")
-    project = models.ForeignKey(Project, on_delete=models.PROTECT, related_name="payments", null=True, blank=True)
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="payments", db_index=False)
+    project = models.ForeignKey(Project, on_delete=models.PROTECT, related_name="payments", null=True, blank=True, db_index=False)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     points = models.IntegerField(default=0)
     receipt_number = models.CharField(max_length=100, unique=True)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Per-agent / per-project payment history, newest first. These
+            # replace the plain FK indexes, which are prefixes of them.
+            models.Index(fields=['agent', 'date', 'id'], name='payment_agent_date_idx'),
+            models.Index(fields=['project', 'date', 'id'], name='payment_project_date_idx'),
+            # All payments newest first, and the admin's date hierarchy ranges
+            models.Index(fields=['date', 'id'], name='payment_date_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Ensure amount is a decimal for calculation
         if isinstance(self.amount, str):
             from decimal import Decimal
             self.amount = Decimal(self.amount)
 
-        # PV calculation based on project type
-        if self.project.project_type == Project.TYPE_LAYOUT:
+        self.points = self.calculate_points(self.amount, self.project.project_type)
+
+        from .jobs import enqueue
+
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Payment.objects.filter(pk=self.pk).values(
+                    'agent_id', 'customer_id', 'points', 'amount', 'date', 'project__project_type'
+                ).first()
+            super().save(*args, **kwargs)
+
+            # The rollup, counter, PV, tier and gift updates follow in a job
+            # (ledger.apply_payment): run right here unless JOBS_EAGER is off,
+            # otherwise by run_workers once this transaction commits
+            enqueue('payment.ledger', {
+                'payment_id': self.pk,
+                'previous': previous and _ledger_figures(
+                    previous['agent_id'], previous['customer_id'], previous['date'],
+                    previous['project__project_type'], previous['amount'], previous['points'],
+                ),
+                'current': _ledger_figures(
+                    self.agent_id, self.customer_id, self.date, self.project.project_type,
+                    self.amount, self.points,
+                ),
+            })
+
+    @staticmethod
+    def calculate_points(amount, project_type):
+        """PV for a payment: 1 per ₹1,000 on layout projects, 1 per ₹3,000 on construction."""
+        if project_type == Project.TYPE_LAYOUT:
             divisor = 1000
         else:
             divisor = 3000
-        self.points = int(self.amount / divisor)
-
-        super().save(*args, **kwargs)
-        self.agent.total_points += self.points
-        self.agent.update_star_level()
-        self.agent.save()
-        self.check_and_create_gifts()
+        return int(amount / divisor)
 
     def check_and_create_gifts(self):
-        """Check if agent qualifies for new gifts and create them"""
-        agent = self.agent
-        current_star_level = agent.star_level
-        
-        # Create gifts for current star level (including 1-star)
-        if current_star_level >= 1:
-            available_gifts = Gift.objects.filter(required_star_level=current_star_level)
-            for gift in available_gifts:
-                AgentGift.objects.get_or_create(
-                    agent=agent,
-                    gift=gift,
-                    defaults={'status': 'pending'}
-                )
+        """Award the agent any missing gifts of their current level and below."""
+        from .ledger import award_gifts
+
+        award_gifts({self.agent_id: self.agent.star_level})
 
     def __str__(self):
         return f"{self.customer.name} - ₹{self.amount}"
@@ -206,14 +302,228 @@ class AgentGift(models.Model):
 
     class Meta:
         unique_together = ['agent', 'gift']
+        indexes = [
+            # admin_dashboard: latest pending gifts.
+            models.Index(fields=['status', 'date_earned'], name='agentgift_status_date_idx'),
+            # The admin's date hierarchy and newest-first changelist
+            models.Index(fields=['date_earned', 'id'], name='agentgift_date_earned_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.agent.username} - {self.gift.name}"
 
 
+class AgentMonthlyStats(models.Model):
+    """
+    Per-agent, per-month, per-project-type payment totals.
+
+    Maintained incrementally by ``Payment.save`` and payment deletion (see
+    ``rollups.py``) so reports never have to scan the payments table;
+    ``manage.py rebuild_monthly_stats`` regenerates it from scratch.
+    """
+    # The (agent, month, project_type) unique constraint doubles as the agent index
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="monthly_stats", db_index=False)
+    month = models.DateField(help_text="First day of the month")
+    project_type = models.CharField(max_length=20, choices=Project.TYPE_CHOICES, blank=True)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    points = models.IntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "agent monthly stats"
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'month', 'project_type'], name='agent_month_type_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'project_type'], name='monthly_stats_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} {self.month:%Y-%m} {self.project_type}"
+
+
+class SearchEntry(models.Model):
+    """
+    One searchable document per agent, customer, project or payment.
+
+    Holds the text of the row and the rows it points at (a payment's
+    customer, agent and project names), so a search touches one table and
+    never joins. ``search.py`` keeps it in step with the source rows and
+    migration 0007 adds the full-text index: a weighted tsvector with GIN
+    and trigram indexes on PostgreSQL, an FTS5 table on SQLite.
+    """
+    KIND_AGENT = 'agent'
+    KIND_CUSTOMER = 'customer'
+    KIND_PROJECT = 'project'
+    KIND_PAYMENT = 'payment'
+    KIND_CHOICES = [
+        (KIND_AGENT, 'Agent'),
+        (KIND_CUSTOMER, 'Customer'),
+        (KIND_PROJECT, 'Project'),
+        (KIND_PAYMENT, 'Payment'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    detail = models.CharField(max_length=300, blank=True)
+    text = models.TextField()
+
+    class Meta:
+        verbose_name_plural = "search entries"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_entry_kind_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.title}"
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, queued by ``jobs.enqueue`` and run by
+    ``manage.py run_workers``. ``key`` makes enqueueing idempotent.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    key = models.CharField(max_length=200, unique=True)
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # run_workers: the next due pending jobs, oldest first
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} [{self.status}] {self.key}"
+
+
 # Signal to create gifts when a new agent is created
 @receiver(post_save, sender=Agent)
 def create_initial_gifts(sender, instance, created, **kwargs):
     if created:
         # The gift creation is now handled in the Payment.save() method
         pass
+
+
+# Gift changes drop this process's copy of the gift catalog (ledger.py)
+@receiver(post_save, sender=Gift)
+@receiver(post_delete, sender=Gift)
+def invalidate_gift_catalog(sender, instance, **kwargs):
+    from .ledger import invalidate_gift_catalog
+    invalidate_gift_catalog()
+
+
+# Keep the cached admin dashboard totals in step with the rows they count.
+# Agents, customers and projects only change the totals when added or
+# removed; every payment or agent-gift write can move a sum or the
+# pending-gift count.
+@receiver(post_save, sender=Agent)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Project)
+def invalidate_stats_on_create(sender, instance, created, **kwargs):
+    if created:
+        from .stats import invalidate_dashboard_stats
+        invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=AgentGift)
+@receiver(post_delete, sender=Agent)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=AgentGift)
+def invalidate_stats_on_change(sender, instance, **kwargs):
+    from .stats import invalidate_dashboard_stats
+    invalidate_dashboard_stats()
+
+
+@receiver(post_delete, sender=Payment)
+def reverse_payment(sender, instance, origin=None, **kwargs):
+    # The same payment.ledger job as Payment.save, with the deleted payment
+    # as the "previous" side: run here, in the delete's transaction (and
+    # whatever the agent's payment count), unless JOBS_EAGER is off.
+    # Rows that are themselves being deleted are left alone.
+    if isinstance(origin, Agent) and origin.pk == instance.agent_id:
+        return
+    from .jobs import enqueue
+    deleting_customer = isinstance(origin, Customer) and origin.pk == instance.customer_id
+    project_type = instance.project.project_type if instance.project_id else ''
+    enqueue('payment.ledger', {
+        'payment_id': instance.pk,
+        'previous': _ledger_figures(
+            instance.agent_id, None if deleting_customer else instance.customer_id, instance.date,
+            project_type, instance.amount, instance.points,
+        ),
+        'current': None,
+    })
+
+
+# An agent's customer_count follows customers being added and removed
+@receiver(post_save, sender=Customer)
+def count_new_customer(sender, instance, created, **kwargs):
+    if created:
+        from .counters import move_customers
+        move_customers({instance.agent_id: 1})
+
+
+@receiver(post_delete, sender=Customer)
+def uncount_customer(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Agent) and origin.pk == instance.agent_id:
+        return
+    from .counters import move_customers
+    move_customers({instance.agent_id: -1})
+
+
+# New and removed agents enter/leave the cached leaderboard standings.
+@receiver(post_save, sender=Agent)
+def add_agent_to_leaderboard(sender, instance, created, **kwargs):
+    if created:
+        from .leaderboard import update_standing
+        update_standing(instance.pk, new=(instance.total_points, instance.star_level))
+
+
+@receiver(post_delete, sender=Agent)
+def remove_agent_from_leaderboard(sender, instance, **kwargs):
+    from .leaderboard import update_standing
+    update_standing(instance.pk, old=(instance.total_points, instance.star_level))
+
+
+# Keep each row's SearchEntry in step with it, in the same transaction.
+@receiver(post_save, sender=Agent)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Payment)
+def update_search_entry(sender, instance, created, update_fields=None, **kwargs):
+    from .search import index_instance
+    index_instance(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Agent)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Payment)
+def remove_search_entry(sender, instance, **kwargs):
+    from .search import remove_instance
+    remove_instance(instance)
@@ -0,0 +1,107 @@
+"""
+Shared response cache for the public marketing pages.
+
+``vijay_home``, ``oxygen_club`` and ``home`` render the same HTML for every
+visitor, so :func:`cached_page` renders each of them once per
+``PAGE_CACHE_TTL`` and serves the stored bytes afterwards. Every response
+carries a strong ``ETag`` (a hash of the body) and ``Last-Modified`` (when
+it was rendered), so browsers revalidate with ``If-None-Match`` /
+``If-Modified-Since`` and get an empty 304 while the page is unchanged.
+
+Only use it on views whose output does not depend on the user, the
+session or the query string: the cache is keyed on the path alone, under
+the current :func:`release`. A deploy that changes the templates or the
+static files (or sets a new ``RELEASE_VERSION``) therefore misses every
+page cached by the previous one, whichever cache backend is in use.
+``manage.py purge_page_cache`` drops the cached pages within a release;
+that needs the shared cache (``REDIS_URL``), since with the per-process
+local-memory cache it can only reach its own process.
+"""
+import hashlib
+import time
+from functools import cache as memoize, wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+# Bumped by purge() so every cached page goes stale at once
+GENERATION_CACHE_KEY = 'realestate:page:generation'
+
+
+@memoize
+def _fingerprint():
+    digest = hashlib.md5(usedforsecurity=False)
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for path in sorted(Path(directory).rglob('*.html')):
+            digest.update(path.read_bytes())
+    read_manifest = getattr(staticfiles_storage, 'read_manifest', None)
+    if read_manifest is not None:
+        digest.update((read_manifest() or '').encode())
+    return digest.hexdigest()[:12]
+
+
+def release():
+    """
+    The deploy the cached pages belong to.
+
+    ``PAGE_CACHE_RELEASE`` when set, otherwise a hash of the templates and
+    the static manifest, which every process of one deploy computes alike.
+    """
+    return settings.PAGE_CACHE_RELEASE or _fingerprint()
+
+
+def _page_key(path):
+    generation = cache.get_or_set(GENERATION_CACHE_KEY, 1, None)
+    return f'realestate:page:{release()}:{generation}:{path}'
+
+
+def _store(response, key):
+    content = response.content
+    page = {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(content, usedforsecurity=False).hexdigest()),
+        'last_modified': int(time.time()),
+    }
+    cache.set(key, page, settings.PAGE_CACHE_TTL)
+    return page
+
+
+def cached_page(view):
+    """Serve ``view``'s GET/HEAD responses from the shared cache, with conditional GET support."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        key = _page_key(request.path)
+        page = cache.get(key)
+        if page is None:
+            rendered = view(request, *args, **kwargs)
+            if rendered.status_code != 200 or rendered.streaming:
+                return rendered
+            page = _store(rendered, key)
+
+        response = HttpResponse(page['content'], content_type=page['content_type'])
+        response['ETag'] = page['etag']
+        response['Last-Modified'] = http_date(page['last_modified'])
+        patch_cache_control(response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+        return get_conditional_response(
+            request, etag=page['etag'], last_modified=page['last_modified'], response=response,
+        )
+
+    return wrapper
+
+
+def purge():
+    """Make every cached page stale; the next request for each renders it again."""
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 2, None)
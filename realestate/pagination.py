@@ -0,0 +1,273 @@
+"""
+Keyset (cursor) pagination for the "View All" list pages.
+
+Instead of OFFSET/LIMIT, each page is fetched with a WHERE clause that
+starts right after the last row of the previous page, using the active
+sort field plus ``id`` as a tie-breaker. The cost of a page therefore
+stays the same however deep the operator navigates.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, IntegerField, Q
+from django.utils.functional import cached_property
+
+
+KEYSET_ALIAS = 'keyset_value'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder trims datetimes to milliseconds; cursors need them exact."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move around."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class InvalidCursor(ValueError):
+    """A cursor that doesn't decode, or wasn't issued for this list and sort."""
+
+
+def encode_cursor(value, pk, direction, sort=None):
+    payload = json.dumps({'v': value, 'id': pk, 'd': direction, 's': sort}, cls=CursorEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(value, pk, direction, sort)`` or ``None`` for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = data['d'] if data['d'] in ('next', 'prev') else 'next'
+        return data['v'], data['id'], direction, data.get('s')
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _cursor_value(field, value):
+    """``value`` from a cursor as ``field``'s Python type; raises InvalidCursor if it isn't one."""
+    if value is None:
+        return None
+    try:
+        value = field.to_python(value)
+        if isinstance(field, IntegerField):
+            # Out-of-range numbers would fail in the database instead
+            field.run_validators(value)
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor(f"Cursor value {value!r} is not a valid {field.name}") from None
+    return value
+
+
+def _resolve_field(model, path):
+    """
+    Follow a ``related__field`` path to the concrete model field.
+
+    Returns ``(field, nullable)`` where ``nullable`` is true if the column
+    itself or any foreign key along the path allows NULL.
+    """
+    field, nullable = None, False
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        nullable = nullable or field.null
+        if field.is_relation:
+            model = field.related_model
+    return field, nullable
+
+
+def _ordering(field_name, descending, nullable, nulls_last=True):
+    # NULL placement is only pinned for nullable columns: backends disagree
+    # on the default, but an explicit NULLS clause stops PostgreSQL from
+    # walking a plain btree index for the ORDER BY.
+    nulls = {}
+    if nullable:
+        nulls = {'nulls_last': True} if nulls_last else {'nulls_first': True}
+    if descending:
+        return [F(field_name).desc(**nulls), F('id').desc()]
+    return [F(field_name).asc(**nulls), F('id').asc()]
+
+
+def _after(value, pk, descending, nullable):
+    """Rows strictly after ``(value, pk)`` in the page ordering (NULLs last)."""
+    cmp = 'lt' if descending else 'gt'
+    if value is None:
+        return Q(**{f'{KEYSET_ALIAS}__isnull': True, f'id__{cmp}': pk})
+    after = Q(**{f'{KEYSET_ALIAS}__{cmp}': value}) | Q(**{KEYSET_ALIAS: value, f'id__{cmp}': pk})
+    if nullable:
+        after |= Q(**{f'{KEYSET_ALIAS}__isnull': True})
+    return after
+
+
+def _before(value, pk, descending):
+    """Rows strictly before ``(value, pk)`` in the page ordering (NULLs last)."""
+    cmp = 'gt' if descending else 'lt'
+    if value is None:
+        return (
+            Q(**{f'{KEYSET_ALIAS}__isnull': False})
+            | Q(**{f'{KEYSET_ALIAS}__isnull': True, f'id__{cmp}': pk})
+        )
+    return (
+        Q(**{f'{KEYSET_ALIAS}__{cmp}': value})
+        | Q(**{KEYSET_ALIAS: value, f'id__{cmp}': pk})
+    )
+
+
+def _position(row):
+    """``(sort value, id)`` of a model instance or ``values()`` dict."""
+    if isinstance(row, dict):
+        return row[KEYSET_ALIAS], row['id']
+    return getattr(row, KEYSET_ALIAS), row.pk
+
+
+def _read_cursor(cursor, sort_field, field, pk_field):
+    """``(value, pk, direction)`` from ``cursor``, or ``None`` for the first page."""
+    if not cursor:
+        return None
+    position = decode_cursor(cursor)
+    if position is None:
+        raise InvalidCursor("Cursor is not valid")
+    value, pk, direction, sort = position
+    # A cursor kept across a change of ?sort= would seek on the wrong column
+    if sort != sort_field:
+        raise InvalidCursor("Cursor belongs to a different sort order")
+    if pk is None:
+        raise InvalidCursor("Cursor is not valid")
+    return _cursor_value(field, value), _cursor_value(pk_field, pk), direction
+
+
+def paginate_keyset(queryset, sort_field, cursor=None, per_page=None, strict=False):
+    """
+    Return a :class:`KeysetPage` of ``queryset`` ordered by ``sort_field``.
+
+    ``sort_field`` is one of the values from a ``listing.*_SORTS`` dict,
+    e.g. ``'-date'`` or ``'customer__name'``. ``id`` is always appended as a
+    tie-breaker so rows with equal sort values are never skipped or repeated.
+    A ``values()`` queryset pages as dicts; it must include ``id``.
+
+    Cursors record the sort they were issued for. A garbled cursor, or one
+    from another sort, shows the first page, or raises
+    :class:`InvalidCursor` with ``strict=True``.
+    """
+    per_page = per_page or settings.LIST_PAGE_SIZE
+    descending = sort_field.startswith('-')
+    field_name = sort_field.lstrip('-')
+
+    field, nullable = _resolve_field(queryset.model, field_name)
+    queryset = queryset.annotate(**{KEYSET_ALIAS: F(field_name)})
+    try:
+        position = _read_cursor(cursor, sort_field, field, queryset.model._meta.pk)
+    except InvalidCursor:
+        if strict:
+            raise
+        position = None
+
+    if position is None:
+        rows = list(queryset.order_by(*_ordering(KEYSET_ALIAS, descending, nullable))[:per_page + 1])
+        has_more, has_previous = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        value, pk, direction = position
+        if direction == 'next':
+            page_qs = queryset.filter(_after(value, pk, descending, nullable))
+            rows = list(page_qs.order_by(*_ordering(KEYSET_ALIAS, descending, nullable))[:per_page + 1])
+            has_more, has_previous = len(rows) > per_page, True
+            rows = rows[:per_page]
+        else:
+            # Walk backwards with the ordering flipped, then restore display order.
+            page_qs = queryset.filter(_before(value, pk, descending))
+            ordering = _ordering(KEYSET_ALIAS, not descending, nullable, nulls_last=False)
+            rows = list(page_qs.order_by(*ordering)[:per_page + 1])
+            has_previous, has_more = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+
+    next_cursor = previous_cursor = None
+    if rows and has_more:
+        next_cursor = encode_cursor(*_position(rows[-1]), 'next', sort_field)
+    if rows and has_previous:
+        previous_cursor = encode_cursor(*_position(rows[0]), 'prev', sort_field)
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def count_rows(queryset, estimate=False):
+    """
+    Return ``(count, is_estimate)`` for ``queryset``.
+
+    With ``estimate=True`` on PostgreSQL the planner's row estimate is used
+    instead of running ``COUNT(*)``; other backends fall back to an exact count.
+    """
+    connection = connections[queryset.db]
+    if estimate and connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+    return queryset.count(), False
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Django ``Paginator`` whose ``count`` is the PostgreSQL planner estimate.
+
+    Used by the admin changelists, whose page links would otherwise cost a
+    ``COUNT(*)`` over the whole (filtered) table. Results the planner puts
+    under ``exact_below`` rows are cheap to count, so they are counted
+    exactly and the last page is never missing or empty.
+    """
+    exact_below = 10_000
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        count, is_estimate = count_rows(self.object_list, estimate=True)
+        if is_estimate and count < self.exact_below:
+            count = self.object_list.count()
+        return count
+
+
+def wants_estimated_count(request):
+    """``?count=estimate`` / ``?count=exact`` override the LIST_COUNT_MODE setting."""
+    mode = request.GET.get('count') or settings.LIST_COUNT_MODE
+    return mode == 'estimate'
+
+
+def querystring_without_cursor(request):
+    """Current GET parameters minus ``cursor``, for building page links."""
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    return query.urlencode()
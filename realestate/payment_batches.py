@@ -0,0 +1,161 @@
+"""
+Many payments at once: validation and insertion shared by ``manage.py
+import_payments`` and the batch entry page.
+
+:func:`validate_payment_rows` checks a batch of raw rows with one query
+per related table. :func:`insert_payments` bulk inserts the valid ones
+and moves the rollup, the counters, the search index and agent PV with a
+handful of set-based statements. :func:`settle_agents` then re-tiers each
+affected agent once and awards their gifts. Call the last two inside one
+transaction to commit a batch as a unit.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import counters, rollups
+from .ledger import apply_points_deltas, award_gifts, retier_agents
+from .models import Customer, Payment, Project, SearchEntry
+from .search import index_ids
+
+
+def _parse_date(raw_date):
+    """An aware datetime for an ISO date or datetime, or ``None`` if it doesn't parse."""
+    try:
+        date = parse_datetime(raw_date)
+        if date is None and parse_date(raw_date) is not None:
+            date = datetime.combine(parse_date(raw_date), datetime.min.time())
+    except ValueError:
+        return None
+    if date is not None and timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def validate_payment_rows(rows, seen_receipts=None):
+    """
+    Turn raw rows into unsaved Payments.
+
+    Each row needs ``amount``, ``receipt_number``, a customer
+    (``customer_id`` or ``customer_email``) and a project (``project_id``
+    or ``project`` name); ``date`` is optional. The agent is the
+    customer's agent. Lookups are batched: one query each for customers,
+    projects and already-used receipt numbers, however many rows there are.
+    ``seen_receipts`` carries receipt numbers accepted by earlier batches.
+
+    Returns ``(payments, dates, errors)``; ``payments[i]`` came from the
+    i-th valid row and ``errors`` holds ``(row, message)`` for the rest.
+    """
+    seen_receipts = set() if seen_receipts is None else seen_receipts
+    customer_ids = {str(r.get('customer_id') or '').strip() for r in rows} - {''}
+    customer_emails = {str(r.get('customer_email') or '').strip().lower() for r in rows} - {''}
+    project_ids = {str(r.get('project_id') or '').strip() for r in rows} - {''}
+    project_names = {str(r.get('project') or '').strip() for r in rows} - {''}
+    receipts = {str(r.get('receipt_number') or '').strip() for r in rows} - {''}
+
+    customers = Customer.objects.alias(email_lower=Lower('email')).filter(
+        Q(id__in=[i for i in customer_ids if i.isdigit()])
+        | Q(email_lower__in=customer_emails)
+    ).only('id', 'email', 'agent_id')
+    customers_by_id = {str(c.id): c for c in customers}
+    customers_by_email = {c.email.lower(): c for c in customers_by_id.values()}
+
+    projects = Project.objects.filter(
+        Q(id__in=[i for i in project_ids if i.isdigit()]) | Q(name__in=project_names)
+    ).only('id', 'name', 'project_type')
+    projects_by_id = {str(p.id): p for p in projects}
+    projects_by_name = {p.name: p for p in projects_by_id.values()}
+
+    taken = set(Payment.objects.filter(receipt_number__in=receipts).values_list('receipt_number', flat=True))
+
+    payments, dates, errors = [], [], []
+    for row in rows:
+        if '_error' in row:
+            errors.append((row, row['_error']))
+            continue
+
+        customer_id = str(row.get('customer_id') or '').strip()
+        customer_email = str(row.get('customer_email') or '').strip().lower()
+        customer = customers_by_id.get(customer_id) or customers_by_email.get(customer_email)
+        project_id = str(row.get('project_id') or '').strip()
+        project = projects_by_id.get(project_id) or projects_by_name.get(str(row.get('project') or '').strip())
+        receipt_number = str(row.get('receipt_number') or '').strip()
+
+        try:
+            amount = Decimal(str(row.get('amount') or '').strip())
+        except InvalidOperation:
+            amount = None
+        raw_date = str(row.get('date') or '').strip()
+        date = _parse_date(raw_date) if raw_date else None
+
+        if customer is None:
+            error = "customer not found"
+        elif project is None:
+            error = "project not found"
+        elif amount is None or not amount.is_finite() or amount <= 0:
+            error = "invalid amount"
+        elif amount.as_tuple().exponent < -2 or amount.adjusted() >= 10:
+            error = "amount out of range"
+        elif not receipt_number:
+            error = "missing receipt_number"
+        elif receipt_number in taken or receipt_number in seen_receipts:
+            error = "duplicate receipt_number"
+        elif raw_date and date is None:
+            error = "invalid date"
+        else:
+            error = None
+
+        if error:
+            errors.append((row, error))
+            continue
+
+        seen_receipts.add(receipt_number)
+        payments.append(Payment(
+            customer_id=customer.id,
+            agent_id=customer.agent_id,
+            project=project,
+            amount=amount,
+            points=Payment.calculate_points(amount, project.project_type),
+            receipt_number=receipt_number,
+        ))
+        dates.append(date)
+    return payments, dates, errors
+
+
+def insert_payments(payments, dates=None, batch_size=1000):
+    """
+    Bulk insert validated payments and fold them into the rollup, the
+    counters, the search index and their agents' PV.
+
+    ``dates`` (optional, parallel to ``payments``) backdates rows; ``None``
+    entries keep the insert time. Star levels and gifts are left to
+    :func:`settle_agents`. Returns ``{agent_id: pv added}``.
+    """
+    created = Payment.objects.bulk_create(payments, batch_size=batch_size)
+    # auto_now_add overwrites ``date`` on insert; put supplied dates back
+    dated = []
+    for payment, date in zip(created, dates or []):
+        if date is not None:
+            payment.date = date
+            dated.append(payment)
+    Payment.objects.bulk_update(dated, ['date'], batch_size=batch_size)
+    rollups.apply_payments(created)
+    counters.apply_payments(created)
+    index_ids(SearchEntry.KIND_PAYMENT, [payment.pk for payment in created], batch_size)
+
+    deltas = {}
+    for payment in created:
+        deltas[payment.agent_id] = deltas.get(payment.agent_id, 0) + payment.points
+    apply_points_deltas(deltas)
+    return deltas
+
+
+def settle_agents(agent_ids):
+    """Re-tier each agent once from their stored PV and award any gifts now due."""
+    levels = retier_agents(agent_ids)
+    award_gifts(levels)
+    return levels
@@ -0,0 +1,184 @@
+"""
+Opt-in per-request profiling: SQL count and time, slowest and duplicated
+queries, and template render time.
+
+Enable with ``REQUEST_PROFILING=true``. Each response then carries a
+``Server-Timing`` header (shown in the browser dev tools' network panel),
+and requests over ``REQUEST_PROFILING_SLOW_MS`` or
+``REQUEST_PROFILING_MAX_QUERIES`` are logged as one JSON line on the
+``realestate.profiling`` logger. When disabled the middleware removes
+itself at startup, and the query and template hooks cost a single
+context-variable lookup.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('realestate.profiling')
+
+# The profile of the request being handled in this context, if any.
+# Context variables follow sync_to_async, so async views are covered too.
+_current = ContextVar('realestate_request_profile', default=None)
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, seconds)
+        self.template_time = 0.0
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+    def duplicates(self, threshold):
+        """SQL statements (parameters aside) run at least ``threshold`` times: usually an N+1."""
+        counts = {}
+        for sql, _ in self.queries:
+            counts[sql] = counts.get(sql, 0) + 1
+        return sorted(
+            ((sql, count) for sql, count in counts.items() if count >= threshold),
+            key=lambda item: item[1], reverse=True,
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` hook installed on every connection while profiling is enabled."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, time.perf_counter() - started))
+
+
+def _install_query_hook(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_query_hooks():
+    """Record queries on every connection, open now or opened later (e.g. by aio's pool threads)."""
+    connection_created.connect(_install_query_hook)
+    for connection in connections.all(initialized_only=True):
+        _install_query_hook(None, connection)
+
+
+@contextmanager
+def capture():
+    """Profile the block (and the threads it hands queries to); yields its RequestProfile."""
+    install_query_hooks()
+    profile = RequestProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing top-level renders for the profiler."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_query_hooks()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{len(profile.queries)} queries"',
+            f'tpl;dur={profile.template_time * 1000:.1f};desc="templates"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        if (
+            total * 1000 >= settings.REQUEST_PROFILING_SLOW_MS
+            or len(profile.queries) >= settings.REQUEST_PROFILING_MAX_QUERIES
+        ):
+            self.log_slow_request(request, response, profile, total)
+        return response
+
+    def log_slow_request(self, request, response, profile, total):
+        top = settings.REQUEST_PROFILING_TOP_QUERIES
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(profile.db_time * 1000, 1),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'queries': len(profile.queries),
+            'slowest': [
+                {'sql': sql, 'ms': round(duration * 1000, 2)}
+                for sql, duration in profile.slowest(top)
+            ],
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in profile.duplicates(settings.REQUEST_PROFILING_DUPLICATE_THRESHOLD)[:top]
+            ],
+        }
+        logger.warning(json.dumps(record), extra={'profile': record})
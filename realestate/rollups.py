@@ -0,0 +1,97 @@
+"""
+Incremental maintenance of the AgentMonthlyStats rollup.
+
+Every payment write adds or subtracts its amount, PV and a count of one
+on the (agent, month, project type) row it belongs to, from the
+payment.ledger job (``ledger.apply_payment``). Increments commute, so the
+rollup comes out right whichever order those jobs run in.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .leaderboard import invalidate_leaderboard, invalidate_month
+from .models import AgentMonthlyStats, Payment
+
+
+def month_of(value):
+    """First day of ``value``'s month in the current time zone."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def apply_delta(agent_id, month, project_type, amount, points, count):
+    """
+    Add ``amount`` / ``points`` / ``count`` (possibly negative) to one rollup row.
+
+    The row is incremented in place; if it doesn't exist yet it is
+    inserted, retrying as an increment if a concurrent transaction inserted
+    it first.
+    """
+    key = {'agent_id': agent_id, 'month': month, 'project_type': project_type or ''}
+    invalidate_month(month)
+    changes = {
+        'amount': F('amount') + amount,
+        'points': F('points') + points,
+        'payment_count': F('payment_count') + count,
+    }
+    if AgentMonthlyStats.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            AgentMonthlyStats.objects.create(**key, amount=amount, points=points, payment_count=count)
+    except IntegrityError:
+        AgentMonthlyStats.objects.filter(**key).update(**changes)
+
+
+def add_payment(agent_id, date, project_type, amount, points):
+    apply_delta(agent_id, month_of(date), project_type, amount, points, 1)
+
+
+def remove_payment(agent_id, date, project_type, amount, points):
+    # Inserts a negative row if the add hasn't run yet (its job is still
+    # queued), for that job to bring back to zero
+    apply_delta(agent_id, month_of(date), project_type, -amount, -points, -1)
+
+
+def apply_payments(payments):
+    """Fold a batch of newly inserted payments (with ``project`` loaded) into the rollup."""
+    deltas = {}
+    for payment in payments:
+        key = (payment.agent_id, month_of(payment.date), payment.project.project_type if payment.project else '')
+        amount, points, count = deltas.get(key, (0, 0, 0))
+        deltas[key] = (amount + payment.amount, points + payment.points, count + 1)
+    for (agent_id, month, project_type), (amount, points, count) in deltas.items():
+        apply_delta(agent_id, month, project_type, amount, points, count)
+
+
+def rebuild(batch_size=1000):
+    """Regenerate the whole rollup from the payments table. Returns rows written."""
+    totals = (
+        Payment.objects
+        .annotate(month=TruncMonth('date', output_field=DateField()))
+        .values('agent_id', 'month', 'project__project_type')
+        .annotate(amount=Sum('amount'), points=Sum('points'), payment_count=Count('id'))
+        .order_by()
+    )
+    written = 0
+    with transaction.atomic():
+        AgentMonthlyStats.objects.all().delete()
+        batch = []
+        for row in totals.iterator(chunk_size=batch_size):
+            batch.append(AgentMonthlyStats(
+                agent_id=row['agent_id'],
+                month=row['month'],
+                project_type=row['project__project_type'] or '',
+                amount=row['amount'],
+                points=row['points'],
+                payment_count=row['payment_count'],
+            ))
+            if len(batch) >= batch_size:
+                AgentMonthlyStats.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        AgentMonthlyStats.objects.bulk_create(batch)
+        written += len(batch)
+    invalidate_leaderboard()
+    return written
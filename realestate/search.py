@@ -0,0 +1,236 @@
+"""
+Full-text search over agents, customers, projects and payments.
+
+Each searchable row has a SearchEntry holding its own text plus the names
+it is usually looked up by (a payment's customer, agent and project), so
+a search reads one indexed table instead of joining and scanning with
+``icontains``. Entries are written in the same transaction as the row
+they describe by the receivers in ``models.py``; ``manage.py
+rebuild_search_index`` regenerates them after bulk loads.
+
+Matching is backend specific (see migration 0007):
+
+* PostgreSQL: a weighted ``tsvector`` with a GIN index for prefix word
+  matches, ranked with ``ts_rank``, plus a ``pg_trgm`` GIN index so
+  substring (``ILIKE``) matches are indexed too.
+* SQLite: an FTS5 table with the trigram tokenizer (substring matches of
+  three or more characters), ranked with ``bm25``.
+"""
+import re
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from .models import Agent, Customer, Payment, Project, SearchEntry
+
+
+FTS_TABLE = 'realestate_searchentry_fts'
+# bm25 column weights for (title, text): a title hit outranks a body hit
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def _agent_entry(agent):
+    full_name = _join(agent.first_name, agent.last_name)
+    return SearchEntry(
+        kind=SearchEntry.KIND_AGENT, object_id=agent.pk, title=agent.username,
+        detail=' · '.join(part for part in (agent.agent_number, full_name, agent.email) if part),
+        text=_join(agent.username, agent.first_name, agent.last_name, agent.email, agent.agent_number),
+    )
+
+
+def _customer_entry(customer):
+    return SearchEntry(
+        kind=SearchEntry.KIND_CUSTOMER, object_id=customer.pk, title=customer.name,
+        detail=customer.email, text=_join(customer.name, customer.email),
+    )
+
+
+def _project_entry(project):
+    return SearchEntry(
+        kind=SearchEntry.KIND_PROJECT, object_id=project.pk, title=project.name,
+        detail=project.get_project_type_display(), text=project.name,
+    )
+
+
+def _payment_entry(payment):
+    project_name = payment.project.name if payment.project_id else ''
+    return SearchEntry(
+        kind=SearchEntry.KIND_PAYMENT, object_id=payment.pk, title=payment.receipt_number,
+        detail=' · '.join(part for part in (payment.customer.name, f'₹{payment.amount}', project_name) if part),
+        text=_join(payment.receipt_number, payment.customer.name, payment.agent.username, project_name),
+    )
+
+
+# kind: (model, queryset for bulk indexing, entry builder, indexed fields,
+#        fields copied into payment entries)
+SOURCES = {
+    SearchEntry.KIND_AGENT: (
+        Agent, lambda: Agent.objects.all(), _agent_entry,
+        {'username', 'first_name', 'last_name', 'email', 'agent_number'}, {'username'},
+    ),
+    SearchEntry.KIND_CUSTOMER: (
+        Customer, lambda: Customer.objects.all(), _customer_entry, {'name', 'email'}, {'name'},
+    ),
+    SearchEntry.KIND_PROJECT: (
+        Project, lambda: Project.objects.all(), _project_entry, {'name', 'project_type'}, {'name'},
+    ),
+    SearchEntry.KIND_PAYMENT: (
+        Payment,
+        lambda: Payment.objects.select_related('customer', 'agent', 'project').only(
+            'receipt_number', 'amount', 'customer__name', 'agent__username', 'project__name',
+        ),
+        _payment_entry,
+        {'receipt_number', 'amount', 'customer', 'agent', 'project'}, set(),
+    ),
+}
+KIND_FOR_MODEL = {model: kind for kind, (model, *_) in SOURCES.items()}
+
+
+def index_objects(kind, objects, batch_size=1000):
+    """Insert or refresh the entries for ``objects`` (all of one ``kind``). Returns the count."""
+    build = SOURCES[kind][2]
+    written, batch = 0, []
+
+    def flush():
+        SearchEntry.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['kind', 'object_id'],
+            update_fields=['title', 'detail', 'text'],
+        )
+
+    for obj in objects:
+        batch.append(build(obj))
+        if len(batch) >= batch_size:
+            flush()
+            written += len(batch)
+            batch = []
+    if batch:
+        flush()
+        written += len(batch)
+    return written
+
+
+def index_ids(kind, ids, batch_size=1000):
+    """Index rows of ``kind`` by primary key, loading them (and joined names) in one query."""
+    objects = SOURCES[kind][1]().filter(pk__in=list(ids))
+    return index_objects(kind, objects.iterator(chunk_size=batch_size), batch_size)
+
+
+def index_instance(instance, created=False, update_fields=None):
+    """Refresh one row's entry, and its payments' entries if a name they copy changed."""
+    kind = KIND_FOR_MODEL[type(instance)]
+    _, _, _, indexed, copied = SOURCES[kind]
+    changed = set(indexed if update_fields is None else update_fields)
+    if not changed & indexed:
+        return
+    index_objects(kind, [instance])
+    if not created and changed & copied:
+        payments = SOURCES[SearchEntry.KIND_PAYMENT][1]().filter(**{kind: instance})
+        index_objects(SearchEntry.KIND_PAYMENT, payments.iterator(chunk_size=1000))
+
+
+def remove_instance(instance):
+    SearchEntry.objects.filter(kind=KIND_FOR_MODEL[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild(batch_size=1000):
+    """Regenerate every entry from the source tables. Returns ``{kind: count}``."""
+    SearchEntry.objects.all().delete()
+    return {
+        kind: index_objects(kind, queryset().iterator(chunk_size=batch_size), batch_size)
+        for kind, (_, queryset, *_) in SOURCES.items()
+    }
+
+
+def _like_pattern(value):
+    return '%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _match(query):
+    """
+    ``(source, where, params, order_by, order_params)`` SQL fragments selecting
+    entries ``e`` that match ``query``, best match first.
+    """
+    qn = connection.ops.quote_name
+    entries = f"{qn(SearchEntry._meta.db_table)} e"
+    query = query.strip().lower()
+    terms = re.findall(r'\w+', query)
+
+    if connection.vendor == 'postgresql' and terms:
+        # Every word as a prefix ("asha kum" finds "Asha Kumar"), or the
+        # whole string as a substring like the old icontains search
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        where = f"(e.{qn('document')} @@ to_tsquery('simple', %s) OR e.{qn('text')} ILIKE %s)"
+        order_by = f"ts_rank(e.{qn('document')}, to_tsquery('simple', %s)) DESC, e.{qn('id')} DESC"
+        return entries, where, [tsquery, _like_pattern(query)], order_by, [tsquery]
+
+    if connection.vendor == 'sqlite':
+        # The trigram tokenizer can't look up fewer than three characters,
+        # so short words are checked with LIKE against the matched rows.
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms:
+            likes = [f"e.{qn('text')} LIKE %s ESCAPE '\\'" for term in terms if len(term) < 3]
+            # CROSS JOIN keeps the FTS table outermost: one MATCH, then
+            # primary-key lookups, instead of a MATCH per entry of the kind
+            source = f"{qn(FTS_TABLE)} CROSS JOIN {entries} ON e.{qn('id')} = {qn(FTS_TABLE)}.rowid"
+            where = ' AND '.join([f'{qn(FTS_TABLE)} MATCH %s', *likes])
+            params = [' '.join(f'"{term}"' for term in long_terms)]
+            params += [_like_pattern(term) for term in terms if len(term) < 3]
+            order_by = f"bm25({qn(FTS_TABLE)}, %s, %s), e.{qn('id')} DESC"
+            return source, where, params, order_by, list(FTS_WEIGHTS)
+
+    where = f"LOWER(e.{qn('text')}) LIKE %s ESCAPE '\\'"
+    return entries, where, [_like_pattern(query)], f"e.{qn('id')} DESC", []
+
+
+def search(query, kinds=None, limit=20):
+    """The best ``limit`` SearchEntry rows for ``query``, each with a ``url``."""
+    if not query.strip():
+        return []
+    qn = connection.ops.quote_name
+    source, where, params, order_by, order_params = _match(query)
+    if kinds:
+        where += f" AND e.{qn('kind')} IN ({', '.join(['%s'] * len(kinds))})"
+        params += list(kinds)
+    sql = f"""
+        SELECT e.{qn('id')}, e.{qn('kind')}, e.{qn('object_id')}, e.{qn('title')}, e.{qn('detail')}
+        FROM {source}
+        WHERE {where}
+        ORDER BY {order_by}
+        LIMIT %s
+    """
+    results = list(SearchEntry.objects.raw(sql, params + order_params + [limit]))
+    for entry in results:
+        entry.url = result_url(entry)
+    return results
+
+
+def matching_ids(kind, query):
+    """Ids of ``kind`` rows matching ``query``, as a subquery for ``pk__in`` filters."""
+    qn = connection.ops.quote_name
+    source, where, params, _, _ = _match(query)
+    sql = f"""
+        SELECT e.{qn('object_id')} FROM {source}
+        WHERE e.{qn('kind')} = %s AND {where}
+    """
+    return RawSQL(sql, [kind, *params])
+
+
+# Each result opens the matching "View All" page filtered down to it
+RESULT_PAGES = {
+    SearchEntry.KIND_AGENT: 'all_agents',
+    SearchEntry.KIND_CUSTOMER: 'all_customers',
+    SearchEntry.KIND_PROJECT: 'all_projects',
+    SearchEntry.KIND_PAYMENT: 'all_payments',
+}
+
+
+def result_url(entry):
+    return f"{reverse(RESULT_PAGES[entry.kind])}?{urlencode({'search': entry.title})}"
@@ -0,0 +1,62 @@
+"""
+Cached system-wide totals for the admin dashboard.
+
+All counts and sums are fetched in a single round trip and kept in the
+cache until something that changes them is written; the receivers in
+``models.py`` call :func:`invalidate_dashboard_stats` for that.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+DASHBOARD_STATS_CACHE_KEY = 'realestate:dashboard-stats'
+
+
+def _fetch_dashboard_stats():
+    from .models import Agent, Customer, Project, AgentGift, AgentMonthlyStats
+
+    qn = connection.ops.quote_name
+    # Payment figures come from the monthly rollup, not a payments scan
+    rollup_table = qn(AgentMonthlyStats._meta.db_table)
+    sql = f"""
+        SELECT
+            (SELECT COUNT(*) FROM {qn(Agent._meta.db_table)}),
+            (SELECT COUNT(*) FROM {qn(Customer._meta.db_table)}),
+            (SELECT COUNT(*) FROM {qn(Project._meta.db_table)}),
+            (SELECT COALESCE(SUM({qn('payment_count')}), 0) FROM {rollup_table}),
+            (SELECT COALESCE(SUM({qn('amount')}), 0) FROM {rollup_table}),
+            (SELECT COALESCE(SUM({qn('points')}), 0) FROM {rollup_table}),
+            (SELECT COUNT(*) FROM {qn(AgentGift._meta.db_table)} WHERE {qn('status')} = %s)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ['pending'])
+        row = cursor.fetchone()
+
+    agents, customers, projects, payments, amount, points, pending_gifts = row
+    return {
+        'total_agents': agents,
+        'total_customers': customers,
+        'total_projects': projects,
+        'total_payments': int(payments),
+        # SQLite hands SUM() over a decimal column back as a float/int.
+        'total_payment_amount': Decimal(str(amount)),
+        'total_points_awarded': int(points),
+        'pending_gifts': pending_gifts,
+    }
+
+
+def get_dashboard_stats():
+    """Return the dashboard totals, from the cache when they are still valid."""
+    stats = cache.get(DASHBOARD_STATS_CACHE_KEY)
+    if stats is None:
+        stats = _fetch_dashboard_stats()
+        cache.set(DASHBOARD_STATS_CACHE_KEY, stats, settings.DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Drop the cached totals once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_STATS_CACHE_KEY))
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import runpy
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core import serializers
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    Agent, Customer, Payment, Gift, AgentGift, Project, AgentMonthlyStats, Job, STAR_THRESHOLDS, star_level_for,
+)
+from . import aio, dbpool, jobs, pagecache
+from .pagination import encode_cursor
+from . import leaderboard
+from .leaderboard import agent_rank, board_version, get_board, ranked_agents
+from .rollups import month_of
+from .search import search
+from .stats import get_dashboard_stats
+
+
+def explain(sql):
+    """Return the backend's query plan for ``sql`` as one string."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny; make the planner show which index it
+            # would pick instead of the cheaper sequential scan.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+class QueryPlanIndexTests(TestCase):
+    """The hot list/dashboard queries must be answered from the indexes in 0005."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='Asha@Example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        for i in range(3):
+            Payment.objects.create(
+                customer=cls.customer, agent=cls.agent, project=cls.project,
+                amount=Decimal('5000'), receipt_number=f'R-{i}',
+            )
+        gift = Gift.objects.create(name='Executive bag', required_star_level=1)
+        AgentGift.objects.get_or_create(agent=cls.agent, gift=gift)
+
+    def plan_for(self, url, *markers, method='get', data=None):
+        """Request ``url`` and return the plan of the first query containing all ``markers``."""
+        if method == 'get':
+            self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data)
+        self.assertIn(response.status_code, (200, 302))
+        sql = next(q['sql'] for q in ctx.captured_queries if all(m in q['sql'] for m in markers))
+        return explain(sql)
+
+    def test_all_payments_agent_filter_uses_agent_date_index(self):
+        plan = self.plan_for(f'/all-payments/?agent={self.agent.id}', 'FROM "realestate_payment"', 'LIMIT')
+        self.assertIn('payment_agent_date_idx', plan)
+
+    def test_all_payments_project_filter_uses_project_date_index(self):
+        plan = self.plan_for(f'/all-payments/?project={self.project.id}', 'FROM "realestate_payment"', 'LIMIT')
+        self.assertIn('payment_project_date_idx', plan)
+
+    def test_all_customers_agent_filter_uses_agent_id_index(self):
+        plan = self.plan_for(f'/all-customers/?agent={self.agent.id}', 'FROM "realestate_customer"', 'LIMIT')
+        self.assertIn('customer_agent_id_idx', plan)
+
+    def test_all_agents_star_filter_uses_star_level_index(self):
+        plan = self.plan_for('/all-agents/?star_level=1', 'FROM "realestate_agent"', 'ORDER BY')
+        self.assertIn('agent_star_level_id_idx', plan)
+
+    def test_all_agents_points_sort_uses_total_points_index(self):
+        plan = self.plan_for('/all-agents/?sort=-points', 'FROM "realestate_agent"', 'ORDER BY')
+        self.assertIn('agent_total_points_id_idx', plan)
+
+    def test_admin_dashboard_pending_gifts_uses_status_date_index(self):
+        plan = self.plan_for('/admin-dashboard/', '"realestate_agentgift"."status"')
+        self.assertIn('agentgift_status_date_idx', plan)
+
+    def test_customer_login_uses_lower_email_index(self):
+        self.client.logout()
+        plan = self.plan_for('/customer-login/', 'FROM "realestate_customer"', 'LOWER', method='post', data={'email': 'asha@example.COM'})
+        self.assertIn('customer_email_lower_idx', plan)
+
+    def test_customer_login_is_case_insensitive(self):
+        response = self.client.post('/customer-login/', {'email': 'ASHA@example.com'})
+        self.assertRedirects(response, f'/customer-dashboard/{self.customer.id}/', fetch_redirect_response=False)
+
+
+class DashboardStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_totals_are_cached_between_requests(self):
+        self.assertEqual(get_dashboard_stats()['total_agents'], 2)
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+
+    def test_payment_save_and_delete_invalidate(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(
+                customer=self.customer, agent=self.agent, project=self.project,
+                amount=Decimal('5000'), receipt_number='R-1',
+            )
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['total_payments'], 1)
+        self.assertEqual(stats['total_payment_amount'], Decimal('5000'))
+        self.assertEqual(stats['total_points_awarded'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        self.assertEqual(get_dashboard_stats()['total_payments'], 0)
+
+    def test_agent_update_keeps_cache(self):
+        get_dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.agent.first_name = 'Ravi'
+            self.agent.save()
+        self.assertEqual(callbacks, [])
+
+
+class PointsAccrualTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+
+    def pay(self, agent, amount, receipt):
+        return Payment.objects.create(
+            customer=self.customer, agent=agent, project=self.project,
+            amount=Decimal(amount), receipt_number=receipt,
+        )
+
+    def test_stale_agent_instances_do_not_lose_points(self):
+        first, second = Agent.objects.get(pk=self.agent.pk), Agent.objects.get(pk=self.agent.pk)
+        self.pay(first, '2000', 'R-1')
+        self.pay(second, '3000', 'R-2')
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.total_points, 5)
+
+    def test_star_level_follows_database_total(self):
+        stale = Agent.objects.get(pk=self.agent.pk)
+        self.pay(self.agent, '2000000', 'R-1')
+        self.pay(stale, '600000', 'R-2')
+        stale.refresh_from_db()
+        self.assertEqual((stale.total_points, stale.star_level), (2600, 1))
+
+    def test_resaving_a_payment_does_not_double_count(self):
+        payment = self.pay(self.agent, '5000', 'R-1')
+        payment.save()
+        payment.amount = Decimal('8000')
+        payment.save()
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.total_points, 8)
+
+    def test_jumping_levels_awards_every_gift_crossed(self):
+        Gift.create_default_gifts()
+        self.pay(self.agent, '20000000', 'R-1')
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.star_level, 3)
+        self.assertEqual(
+            sorted(AgentGift.objects.filter(agent=self.agent).values_list('gift__required_star_level', flat=True)),
+            [1, 1, 1, 2, 2, 2, 3, 3, 3],
+        )
+
+    def test_gifts_are_only_looked_at_when_the_level_changes(self):
+        Gift.create_default_gifts()
+        self.pay(self.agent, '3000000', 'R-1')
+        with CaptureQueriesContext(connection) as queries:
+            self.pay(self.agent, '1000', 'R-2')
+        self.assertFalse([q for q in queries.captured_queries if 'gift' in q['sql'].lower()])
+
+    def test_new_gifts_reach_the_catalog(self):
+        Gift.create_default_gifts()
+        self.pay(self.agent, '3000000', 'R-1')
+        Gift.objects.create(name='Welcome hamper', required_star_level=2)
+        self.pay(self.agent, '5000000', 'R-2')
+        self.assertTrue(AgentGift.objects.filter(agent=self.agent, gift__name='Welcome hamper').exists())
+
+    def delete_payment(self, payment):
+        admin = Agent.objects.create_superuser(
+            username=f'admin-{payment.pk}', email=f'admin{payment.pk}@example.com', password='pass',
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/delete-payment/{payment.pk}/')
+        return queries
+
+    @override_settings(JOBS_EAGER=False)
+    def test_queued_delete_does_not_report_stale_figures(self):
+        payment = self.pay(self.agent, '3000000', 'R-1')
+        self.delete_payment(payment)
+        self.assertNotIn('agent_next_milestone_points', self.client.session)
+        self.assertIn('will update shortly', str(list(self.client.get('/admin-dashboard/').context['messages'])[0]))
+
+    def test_deleting_a_payment_reverses_its_points_and_unearned_gifts(self):
+        Gift.create_default_gifts()
+        big = self.pay(self.agent, '3000000', 'R-1')
+        self.pay(self.agent, '2000', 'R-2')
+        self.assertEqual(AgentGift.objects.filter(agent=self.agent).count(), 3)
+        delivered = AgentGift.objects.filter(agent=self.agent).first()
+        AgentGift.objects.filter(pk=delivered.pk).update(status='delivered')
+
+        self.delete_payment(big)
+        self.agent.refresh_from_db()
+        self.assertEqual((self.agent.total_points, self.agent.star_level), (2, 0))
+        self.assertEqual(self.client.session['agent_next_milestone_points'], self.agent.next_milestone())
+        self.assertEqual(self.client.session['agent_next_milestone_points'], 2498)
+        # Delivered gifts stay; the pending ones are withdrawn
+        self.assertEqual(list(AgentGift.objects.filter(agent=self.agent).values_list('status', flat=True)), ['delivered'])
+
+    @override_settings(UNEARNED_GIFT_POLICY='keep')
+    def test_keep_policy_leaves_unearned_gifts(self):
+        Gift.create_default_gifts()
+        self.delete_payment(self.pay(self.agent, '3000000', 'R-1'))
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.star_level, 0)
+        self.assertEqual(AgentGift.objects.filter(agent=self.agent, status='pending').count(), 3)
+
+    def test_delete_cost_does_not_grow_with_the_agents_payments(self):
+        few = self.delete_payment(self.pay(self.agent, '5000', 'R-1'))
+        for i in range(20):
+            self.pay(self.agent, '5000', f'R-many-{i}')
+        many = self.delete_payment(self.pay(self.agent, '5000', 'R-last'))
+        self.assertEqual(len(many), len(few))
+        self.assertFalse([q for q in many.captured_queries if 'SUM(' in q['sql'].upper()])
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.total_points, 100)
+
+    def test_reconcile_points_corrects_drift(self):
+        Gift.create_default_gifts()
+        self.pay(self.agent, '3000000', 'R-1')
+        Agent.objects.filter(pk=self.agent.pk).update(total_points=10)
+        out = io.StringIO()
+        call_command('reconcile_points', stdout=out)
+        self.agent.refresh_from_db()
+        self.assertEqual((self.agent.total_points, self.agent.star_level), (3000, 1))
+        self.assertIn('1 agent total(s) had drifted', out.getvalue())
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentAccrualTests(TransactionTestCase):
+    """Parallel payments for one agent must not lose points (needs a real server DB)."""
+
+    workers = 8
+    payments_per_worker = 5
+
+    def test_parallel_payments_for_one_agent(self):
+        agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=agent)
+        project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        Gift.create_default_gifts()
+        barrier = threading.Barrier(self.workers)
+        errors = []
+
+        def record_payments(worker):
+            try:
+                barrier.wait()
+                for i in range(self.payments_per_worker):
+                    Payment.objects.create(
+                        customer=customer, agent=agent, project=project,
+                        amount=Decimal('1000'), receipt_number=f'R-{worker}-{i}',
+                    )
+            except Exception as exc:  # surfaced through the assertion below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=record_payments, args=(w,)) for w in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        agent.refresh_from_db()
+        expected = self.workers * self.payments_per_worker
+        self.assertEqual(agent.total_points, expected)
+        self.assertEqual(agent.total_points, Payment.objects.filter(agent=agent).aggregate(t=Sum('points'))['t'])
+
+
+@override_settings(LIST_PAGE_SIZE=2)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        # Three payments tie on amount
+        for i, amount in enumerate(['5000', '9000', '5000', '1000', '5000']):
+            Payment.objects.create(
+                customer=cls.customer, agent=cls.agent, project=cls.project,
+                amount=Decimal(amount), receipt_number=f'R-{i}',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def page(self, url, cursor=None):
+        if cursor:
+            url += f"{'&' if '?' in url else '?'}cursor={cursor}"
+        page = self.client.get(url).context['page']
+        return [payment.receipt_number for payment in page], page
+
+    def test_next_and_previous_pages_walk_ties_in_id_order(self):
+        url = '/all-payments/?sort=amount'
+        expected = list(Payment.objects.order_by('amount', 'id').values_list('receipt_number', flat=True))
+
+        pages, cursor = [], None
+        while True:
+            receipts, page = self.page(url, cursor)
+            pages.append(receipts)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(len(pages), 3)
+
+        backwards = [receipts]
+        while page.has_previous:
+            receipts, page = self.page(url, page.previous_cursor)
+            backwards.append(receipts)
+        self.assertEqual(backwards[::-1], pages)
+
+    def test_bad_cursors_show_the_first_page(self):
+        first, _ = self.page('/all-payments/')
+        _, page = self.page('/all-payments/?sort=amount')
+        cursors = [
+            encode_cursor('not-a-date', 1, 'next', '-date'),
+            encode_cursor('2024-01-01T00:00:00+00:00', 10 ** 30, 'next', '-date'),
+            page.next_cursor,  # issued for ?sort=amount
+            'not-base64!',
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.page('/all-payments/', cursor)[0], first)
+        response = self.client.get('/all-agents/', {'sort': 'points', 'cursor': encode_cursor('many', 1, 'next', 'total_points')})
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_rejects_bad_cursors(self):
+        response = self.client.get('/api/payments/', {'cursor': encode_cursor('not-a-date', 1, 'next', '-date')})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class ListExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        for i, amount in enumerate(['1000', '9000', '5000']):
+            Payment.objects.create(
+                customer=cls.customer, agent=cls.agent, project=cls.project,
+                amount=Decimal(amount), receipt_number=f'R-{i}',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_csv_export_honours_search_and_sort(self):
+        response = self.client.get('/all-payments/?search=R-&sort=-amount&export=csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(lines[0].split(',')[1], 'receipt_number')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['R-1', 'R-2', 'R-0'])
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/all-payments/?sort=amount&export=csv')
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['R-0', 'R-2', 'R-1'])
+
+    def test_gzipped_ndjson_export(self):
+        response = self.client.get(f'/all-customers/?agent={self.agent.id}&export=ndjson&gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(row)['email'] for row in rows], ['asha@example.com'])
+
+
+class JsonApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.other = Agent.objects.create_user(username='meena', email='meena@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        Customer.objects.create(name='Kiran', email='kiran@example.com', agent=cls.other)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        for i, amount in enumerate(['1000', '9000', '5000']):
+            Payment.objects.create(
+                customer=cls.customer, agent=cls.agent, project=cls.project,
+                amount=Decimal(amount), receipt_number=f'R-{i}',
+            )
+
+    def test_sparse_fields_sort_and_cursor_pages(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/payments/?fields=receipt_number,amount&sort=-amount&limit=2')
+        body = response.json()
+        self.assertEqual(body['results'], [
+            {'id': body['results'][0]['id'], 'receipt_number': 'R-1', 'amount': '9000.00'},
+            {'id': body['results'][1]['id'], 'receipt_number': 'R-2', 'amount': '5000.00'},
+        ])
+        page_sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', page_sql)
+        self.assertNotIn('points', page_sql)
+
+        following = self.client.get(body['next']).json()
+        self.assertEqual([row['receipt_number'] for row in following['results']], ['R-0'])
+        self.assertIsNone(following['next'])
+        self.assertEqual(self.client.get('/api/payments/?fields=secret').status_code, 400)
+
+    def test_agents_only_see_their_own_rows(self):
+        self.assertEqual(self.client.get('/api/customers/').status_code, 401)
+        self.client.force_login(self.agent)
+        customers = self.client.get('/api/customers/?fields=name').json()['results']
+        self.assertEqual([row['name'] for row in customers], ['Asha'])
+        agents = self.client.get('/api/agents/?fields=username,payment_count').json()['results']
+        self.assertEqual(agents, [{'id': self.agent.id, 'username': 'ravi', 'payment_count': 3}])
+        self.assertEqual(self.client.get(f'/api/agents/{self.other.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/customers/{self.customer.id}/').json()['name'], 'Asha')
+
+    def test_unchanged_results_revalidate_with_304(self):
+        self.client.force_login(self.agent)
+        url = '/api/payments/?fields=amount'
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b'')
+
+        Payment.objects.filter(receipt_number='R-0').update(amount=Decimal('1500'))
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+
+class BatchPaymentEntryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agents = [Agent.objects.create_user(username=name, password='pass') for name in ('ravi', 'meena')]
+        cls.customers = [
+            Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com', agent=cls.agents[i % 2])
+            for i in range(4)
+        ]
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        Gift.create_default_gifts()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def submit(self, rows, mode='all'):
+        data = {'customer': [], 'project': [], 'amount': [], 'receipt_number': [], 'mode': mode}
+        for customer, amount, receipt_number in rows:
+            data['customer'].append(customer)
+            data['project'].append(str(self.project.id))
+            data['amount'].append(amount)
+            data['receipt_number'].append(receipt_number)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/add-payments/', data)
+        return response, len(queries)
+
+    def test_all_or_nothing_then_partial(self):
+        rows = [
+            (str(self.customers[0].id), '3000000', 'R-1'),
+            ('nobody@example.com', '1000', 'R-2'),
+            (self.customers[1].email, '2000', 'R-3'),
+            ('', '', ''),
+        ]
+        response, _ = self.submit(rows)
+        self.assertContains(response, 'customer not found')
+        self.assertFalse(Payment.objects.exists())
+
+        response, _ = self.submit(rows, mode='partial')
+        self.assertContains(response, 'customer not found')
+        self.assertEqual([row['receipt_number'] for row in response.context['rows']], ['R-2'])
+        self.assertEqual(sorted(Payment.objects.values_list('receipt_number', flat=True)), ['R-1', 'R-3'])
+        ravi = Agent.objects.get(username='ravi')
+        self.assertEqual((ravi.total_points, ravi.star_level, ravi.payment_count), (3000, 1, 1))
+        self.assertEqual(ravi.agent_gifts.count(), 3)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def rows(count, start):
+            return [(str(self.customers[i % 4].id), '1000', f'R-{start + i}') for i in range(count)]
+
+        self.submit(rows(4, 0))  # creates this month's rollup rows
+        response, few = self.submit(rows(4, 10))
+        self.assertRedirects(response, '/admin-dashboard/', fetch_redirect_response=False)
+        response, many = self.submit(rows(40, 100))
+        self.assertRedirects(response, '/admin-dashboard/', fetch_redirect_response=False)
+        self.assertEqual(many, few)
+        self.assertEqual(Agent.objects.get(username='meena').payment_count, 24)
+
+    def test_single_payment_form_joins_each_customers_agent(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/add-payment/')
+        Customer.objects.create(name='Extra', email='extra@example.com', agent=self.agents[1])
+        with self.assertNumQueries(len(queries)):
+            self.client.get('/add-payment/')
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        cls.agents = [Agent.objects.create_user(username=f'agent{i}', password='pass') for i in range(3)]
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        Gift.create_default_gifts()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_payments(self, count):
+        start = Payment.objects.count()
+        for i in range(start, start + count):
+            agent = self.agents[i % 3]
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com', agent=agent)
+            Payment.objects.create(
+                customer=customer, agent=agent, project=self.project,
+                amount=Decimal('300000'), receipt_number=f'AR-{i}',
+            )
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [
+            '/admin/realestate/payment/',
+            '/admin/realestate/customer/',
+            '/admin/realestate/agentgift/',
+            f'/admin/realestate/payment/?agent={self.agents[0].id}',
+            '/admin/realestate/agentgift/?star_level=1',
+        ]
+        self.add_payments(3)
+        counts = []
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(queries))
+        self.add_payments(15)
+        for url, count in zip(urls, counts):
+            with self.assertNumQueries(count):
+                self.client.get(url)
+
+    def test_filter_and_search_use_the_indexes(self):
+        self.add_payments(6)
+        response = self.client.get(f'/admin/realestate/customer/?agent={self.agents[1].id}')
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response = self.client.get('/admin/realestate/customer/', {'q': 'agent2'})
+        self.assertEqual({c.agent_id for c in response.context['cl'].result_list}, {self.agents[2].id})
+        response = self.client.get('/admin/realestate/payment/', {'q': 'AR-4'})
+        self.assertEqual([p.receipt_number for p in response.context['cl'].result_list], ['AR-4'])
+
+    def test_agent_page_shows_only_recent_gifts(self):
+        from .admin import AGENT_GIFT_INLINE_LIMIT
+        gifts = Gift.objects.bulk_create(
+            Gift(name=f'Voucher {i}', required_star_level=1) for i in range(AGENT_GIFT_INLINE_LIMIT + 5)
+        )
+        AgentGift.objects.bulk_create(AgentGift(agent=self.agents[0], gift=gift) for gift in gifts)
+        response = self.client.get(f'/admin/realestate/agent/{self.agents[0].id}/change/')
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(len(formset.forms), AGENT_GIFT_INLINE_LIMIT)
+
+
+class StarTierTests(TestCase):
+
+    def test_set_based_retier_matches_single_agent_lookup(self):
+        boundaries = sorted({0, *STAR_THRESHOLDS, *(t - 1 for t in STAR_THRESHOLDS), 10 ** 7})
+        agents = [
+            Agent.objects.create(username=f'agent{i}', total_points=points)
+            for i, points in enumerate(boundaries)
+        ]
+        Gift.create_default_gifts()
+        call_command('recompute_star_levels', stdout=io.StringIO())
+        for agent in agents:
+            agent.refresh_from_db()
+            self.assertEqual(agent.star_level, star_level_for(agent.total_points), agent.total_points)
+            expected_gifts = Gift.objects.filter(required_star_level__range=(1, agent.star_level)).count()
+            self.assertEqual(agent.agent_gifts.count(), expected_gifts)
+
+
+class MonthlyRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(username='ravi')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.layout = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        cls.construction = Project.objects.create(name='Sky Towers', project_type=Project.TYPE_CONSTRUCTION)
+
+    def rollup(self):
+        return sorted(AgentMonthlyStats.objects.filter(payment_count__gt=0).values_list(
+            'agent_id', 'month', 'project_type', 'amount', 'points', 'payment_count'
+        ))
+
+    def test_rollup_follows_payment_writes_and_matches_rebuild(self):
+        first = Payment.objects.create(customer=self.customer, agent=self.agent, project=self.layout,
+                                       amount=Decimal('5000'), receipt_number='R-1')
+        second = Payment.objects.create(customer=self.customer, agent=self.agent, project=self.layout,
+                                        amount=Decimal('4000'), receipt_number='R-2')
+        second.project = self.construction
+        second.amount = Decimal('9000')
+        second.save()
+        first.delete()
+
+        incremental = self.rollup()
+        self.assertEqual([row[2:] for row in incremental], [(Project.TYPE_CONSTRUCTION, Decimal('9000'), 3, 1)])
+        call_command('rebuild_monthly_stats', stdout=io.StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(username='ravi')
+        cls.other = Agent.objects.create(username='meena')
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+
+    def counters(self):
+        return (
+            list(Agent.objects.order_by('pk').values_list('customer_count', 'payment_count', 'total_amount')),
+            list(Customer.objects.order_by('pk').values_list('payment_count', 'total_amount')),
+        )
+
+    def pay(self, customer, amount, receipt):
+        return Payment.objects.create(customer=customer, agent=customer.agent, project=self.project,
+                                      amount=Decimal(amount), receipt_number=receipt)
+
+    def test_counters_follow_customer_and_payment_writes(self):
+        asha = Customer.objects.create(name='Asha', email='asha@example.com', agent=self.agent)
+        kiran = Customer.objects.create(name='Kiran', email='kiran@example.com', agent=self.other)
+        first = self.pay(asha, '5000', 'R-1')
+        self.pay(asha, '2000', 'R-2')
+        self.pay(kiran, '1000', 'R-3')
+        # Moved to another customer and agent, and re-priced
+        first.customer, first.agent, first.amount = kiran, self.other, Decimal('4000')
+        first.save()
+        self.assertEqual(self.counters(), (
+            [(1, 1, Decimal('2000')), (1, 2, Decimal('5000'))],
+            [(1, Decimal('2000')), (2, Decimal('5000'))],
+        ))
+
+        Payment.objects.get(receipt_number='R-3').delete()
+        kiran.delete()
+        self.assertEqual(self.counters(), ([(1, 1, Decimal('2000')), (0, 0, Decimal('0'))], [(1, Decimal('2000'))]))
+
+    def test_reconcile_corrects_drift_and_lists_sort_by_counters(self):
+        for i, amount in enumerate(['1000', '9000']):
+            agent = (self.agent, self.other)[i]
+            self.pay(Customer.objects.create(name=f'C{i}', email=f'c{i}@example.com', agent=agent), amount, f'R-{i}')
+        expected = self.counters()
+        Agent.objects.update(customer_count=7, total_amount=0)
+        Customer.objects.filter(payment_count=1).update(payment_count=3)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('Corrected 2 agent(s) and 2 customer(s)', out.getvalue())
+        self.assertEqual(self.counters(), expected)
+
+        admin = Agent.objects.create_superuser('boss', 'boss@example.com', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get('/all-agents/?sort=-amount')
+        self.assertEqual([agent.username for agent in response.context['agents']][:2], ['meena', 'ravi'])
+        self.assertContains(response, '₹9000')
+
+
+class LeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agents = [Agent.objects.create(username=f'agent{i}') for i in range(4)]
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agents[0])
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+
+    def setUp(self):
+        cache.clear()
+
+    def pay(self, agent, amount, receipt):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                customer=self.customer, agent=agent, project=self.project,
+                amount=Decimal(amount), receipt_number=receipt,
+            )
+
+    def assert_cached_ranks_match_window_ranks(self):
+        for agent in ranked_agents():
+            rank = agent_rank(agent, month_of(timezone.now()))
+            self.assertEqual((rank['overall'], rank['level']), (agent.overall_rank, agent.level_rank), agent)
+
+    def test_points_changes_move_cached_standings(self):
+        get_board()
+        self.pay(self.agents[1], '3000000', 'R-1')
+        self.pay(self.agents[2], '3000000', 'R-2')
+        payment = self.pay(self.agents[3], '9000', 'R-3')
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        # Moved in place, not dropped
+        self.assertIsNotNone(cache.get(leaderboard._board_key(board_version())))
+        self.assert_cached_ranks_match_window_ranks()
+
+        agent = Agent.objects.get(pk=self.agents[1].pk)
+        with self.assertNumQueries(0):
+            rank = agent_rank(agent, month_of(timezone.now()))
+        self.assertEqual((rank['overall'], rank['month'], rank['month_of']), (1, 1, 2))
+
+    def test_concurrent_moves_are_not_lost(self):
+        get_board()
+        first, second = self.agents[1], self.agents[2]
+        Agent.objects.filter(pk=first.pk).update(total_points=500)
+        Agent.objects.filter(pk=second.pk).update(total_points=900)
+        bump = leaderboard._bump_version
+        other_process = []
+
+        def bump_after_other_process():
+            # The other process moves its agent after this one read the board
+            if not other_process:
+                other_process.append(True)
+                leaderboard._move(second.pk, (0, 0), (900, 0))
+            return bump()
+
+        with mock.patch.object(leaderboard, '_bump_version', bump_after_other_process):
+            leaderboard._move(first.pk, (0, 0), (500, 0))
+        self.assert_cached_ranks_match_window_ranks()
+        board = get_board()
+        self.assertEqual(board['overall'][:2], [(-900, second.pk), (-500, first.pk)])
+
+    def test_leaderboard_page(self):
+        self.pay(self.agents[2], '3000000', 'R-1')
+        self.client.force_login(self.agents[0])
+        response = self.client.get('/leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['agent'] for e in response.context['entries']][0], self.agents[2])
+        response = self.client.get('/leaderboard/', {'board': 'month'})
+        self.assertEqual([e['rank'] for e in response.context['entries']], [1])
+
+
+class SearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Agent.objects.create(username='admin', is_staff=True, is_superuser=True)
+        cls.agent = Agent.objects.create(username='ravi', email='ravi@example.com')
+        cls.customer = Customer.objects.create(name='Asha Kumari', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        cls.payment = Payment.objects.create(
+            customer=cls.customer, agent=cls.agent, project=cls.project,
+            amount=Decimal('5000'), receipt_number='RCP-1001',
+        )
+
+    def titles(self, query, **kwargs):
+        return [(entry.kind, entry.title) for entry in search(query, **kwargs)]
+
+    def test_entries_follow_renames_and_deletes(self):
+        self.assertEqual(self.titles('kumari'), [('customer', 'Asha Kumari'), ('payment', 'RCP-1001')])
+        self.customer.name = 'Meera Shah'
+        self.customer.save()
+        self.assertEqual(self.titles('kumari'), [])
+        self.assertEqual(self.titles('meera', kinds=['payment']), [('payment', 'RCP-1001')])
+        self.payment.delete()
+        self.assertEqual(self.titles('rcp'), [])
+
+    def test_list_search_uses_the_index(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/all-payments/', {'search': 'meadow'})
+        self.assertEqual([p.receipt_number for p in response.context['payments']], ['RCP-1001'])
+        listing = next(q['sql'] for q in queries if 'FROM "realestate_payment"' in q['sql'] and 'ORDER BY' in q['sql'])
+        self.assertIn('realestate_searchentry', listing)
+
+
+
+class AsyncViewTests(TransactionTestCase):
+
+    def test_dashboard_queries_run_concurrently_on_pool_threads(self):
+        admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        Customer.objects.create(name='Asha', email='asha@example.com', agent=admin)
+        self.assertRedirects(
+            self.client.get('/admin-dashboard/'), '/admin-login/?next=/admin-dashboard/',
+            fetch_redirect_response=False,
+        )
+
+        threads = []
+        run = aio._run
+
+        def recording_run(func):
+            threads.append(threading.current_thread().name)
+            return run(func)
+
+        self.client.force_login(admin)
+        with mock.patch.object(aio, '_run', recording_run):
+            response = self.client.get('/admin-dashboard/')
+        self.assertContains(response, 'Asha')
+        self.assertEqual(len(threads), 6)
+        self.assertTrue(all(name.startswith('realestate-query') for name in threads), threads)
+
+class AgentDashboardQueryCountTests(TestCase):
+    # session, user, customers page, recent payments, gifts, monthly rollup
+    EXPECTED_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(username='ravi')
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        Gift.create_default_gifts()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.agent)
+
+    def add_business(self, count):
+        start = Customer.objects.count()
+        for i in range(start, start + count):
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'c{i}@example.com', agent=self.agent)
+            Payment.objects.create(
+                customer=customer, agent=self.agent, project=self.project,
+                amount=Decimal('3000000'), receipt_number=f'R-{i}',
+            )
+
+    def dashboard_queries(self):
+        self.client.get('/agent-dashboard/')  # warm the leaderboard cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/agent-dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_agent(self):
+        self.add_business(1)
+        self.assertEqual(self.dashboard_queries(), self.EXPECTED_QUERIES)
+        self.add_business(30)
+        self.assertGreater(self.agent.agent_gifts.count(), 3)
+        self.assertEqual(self.dashboard_queries(), self.EXPECTED_QUERIES)
+
+
+class RequestProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(username='ravi')
+
+    def setUp(self):
+        self.client.force_login(self.agent)
+
+    def test_disabled_by_default(self):
+        response = self.client.get('/agent-dashboard/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_MAX_QUERIES=1, REQUEST_PROFILING_DUPLICATE_THRESHOLD=2)
+    def test_server_timing_and_slow_request_log(self):
+        with self.assertLogs('realestate.profiling', 'WARNING') as logs:
+            response = self.client.get('/agent-dashboard/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['path'], record['status']), ('/agent-dashboard/', 200))
+        self.assertGreater(record['queries'], 1)
+        self.assertTrue(record['slowest'])
+
+
+class ImportPaymentsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Gift.create_default_gifts()
+        cls.layout = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        cls.construction = Project.objects.create(name='Sky Towers', project_type=Project.TYPE_CONSTRUCTION)
+        # Imported payments go to the first pair; the second pair gets the
+        # same payments saved one by one, to compare against
+        cls.pairs = []
+        for suffix in ('import', 'save'):
+            agents = [Agent.objects.create_user(username=f'{name}_{suffix}', password='pass') for name in ('ravi', 'meena')]
+            customers = [
+                Customer.objects.create(name=f'Customer {i}', email=f'c{i}_{suffix}@example.com', agent=agents[i % 2])
+                for i in range(3)
+            ]
+            cls.pairs.append((agents, customers))
+        # Each meena already has a payment
+        for (agents, customers), receipt_number in zip(cls.pairs, ('TAKEN', 'TAKEN-S')):
+            Payment.objects.create(
+                customer=customers[1], agent=agents[1], project=cls.layout,
+                amount=Decimal('1000'), receipt_number=receipt_number,
+            )
+
+    # (customer index, project, amount)
+    PAYMENTS = [
+        (0, 'Green Meadows', '2500000'),
+        (2, 'Green Meadows', '4000000'),
+        (1, 'Sky Towers', '900000'),
+        (0, 'Sky Towers', '3000000'),
+    ]
+
+    def write(self, path, rows, fmt='csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if fmt == 'csv':
+                writer = csv.DictWriter(f, fieldnames=['customer_email', 'project', 'amount', 'receipt_number', 'date'])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                f.writelines(row if isinstance(row, str) else json.dumps(row) + '\n' for row in rows)
+
+    def test_import_matches_saving_one_by_one(self):
+        (agents, customers), (saved_agents, saved_customers) = self.pairs
+        rows = [
+            {'customer_email': customers[c].email, 'project': project, 'amount': amount,
+             'receipt_number': f'I-{i}', 'date': ''}
+            for i, (c, project, amount) in enumerate(self.PAYMENTS)
+        ]
+        rows[3:3] = [
+            {'customer_email': 'nobody@example.com', 'project': 'Green Meadows', 'amount': '1000', 'receipt_number': 'X-1', 'date': ''},
+            {'customer_email': customers[0].email, 'project': 'Green Meadows', 'amount': 'abc', 'receipt_number': 'X-2', 'date': ''},
+            {'customer_email': customers[0].email, 'project': 'Green Meadows', 'amount': '1000', 'receipt_number': 'I-0', 'date': ''},
+            {'customer_email': customers[0].email, 'project': 'Green Meadows', 'amount': '1000', 'receipt_number': 'TAKEN', 'date': ''},
+        ]
+        for i, (c, project, amount) in enumerate(self.PAYMENTS):
+            Payment.objects.create(
+                customer=saved_customers[c], agent=saved_customers[c].agent,
+                project=Project.objects.get(name=project), amount=Decimal(amount), receipt_number=f'S-{i}',
+            )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'payments.csv')
+            self.write(path, rows)
+            call_command('import_payments', path, chunk_size=2, stdout=io.StringIO())
+            with open(os.path.join(tmp, 'payments.rejected.csv'), newline='', encoding='utf-8') as f:
+                rejects = [(row['receipt_number'], row['error']) for row in csv.DictReader(f)]
+
+        self.assertEqual(rejects, [
+            ('X-1', 'customer not found'),
+            ('X-2', 'invalid amount'),
+            ('I-0', 'duplicate receipt_number'),
+            ('TAKEN', 'duplicate receipt_number'),
+        ])
+        self.assertEqual(
+            sorted(Payment.objects.filter(receipt_number__startswith='I-').values_list('receipt_number', flat=True)),
+            ['I-0', 'I-1', 'I-2', 'I-3'],
+        )
+
+        def figures(agent):
+            agent.refresh_from_db()
+            return (
+                agent.total_points, agent.star_level, agent.payment_count, agent.total_amount,
+                sorted(agent.agent_gifts.values_list('gift_id', flat=True)),
+                sorted(agent.monthly_stats.values_list('month', 'project_type', 'amount', 'points', 'payment_count')),
+            )
+
+        for imported, saved in zip(agents, saved_agents):
+            self.assertEqual(figures(imported), figures(saved), imported.username)
+        self.assertGreater(agents[0].star_level, 1)
+
+    def test_agents_of_committed_chunks_are_settled_when_a_later_chunk_fails(self):
+        from realestate import payment_batches
+        customers = self.pairs[0][1]
+        rows = [
+            {'customer_email': customers[0].email, 'project': 'Green Meadows', 'amount': '3000000',
+             'receipt_number': 'F-1', 'date': ''},
+            {'customer_email': customers[1].email, 'project': 'Green Meadows', 'amount': '3000000',
+             'receipt_number': 'F-2', 'date': ''},
+        ]
+        insert = payment_batches.insert_payments
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return insert(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'payments.csv')
+            self.write(path, rows)
+            with mock.patch.object(payment_batches, 'insert_payments', fail_second_chunk), \
+                    self.assertRaises(RuntimeError):
+                call_command('import_payments', path, chunk_size=1, stdout=io.StringIO())
+
+        self.assertFalse(Payment.objects.filter(receipt_number='F-2').exists())
+        agent = Agent.objects.get(pk=customers[0].agent_id)
+        self.assertEqual((agent.total_points, agent.agent_gifts.count()), (3000, 3))
+
+    def test_ndjson_keeps_dates_and_raw_rejected_lines(self):
+        customer = self.pairs[0][1][0]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'payments.ndjson')
+            self.write(path, [
+                {'customer_id': customer.id, 'project_id': self.layout.id, 'amount': '3000000',
+                 'receipt_number': 'N-1', 'date': '2024-03-05'},
+                '{"customer_id": oops}\n',
+            ], fmt='ndjson')
+            call_command('import_payments', path, stdout=io.StringIO())
+            with open(os.path.join(tmp, 'payments.rejected.ndjson'), encoding='utf-8') as f:
+                rejects = [json.loads(line) for line in f]
+        self.assertEqual(rejects[0]['raw'], '{"customer_id": oops}')
+        self.assertIn('invalid JSON', rejects[0]['error'])
+        agent = Agent.objects.get(pk=customer.agent_id)
+        self.assertEqual((agent.total_points, agent.star_level, agent.agent_gifts.count()), (3000, 1, 3))
+        payment = Payment.objects.get(receipt_number='N-1')
+        self.assertEqual(timezone.localtime(payment.date).date().isoformat(), '2024-03-05')
+        self.assertEqual(agent.monthly_stats.get().month.isoformat(), '2024-03-01')
+
+
+class ImportDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Gift.create_default_gifts()
+        agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=agent)
+        project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+        for i in range(5):
+            Payment.objects.create(
+                customer=customer, agent=agent, project=project,
+                amount=Decimal('300000'), receipt_number=f'R-{i}',
+            )
+        cls.paid_on = timezone.now().replace(microsecond=0) - timedelta(days=400)
+        Payment.objects.update(date=cls.paid_on)
+
+    def export(self, path, broken_receipt=None):
+        # Payments come before the customers they reference, as an export may
+        sections = [
+            ('gifts', Gift), ('projects', Project), ('agents', Agent),
+            ('payments', Payment), ('customers', Customer), ('agent_gifts', AgentGift),
+        ]
+        data = {name: json.loads(serializers.serialize('json', model.objects.order_by('pk'))) for name, model in sections}
+        for record in data['payments']:
+            if record['fields']['receipt_number'] == broken_receipt:
+                record['fields']['amount'] = 'lots'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def wipe(self):
+        Agent.objects.all().delete()
+        Project.objects.all().delete()
+        Gift.objects.all().delete()
+
+    def test_round_trip_in_batches(self):
+        expected_agent = Agent.objects.values('agent_number', 'total_points', 'star_level').get()
+        gifts = AgentGift.objects.count()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export.json')
+            self.export(path)
+            self.wipe()
+            out = io.StringIO()
+            call_command('import_data', path, batch_size=2, stdout=out)
+
+        self.assertIn('… 4 payments', out.getvalue())
+        agent = Agent.objects.get()
+        self.assertEqual(
+            {key: getattr(agent, key) for key in expected_agent}, expected_agent,
+        )
+        self.assertEqual((agent.customer_count, agent.payment_count, agent.total_amount), (1, 5, Decimal('1500000')))
+        self.assertEqual(set(Payment.objects.values_list('date', flat=True)), {self.paid_on})
+        self.assertEqual(AgentGift.objects.count(), gifts)
+        self.assertEqual(AgentMonthlyStats.objects.get().payment_count, 5)
+
+    def test_failing_section_rolls_back_everything(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'export.json')
+            self.export(path, broken_receipt='R-3')
+            self.export(os.path.join(tmp, 'fixed.json'))
+            self.wipe()
+            out = io.StringIO()
+            call_command('import_data', path, batch_size=2, stdout=out)
+            self.assertIn('Error importing payments', out.getvalue())
+            self.assertIn('nothing was imported', out.getvalue())
+            for model in (Gift, Project, Agent, Customer, Payment):
+                self.assertFalse(model.objects.exists(), model.__name__)
+
+            # The database is still empty, so the fixed export goes in
+            call_command('import_data', os.path.join(tmp, 'fixed.json'), stdout=io.StringIO())
+        self.assertEqual(Payment.objects.count(), 5)
+
+
+class LoadTestingCommandTests(TestCase):
+
+    def test_generated_data_is_consistent_and_every_view_benchmarks(self):
+        options = dict(agents=3, customers=6, projects=2, payments=40, seed=7, stdout=io.StringIO())
+        call_command('generate_load_data', **options)
+        agents = Agent.objects.filter(username__startswith='ld7_')
+        self.assertEqual(agents.count(), 3)
+        self.assertEqual(Payment.objects.count(), 40)
+        for agent in agents:
+            earned = agent.payments.aggregate(total=Sum('points'))['total'] or 0
+            self.assertEqual(agent.total_points, earned)
+            self.assertEqual(agent.star_level, star_level_for(earned))
+
+        Agent.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        out = io.StringIO()
+        call_command('benchmark_views', iterations=1, warmup=0, stdout=out)
+        lines = [line for line in out.getvalue().splitlines() if line.startswith('/')]
+        self.assertIn('/leaderboard/', out.getvalue())
+        self.assertTrue(all(line.split()[1] == '200' for line in lines), out.getvalue())
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_public_pages_render_once_and_revalidate(self):
+        first = self.client.get('/oxygen-club/')
+        self.assertTemplateUsed(first, 'oxygen_club.html')
+        etag = first['ETag']
+
+        second = self.client.get('/oxygen-club/?utm_source=mail')
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], etag)
+        self.assertIn('public', second['Cache-Control'])
+
+        revalidated = self.client.get('/oxygen-club/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+        since = self.client.get('/oxygen-club/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        pagecache.purge()
+        self.assertTemplateUsed(self.client.get('/oxygen-club/'), 'oxygen_club.html')
+
+    def test_a_new_release_misses_the_old_pages(self):
+        self.client.get('/oxygen-club/')
+        with override_settings(PAGE_CACHE_RELEASE='v2'):
+            self.assertTemplateUsed(self.client.get('/oxygen-club/'), 'oxygen_club.html')
+            self.assertEqual(self.client.get('/oxygen-club/').templates, [])
+
+    def test_purge_command_needs_a_shared_cache(self):
+        self.client.get('/oxygen-club/')
+        out = io.StringIO()
+        call_command('purge_page_cache', stdout=out)
+        self.assertIn('Nothing purged', out.getvalue())
+        self.assertEqual(self.client.get('/oxygen-club/').templates, [])
+
+
+class StaticAssetTests(TestCase):
+
+    def test_pages_use_local_assets(self):
+        for url in ['/', '/oxygen-club/', '/agent-login/']:
+            content = self.client.get(url).content.decode()
+            self.assertIn('/static/vendor/bootstrap/css/bootstrap.min.css', content)
+            self.assertNotIn('cdn.jsdelivr.net', content)
+            self.assertNotIn('cdnjs.cloudflare.com', content)
+
+    def test_list_pages_share_the_stylesheet(self):
+        admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        for url in ['/all-agents/', '/all-customers/', '/all-payments/', '/all-projects/', '/search/?q=a']:
+            content = self.client.get(url).content.decode()
+            self.assertIn('/static/realestate/css/app.css', content)
+            self.assertNotIn('<style>', content)
+
+    def test_templates_have_no_inline_style_blocks(self):
+        templates = os.path.join(settings.BASE_DIR, 'realestate', 'templates')
+        for root, _, names in os.walk(templates):
+            for name in names:
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    self.assertNotIn('<style', f.read(), name)
+
+    def test_collectstatic_builds_hashed_compressed_files(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(
+            STATIC_ROOT=static_root,
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('realestate/css/app.css')
+            self.assertRegex(hashed, r'^realestate/css/app\.[0-9a-f]{12}\.css$')
+            self.assertTrue(os.path.exists(os.path.join(static_root, hashed + '.gz')))
+            # Font URLs inside the vendored CSS are rewritten to their hashed names too
+            with open(os.path.join(static_root, staticfiles_storage.stored_name('vendor/fontawesome/css/all.min.css'))) as f:
+                self.assertRegex(f.read(), r'fa-solid-900\.[0-9a-f]{12}\.woff2')
+
+
+class DbPoolTests(TestCase):
+
+    def setUp(self):
+        self.admin = Agent.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+
+    def test_requests_check_the_connection_out_and_back_in(self):
+        self.client.force_login(self.admin)
+        before = dbpool.snapshot()
+        response = self.client.get('/ops/db-pool/')
+        during = response.json()['worker']
+        after = dbpool.snapshot()
+
+        self.assertGreaterEqual(during['in_use'], 1)
+        self.assertEqual(after['in_use'], 0)
+        self.assertEqual(after['idle'], after['open'])
+        self.assertEqual(after['checkouts'], before['checkouts'] + 1)
+        # The test connection is already open, so the request reused it
+        self.assertEqual(after['reused'], before['reused'] + 1)
+
+    def test_connects_and_closes_are_counted(self):
+        before = dbpool.snapshot()
+        wrapper = connections.create_connection('default')
+        wrapper.connect()
+        opened = dbpool.snapshot()
+        self.assertEqual(opened['connects'], before['connects'] + 1)
+        self.assertEqual(opened['open'], before['open'] + 1)
+        self.assertGreaterEqual(opened['connect_wait_ms']['max'], opened['connect_wait_ms']['avg'])
+
+        # The in-memory test database would ignore close()
+        with mock.patch.object(wrapper, 'is_in_memory_db', return_value=False):
+            wrapper.close()
+        closed = dbpool.snapshot()
+        self.assertEqual(closed['closes'], before['closes'] + 1)
+        self.assertEqual(closed['open'], before['open'])
+
+    def test_stats_are_staff_only(self):
+        agent = Agent.objects.create(username='ravi')
+        self.client.force_login(agent)
+        self.assertEqual(self.client.get('/ops/db-pool/').status_code, 403)
+
+    def test_gunicorn_workers_fit_the_pool(self):
+        env = {'DB_POOL_SIZE': '20', 'GUNICORN_THREADS': '4', 'ASYNC_QUERY_THREADS': '2', 'WEB_CONCURRENCY': '9'}
+        with mock.patch.dict(os.environ, env):
+            config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        self.assertEqual(config['workers'], 3)
+        self.assertEqual(config['worker_class'], 'gthread')
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create_user(username='ravi', email='ravi@example.com', password='pass')
+        cls.customer = Customer.objects.create(name='Asha', email='asha@example.com', agent=cls.agent)
+        cls.project = Project.objects.create(name='Green Meadows', project_type=Project.TYPE_LAYOUT)
+
+    def test_payment_side_effects_wait_for_a_worker(self):
+        Gift.create_default_gifts()
+        Payment.objects.create(
+            customer=self.customer, agent=self.agent, project=self.project,
+            amount=Decimal('3000000'), receipt_number='R-1',
+        )
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.total_points, 0)
+        self.assertEqual(Job.objects.get().status, Job.STATUS_PENDING)
+
+        call_command('run_workers', '--once', '--workers', '1', stdout=io.StringIO())
+        self.agent.refresh_from_db()
+        self.assertEqual((self.agent.total_points, self.agent.star_level), (3000, 1))
+        self.assertEqual(AgentGift.objects.filter(agent=self.agent).count(), 3)
+        self.assertEqual(AgentMonthlyStats.objects.get().payment_count, 1)
+        self.assertEqual(Job.objects.get().status, Job.STATUS_DONE)
+
+    def assert_payment_undone(self):
+        self.agent.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual((self.agent.total_points, self.agent.payment_count, self.customer.payment_count), (0, 0, 0))
+        rollup = AgentMonthlyStats.objects.filter(agent=self.agent).aggregate(
+            amount=Sum('amount'), points=Sum('points'), payments=Sum('payment_count'),
+        )
+        self.assertEqual((rollup['amount'] or 0, rollup['points'] or 0, rollup['payments'] or 0), (0, 0, 0))
+
+    def test_delete_before_the_payments_job_runs(self):
+        payment = Payment.objects.create(
+            customer=self.customer, agent=self.agent, project=self.project,
+            amount=Decimal('30000'), receipt_number='R-1',
+        )
+        payment.delete()
+        self.assertEqual(Job.objects.count(), 2)
+
+        call_command('run_workers', '--once', '--workers', '1', stdout=io.StringIO())
+        self.assertFalse(Job.objects.exclude(status=Job.STATUS_DONE).exists())
+        self.assert_payment_undone()
+
+    def test_ledger_jobs_run_in_any_order(self):
+        # The add is retrying while the edit and the delete go through
+        payment = Payment.objects.create(
+            customer=self.customer, agent=self.agent, project=self.project,
+            amount=Decimal('30000'), receipt_number='R-1',
+        )
+        payment.amount = Decimal('60000')
+        payment.save()
+        payment.delete()
+        for job_id in reversed(jobs.claim('test', 10)):
+            self.assertTrue(jobs.run_job(job_id))
+        self.assert_payment_undone()
+
+    def test_enqueueing_a_key_twice_queues_one_job(self):
+        payload = {'previous': None, 'current': {}}
+        jobs.enqueue('payment.ledger', payload, key='payment:1:once')
+        jobs.enqueue('payment.ledger', payload, key='payment:1:once')
+        self.assertEqual(Job.objects.filter(key='payment:1:once').count(), 1)
+
+    @override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_BASE_SECONDS=30)
+    def test_failures_back_off_then_give_up(self):
+        def broken(payload):
+            raise RuntimeError('mail server down')
+
+        with mock.patch.dict(jobs.TASKS, {'test.broken': broken}):
+            jobs.enqueue('test.broken', {}, key='broken')
+            with self.assertLogs('realestate.jobs', 'WARNING'):
+                self.assertFalse(jobs.run_job(*jobs.claim('test', 10)))
+            job = Job.objects.get(key='broken')
+            self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 1))
+            self.assertIn('mail server down', job.last_error)
+            self.assertGreater(job.run_at, timezone.now() + jobs.backoff(1) - timedelta(seconds=5))
+            # Not due again until the backoff has passed
+            self.assertEqual(jobs.claim('test', 10), [])
+
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            with self.assertLogs('realestate.jobs', 'WARNING'):
+                jobs.run_job(*jobs.claim('test', 10))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Home and authentication
@@ -9,6 +9,7 @@ urlpatterns = [
     path('legacy-home/', views.home, name='legacy-home'),  # Keep old home as legacy
     path('agent-login/', views.agent_login, name='agent_login'),
     path('agent-dashboard/', views.agent_dashboard, name='agent_dashboard'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('agent-logout/', LogoutView.as_view(next_page='agent_login'), name='agent_logout'),
 
     # Admin routes
@@ -18,6 +19,7 @@ urlpatterns = [
     path('add-customer/', views.add_customer, name='add_customer'),
     path('add-agent/', views.add_agent, name='add_agent'),
     path('add-payment/', views.add_payment, name='add_payment'),
+    path('add-payments/', views.add_payments, name='add_payments'),
     path('add-project/', views.add_project, name='add_project'),
     path('delete-agent/<int:agent_id>/', views.delete_agent, name='delete_agent'),
     path('delete-customer/<int:customer_id>/', views.delete_customer, name='delete_customer'),
@@ -33,7 +35,18 @@ urlpatterns = [
     path('all-projects/', views.all_projects, name='all_projects'),
     path('all-payments/', views.all_payments, name='all_payments'),
 
+    # Global search
+    path('search/', views.global_search, name='global_search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
+
     # Customer routes
     path('customer-login/', views.customer_login, name='customer_login'),
     path('customer-dashboard/<int:customer_id>/', views.customer_dashboard, name='customer_dashboard'),
+
+    # Read-only JSON API
+    path('api/<slug:resource>/', api.resource_list, name='api_list'),
+    path('api/<slug:resource>/<int:pk>/', api.resource_detail, name='api_detail'),
+
+    # Operations
+    path('ops/db-pool/', views.db_pool_stats, name='db_pool_stats'),
 ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.views.decorators.http import require_POST
 
 # ...existing code...
@@ -7,32 +8,64 @@ def delete_payment(request, payment_id):
     if not request.user.is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
-    payment = get_object_or_404(Payment, id=payment_id)
+    payment = get_object_or_404(Payment.objects.select_related('agent'), id=payment_id)
     agent = payment.agent
+    # The post_delete receiver queues the payment.ledger job that subtracts
+    # its PV, re-tiers the agent and applies UNEARNED_GIFT_POLICY
     payment.delete()
-    # Recalculate agent's total points from all remaining payments
-    total_points = Payment.objects.filter(agent=agent).aggregate(total=Sum('points'))['total'] or 0
-    agent.total_points = total_points
-    agent.update_star_level()
-    agent.save()
+    if not settings.JOBS_EAGER:
+        # Nothing is applied until a worker runs the job
+        request.session.pop('agent_next_milestone_points', None)
+        messages.success(request, "Payment deleted. Agent points, star level and next milestone will update shortly.")
+        return redirect('admin-dashboard')
+    # The job updated the row, not this instance
+    agent.refresh_from_db(fields=['total_points', 'star_level'])
     # Optionally, update next_milestone_points in session for admin dashboard refresh
     request.session['agent_next_milestone_points'] = agent.next_milestone()
     messages.success(request, "Payment deleted and agent points, star level, and next milestone updated.")
     return redirect('admin-dashboard')
-from django.shortcuts import render, redirect, get_object_or_404
+from datetime import datetime
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Q
-from .models import Agent, Customer, Payment, Gift, AgentGift, Project
-
-
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .models import (
+    Agent, Customer, Payment, Gift, AgentGift, Project, AgentMonthlyStats, SearchEntry, MAX_STAR_LEVEL,
+)
+from .stats import get_dashboard_stats, invalidate_dashboard_stats
+from .leaderboard import get_board, get_monthly, agent_rank, ranked_entries
+from .rollups import month_of
+from .search import search
+from .pagecache import cached_page
+from . import aio, dbpool
+from .listing import (
+    AGENT_SORTS, CUSTOMER_SORTS, PROJECT_SORTS, PAYMENT_SORTS,
+    filter_agents, filter_customers, filter_projects, filter_payments,
+)
+from .payment_batches import insert_payments, settle_agents, validate_payment_rows
+from .pagination import paginate_keyset, count_rows, wants_estimated_count, querystring_without_cursor
+from .exports import (
+    wants_export, export_response,
+    AGENT_EXPORT_COLUMNS, CUSTOMER_EXPORT_COLUMNS, PROJECT_EXPORT_COLUMNS, PAYMENT_EXPORT_COLUMNS,
+)
+
+
+@cached_page
 def home(request):
     return render(request, "home.html")
 
+@cached_page
 def vijay_home(request):
     return render(request, "vijay_home.html")
 
+@cached_page
 def oxygen_club(request):
     return render(request, "oxygen_club.html")
 
@@ -65,92 +98,160 @@ def admin_login(request):
 
 def customer_login(request):
     if request.method == "POST":
-        email = request.POST.get("email")
+        email = (request.POST.get("email") or "").strip()
         try:
-            customer = Customer.objects.get(email=email)
+            # Case-insensitive match, served by the LOWER(email) index
+            customer = Customer.objects.alias(email_lower=Lower('email')).get(email_lower=email.lower())
             return redirect('customer_dashboard', customer_id=customer.id)
         except Customer.DoesNotExist:
             messages.error(request, "Customer not found with this email")
+        except Customer.MultipleObjectsReturned:
+            messages.error(request, "More than one customer uses this email. Please contact the office.")
     return render(request, "customer_login.html")
 
 
-@login_required(login_url='admin-login')
-def admin_dashboard(request):
-    if not request.user.is_staff:
+@aio.login_required(login_url='admin-login')
+async def admin_dashboard(request):
+    if not (await request.auser()).is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
     
-    agents = Agent.objects.all().order_by('-id')[:4]  # Latest 4 agents
-    customers = Customer.objects.all().order_by('-id')[:4]  # Latest 4 customers
-    projects = Project.objects.all().order_by('-id')[:4]  # Latest 4 projects
-    payments = Payment.objects.select_related('project', 'customer', 'agent').all().order_by('-date')[:4]  # Latest 4 payments
-    pending_gifts = AgentGift.objects.filter(status='pending').select_related('agent', 'gift').order_by('-date_earned')[:4]  # Latest 4 gifts
-    
-    total_payment_amount = Payment.objects.aggregate(total=Sum('amount'))['total'] or 0
-    total_points_awarded = Payment.objects.aggregate(total=Sum('points'))['total'] or 0
-    
-    # Get total counts for stats
-    total_agents = Agent.objects.count()
-    total_customers = Customer.objects.count()
-    total_projects = Project.objects.count()
-    total_payments = Payment.objects.count()
+    # The five lists and the totals are independent, so they run concurrently;
+    # all totals come from one cached snapshot
+    agents, customers, projects, payments, pending_gifts, stats = await aio.gather_queries(
+        lambda: list(Agent.objects.all().order_by('-id')[:4]),  # Latest 4 agents
+        lambda: list(Customer.objects.select_related('agent').order_by('-id')[:4]),  # Latest 4 customers
+        lambda: list(Project.objects.all().order_by('-id')[:4]),  # Latest 4 projects
+        lambda: list(Payment.objects.select_related('project', 'customer', 'agent').order_by('-date')[:4]),  # Latest 4 payments
+        lambda: list(AgentGift.objects.filter(status='pending').select_related('agent', 'gift').order_by('-date_earned')[:4]),  # Latest 4 gifts
+        get_dashboard_stats,
+    )
     
     context = {
-        "total_agents": total_agents,
-        "total_customers": total_customers,
-        "total_projects": total_projects,
-        "total_payments": total_payments,
+        "total_agents": stats['total_agents'],
+        "total_customers": stats['total_customers'],
+        "total_projects": stats['total_projects'],
+        "total_payments": stats['total_payments'],
         "agents": agents,
         "customers": customers,
         "projects": projects,
         "payments": payments,
         "pending_gifts": pending_gifts,
-        "total_payment_amount": total_payment_amount,
-        "total_points_awarded": total_points_awarded,
-        "show_more_agents": total_agents > 4,
-        "show_more_customers": total_customers > 4,
-        "show_more_projects": total_projects > 4,
-        "show_more_payments": total_payments > 4,
-        "show_more_gifts": AgentGift.objects.filter(status='pending').count() > 4,
+        "total_payment_amount": stats['total_payment_amount'],
+        "total_points_awarded": stats['total_points_awarded'],
+        "show_more_agents": stats['total_agents'] > 4,
+        "show_more_customers": stats['total_customers'] > 4,
+        "show_more_projects": stats['total_projects'] > 4,
+        "show_more_payments": stats['total_payments'] > 4,
+        "show_more_gifts": stats['pending_gifts'] > 4,
     }
-    return render(request, "admin_dashboard.html", context)
-
-
-@login_required(login_url='agent_login')
-def agent_dashboard(request):
-    agent = request.user
-    customers = agent.customers.all()
-    payments = agent.payments.all().order_by('-date')[:10]
-    agent_gifts = agent.agent_gifts.all().order_by('-date_earned')
-    
-    total_payment_amount = agent.payments.aggregate(total=Sum('amount'))['total'] or 0
+    return await aio.render_async(request, "admin_dashboard.html", context)
+
+
+@aio.login_required(login_url='agent_login')
+async def agent_dashboard(request):
+    agent = await request.auser()
+    # Every list is bounded and joins what its template row needs, so the
+    # query count doesn't grow with the agent's customers, payments or gifts.
+    # Lifetime totals are the agent's own counters and per-month ones come
+    # from the rollup, so nothing scans the payments table.
+    monthly_stats = (
+        AgentMonthlyStats.objects.filter(agent=agent).values('month')
+        .annotate(
+            month_amount=Sum('amount'),
+            month_points=Sum('points'),
+            month_payments=Sum('payment_count'),
+            layout_amount=Sum('amount', filter=Q(project_type=Project.TYPE_LAYOUT)),
+            construction_amount=Sum('amount', filter=Q(project_type=Project.TYPE_CONSTRUCTION)),
+        )
+        .order_by('-month')[:12]
+    )
+    customers, payments, agent_gifts, monthly_stats, rank = await aio.gather_queries(
+        lambda: paginate_keyset(agent.customers.all(), '-id', request.GET.get('cursor')),
+        lambda: list(agent.payments.select_related('customer', 'project').order_by('-date')[:10]),
+        lambda: list(agent.agent_gifts.select_related('gift').order_by('-date_earned')),
+        lambda: list(monthly_stats),
+        lambda: agent_rank(agent, month_of(timezone.now())),
+    )
     next_milestone_points = agent.next_milestone()
     
     context = {
         "agent": agent,
         "customers": customers,
+        "page": customers,
+        "page_query": querystring_without_cursor(request),
         "payments": payments,
         "agent_gifts": agent_gifts,
-        "total_customers": customers.count(),
-        "total_payments": payments.count(),
-        "total_payment_amount": total_payment_amount,
+        "total_customers": agent.customer_count,
+        "total_payments": agent.payment_count,
+        "total_payment_amount": agent.total_amount,
+        "monthly_stats": monthly_stats,
+        "rank": rank,
         "next_milestone_points": next_milestone_points,
     }
-    return render(request, "agent_dashboard.html", context)
+    return await aio.render_async(request, "agent_dashboard.html", context)
+
 
+@login_required(login_url='agent_login')
+def leaderboard(request):
+    board = request.GET.get('board', 'overall')
+    limit = settings.LEADERBOARD_SIZE
+    month = month_of(timezone.now())
+    star_level = request.user.star_level
 
-def customer_dashboard(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
+    if board == 'month':
+        try:
+            month = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+        except ValueError:
+            pass
+        rows = [
+            (row['month_rank'], row['month_points'], row['agent_id'])
+            for row in get_monthly(month)['rows'][:limit]
+        ]
+    elif board == 'level':
+        try:
+            star_level = min(max(int(request.GET.get('star_level', star_level)), 0), MAX_STAR_LEVEL)
+        except ValueError:
+            pass
+        rows = ranked_entries(get_board()['levels'].get(star_level, []), limit)
+    else:
+        board = 'overall'
+        rows = ranked_entries(get_board()['overall'], limit)
+
+    # One query for the names of the agents on this page
+    agents = Agent.objects.only('username', 'agent_number', 'star_level').in_bulk(
+        [agent_id for _, _, agent_id in rows]
+    )
+    entries = [
+        {"rank": rank, "points": points, "agent": agents[agent_id]}
+        for rank, points, agent_id in rows
+        if agent_id in agents
+    ]
+
+    context = {
+        "board": board,
+        "entries": entries,
+        "month": month,
+        "star_level": star_level,
+        "star_levels": range(MAX_STAR_LEVEL + 1),
+        "rank": agent_rank(request.user, month_of(timezone.now())),
+    }
+    return render(request, "leaderboard.html", context)
+
+
+async def customer_dashboard(request, customer_id):
+    customer = await aget_object_or_404(Customer, id=customer_id)
     payments = customer.payments.all().order_by('-date')
-    total_amount = payments.aggregate(total=Sum('amount'))['total'] or 0
+    payment_list, = await aio.gather_queries(lambda: list(payments))
     
     context = {
         "customer": customer,
-        "payments": payments,
-        "total_payments": payments.count(),
-        "total_amount": total_amount,
+        "payments": payment_list,
+        # Counters kept on the customer row, not an aggregate over payments
+        "total_payments": customer.payment_count,
+        "total_amount": customer.total_amount,
     }
-    return render(request, "customer_dashboard.html", context)
+    return await aio.render_async(request, "customer_dashboard.html", context)
 
 
 @login_required(login_url='admin-login')
@@ -251,12 +352,91 @@ def add_payment(request):
         except Exception as e:
             messages.error(request, f"Error adding payment: {str(e)}")
     
-    customers = Customer.objects.all()
+    # The options show each customer's agent: join it rather than query per row
+    customers = Customer.objects.select_related('agent')
     projects = Project.objects.all().order_by('name')
     context = {"customers": customers, "projects": projects}
     return render(request, "add_payment.html", context)
 
 
+# Rows shown on a fresh batch entry page, and the most accepted in one submission
+BATCH_ENTRY_ROWS = 10
+BATCH_ENTRY_MAX_ROWS = 200
+
+
+def _batch_rows(post):
+    """The non-blank rows of a batch entry submission."""
+    columns = zip(
+        post.getlist('customer'), post.getlist('project'),
+        post.getlist('amount'), post.getlist('receipt_number'),
+    )
+    rows = []
+    for customer, project, amount, receipt_number in columns:
+        customer, amount, receipt_number = customer.strip(), amount.strip(), receipt_number.strip()
+        if not (customer or amount or receipt_number):
+            continue
+        rows.append({
+            # The customer box takes an id (the suggestions) or an e-mail address
+            'customer_email' if '@' in customer else 'customer_id': customer,
+            'customer': customer,
+            'project_id': project,
+            'amount': amount,
+            'receipt_number': receipt_number,
+        })
+    return rows
+
+
+@login_required(login_url='admin-login')
+def add_payments(request):
+    """Enter many payments at once; they commit in one transaction."""
+    if not request.user.is_staff:
+        messages.error(request, "Access denied. Admin privileges required.")
+        return redirect('admin-login')
+
+    rows = []
+    partial = False
+    if request.method == "POST":
+        rows = _batch_rows(request.POST)
+        partial = request.POST.get('mode') == 'partial'
+        if not rows:
+            messages.error(request, "Enter at least one payment")
+        elif len(rows) > BATCH_ENTRY_MAX_ROWS:
+            messages.error(request, f"Enter at most {BATCH_ENTRY_MAX_ROWS} payments at a time")
+        else:
+            # One query each for customers, projects and receipt numbers
+            payments, _, errors = validate_payment_rows(rows)
+            for row, error in errors:
+                row['error'] = error
+            if errors and not partial:
+                messages.error(request, f"Nothing was saved: {len(errors)} of {len(rows)} rows need fixing")
+            else:
+                try:
+                    with transaction.atomic():
+                        settle_agents(insert_payments(payments))
+                except IntegrityError:
+                    messages.error(request, "A receipt number was used by another entry meanwhile; nothing was saved")
+                else:
+                    invalidate_dashboard_stats()
+                    if payments:
+                        total = sum(payment.amount for payment in payments)
+                        messages.success(request, f"{len(payments)} payments totalling ₹{total} added successfully!")
+                    if not errors:
+                        return redirect('admin-dashboard')
+                    messages.error(request, f"{len(errors)} rows were not saved; fix them below")
+                    rows = [row for row, _ in errors]
+
+    # Re-show the submitted rows (with their errors), padded with blank ones
+    blank_rows = max(BATCH_ENTRY_ROWS - len(rows), 1)
+    context = {
+        "rows": rows,
+        "blank_rows": range(blank_rows),
+        "partial": partial,
+        "customers": Customer.objects.select_related('agent').order_by('name'),
+        "projects": Project.objects.all().order_by('name'),
+    }
+    return render(request, "add_payments.html", context)
+
+
 @login_required(login_url='admin-login')
 def add_project(request):
     if not request.user.is_staff:
@@ -368,9 +548,9 @@ def agent_logout(request):
 
 
 # View All Pages
-@login_required(login_url='admin-login')
-def all_agents(request):
-    if not request.user.is_staff:
+@aio.login_required(login_url='admin-login')
+async def all_agents(request):
+    if not (await request.auser()).is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
     
@@ -379,57 +559,39 @@ def all_agents(request):
     star_level_filter = request.GET.get('star_level', '')
     sort_by = request.GET.get('sort', '-id')
     
-    # Start with all agents
-    agents = Agent.objects.all()
-    
-    # Apply search filter
-    if search_query:
-        agents = agents.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
-        )
+    # Search and star level filter, as in the JSON API
+    agents = filter_agents(Agent.objects.all(), request.GET)
+    sort_field = AGENT_SORTS.get(sort_by, '-id')
     
-    # Apply star level filter
-    if star_level_filter and star_level_filter.isdigit():
-        agents = agents.filter(star_level=int(star_level_filter))
-    
-    # Apply sorting
-    valid_sorts = {
-        'name': 'username',
-        '-name': '-username',
-        'email': 'email',
-        '-email': '-email',
-        'points': 'total_points',
-        '-points': '-total_points',
-        'star': 'star_level',
-        '-star': '-star_level',
-        'id': 'id',
-        '-id': '-id'
-    }
-    sort_field = valid_sorts.get(sort_by, '-id')
-    agents = agents.order_by(sort_field)
+    # ?export=csv|ndjson streams every matching row instead of rendering a page
+    if wants_export(request):
+        return export_response(request, agents, sort_field, AGENT_EXPORT_COLUMNS, 'agents')
     
-    total_agents = agents.count()
-    
-    # Get unique star levels for filter dropdown
-    star_levels = Agent.objects.values_list('star_level', flat=True).distinct().order_by('star_level')
+    # The page, the count and the filter dropdown run concurrently
+    page, (total_agents, count_is_estimate), star_levels = await aio.gather_queries(
+        lambda: paginate_keyset(agents, sort_field, request.GET.get('cursor')),
+        lambda: count_rows(agents, estimate=wants_estimated_count(request)),
+        # Unique star levels for the filter dropdown
+        lambda: list(Agent.objects.values_list('star_level', flat=True).distinct().order_by('star_level')),
+    )
     
     context = {
-        "agents": agents,
+        "agents": page,
         "total_agents": total_agents,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "page_query": querystring_without_cursor(request),
         "search_query": search_query,
         "star_level_filter": star_level_filter,
         "sort_by": sort_by,
         "star_levels": star_levels,
     }
-    return render(request, "all_agents.html", context)
+    return await aio.render_async(request, "all_agents.html", context)
 
 
-@login_required(login_url='admin-login')
-def all_customers(request):
-    if not request.user.is_staff:
+@aio.login_required(login_url='admin-login')
+async def all_customers(request):
+    if not (await request.auser()).is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
     
@@ -438,53 +600,39 @@ def all_customers(request):
     agent_filter = request.GET.get('agent', '')
     sort_by = request.GET.get('sort', '-id')
     
-    # Start with all customers
-    customers = Customer.objects.select_related('agent').all()
-    
-    # Apply search filter
-    if search_query:
-        customers = customers.filter(
-            Q(name__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
-    
-    # Apply agent filter
-    if agent_filter and agent_filter.isdigit():
-        customers = customers.filter(agent_id=int(agent_filter))
-    
-    # Apply sorting
-    valid_sorts = {
-        'name': 'name',
-        '-name': '-name',
-        'email': 'email',
-        '-email': '-email',
-        'agent': 'agent__username',
-        '-agent': '-agent__username',
-        'id': 'id',
-        '-id': '-id'
-    }
-    sort_field = valid_sorts.get(sort_by, '-id')
-    customers = customers.order_by(sort_field)
+    # Search and agent filter, as in the JSON API
+    customers = filter_customers(Customer.objects.select_related('agent'), request.GET)
+    sort_field = CUSTOMER_SORTS.get(sort_by, '-id')
     
-    total_customers = customers.count()
+    # ?export=csv|ndjson streams every matching row instead of rendering a page
+    if wants_export(request):
+        return export_response(request, customers, sort_field, CUSTOMER_EXPORT_COLUMNS, 'customers')
     
-    # Get all agents for filter dropdown
-    agents = Agent.objects.all().order_by('username')
+    # The page, the count and the filter dropdown run concurrently
+    page, (total_customers, count_is_estimate), agents = await aio.gather_queries(
+        lambda: paginate_keyset(customers, sort_field, request.GET.get('cursor')),
+        lambda: count_rows(customers, estimate=wants_estimated_count(request)),
+        # All agents for the filter dropdown
+        lambda: list(Agent.objects.all().order_by('username')),
+    )
     
     context = {
-        "customers": customers,
+        "customers": page,
         "total_customers": total_customers,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "page_query": querystring_without_cursor(request),
         "search_query": search_query,
         "agent_filter": agent_filter,
         "sort_by": sort_by,
         "agents": agents,
     }
-    return render(request, "all_customers.html", context)
+    return await aio.render_async(request, "all_customers.html", context)
 
 
-@login_required(login_url='admin-login')
-def all_projects(request):
-    if not request.user.is_staff:
+@aio.login_required(login_url='admin-login')
+async def all_projects(request):
+    if not (await request.auser()).is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
     
@@ -493,50 +641,40 @@ def all_projects(request):
     project_type_filter = request.GET.get('project_type', '')
     sort_by = request.GET.get('sort', '-id')
     
-    # Start with all projects
-    projects = Project.objects.all()
-    
-    # Apply search filter
-    if search_query:
-        projects = projects.filter(name__icontains=search_query)
-    
-    # Apply project type filter
-    if project_type_filter:
-        projects = projects.filter(project_type=project_type_filter)
-    
-    # Apply sorting
-    valid_sorts = {
-        'name': 'name',
-        '-name': '-name',
-        'type': 'project_type',
-        '-type': '-project_type',
-        'created': 'created_at',
-        '-created': '-created_at',
-        'id': 'id',
-        '-id': '-id'
-    }
-    sort_field = valid_sorts.get(sort_by, '-id')
-    projects = projects.order_by(sort_field)
+    # Search and project type filter, as in the JSON API
+    projects = filter_projects(Project.objects.all(), request.GET)
+    sort_field = PROJECT_SORTS.get(sort_by, '-id')
     
-    total_projects = projects.count()
+    # ?export=csv|ndjson streams every matching row instead of rendering a page
+    if wants_export(request):
+        return export_response(request, projects, sort_field, PROJECT_EXPORT_COLUMNS, 'projects')
+    
+    # The page and the count run concurrently
+    page, (total_projects, count_is_estimate) = await aio.gather_queries(
+        lambda: paginate_keyset(projects, sort_field, request.GET.get('cursor')),
+        lambda: count_rows(projects, estimate=wants_estimated_count(request)),
+    )
     
     # Get unique project types for filter dropdown
-    project_types = Project.PROJECT_TYPES
+    project_types = Project.TYPE_CHOICES
     
     context = {
-        "projects": projects,
+        "projects": page,
         "total_projects": total_projects,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "page_query": querystring_without_cursor(request),
         "search_query": search_query,
         "project_type_filter": project_type_filter,
         "sort_by": sort_by,
         "project_types": project_types,
     }
-    return render(request, "all_projects.html", context)
+    return await aio.render_async(request, "all_projects.html", context)
 
 
-@login_required(login_url='admin-login')
-def all_payments(request):
-    if not request.user.is_staff:
+@aio.login_required(login_url='admin-login')
+async def all_payments(request):
+    if not (await request.auser()).is_staff:
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('admin-login')
     
@@ -546,55 +684,29 @@ def all_payments(request):
     project_filter = request.GET.get('project', '')
     sort_by = request.GET.get('sort', '-date')
     
-    # Start with all payments
-    payments = Payment.objects.select_related('project', 'customer', 'agent').all()
-    
-    # Apply search filter
-    if search_query:
-        payments = payments.filter(
-            Q(customer__name__icontains=search_query) |
-            Q(agent__username__icontains=search_query) |
-            Q(receipt_number__icontains=search_query) |
-            Q(project__name__icontains=search_query)
-        )
+    # Search, agent and project filters, as in the JSON API
+    payments = filter_payments(Payment.objects.select_related('project', 'customer', 'agent'), request.GET)
+    sort_field = PAYMENT_SORTS.get(sort_by, '-date')
     
-    # Apply agent filter
-    if agent_filter and agent_filter.isdigit():
-        payments = payments.filter(agent_id=int(agent_filter))
-    
-    # Apply project filter
-    if project_filter and project_filter.isdigit():
-        payments = payments.filter(project_id=int(project_filter))
-    
-    # Apply sorting
-    valid_sorts = {
-        'customer': 'customer__name',
-        '-customer': '-customer__name',
-        'agent': 'agent__username',
-        '-agent': '-agent__username',
-        'amount': 'amount',
-        '-amount': '-amount',
-        'points': 'points',
-        '-points': '-points',
-        'project': 'project__name',
-        '-project': '-project__name',
-        'date': 'date',
-        '-date': '-date',
-        'id': 'id',
-        '-id': '-id'
-    }
-    sort_field = valid_sorts.get(sort_by, '-date')
-    payments = payments.order_by(sort_field)
+    # ?export=csv|ndjson streams every matching row instead of rendering a page
+    if wants_export(request):
+        return export_response(request, payments, sort_field, PAYMENT_EXPORT_COLUMNS, 'payments')
     
-    total_payments = payments.count()
-    
-    # Get all agents and projects for filter dropdowns
-    agents = Agent.objects.all().order_by('username')
-    projects = Project.objects.all().order_by('name')
+    # The page, the count and the filter dropdowns run concurrently
+    page, (total_payments, count_is_estimate), agents, projects = await aio.gather_queries(
+        lambda: paginate_keyset(payments, sort_field, request.GET.get('cursor')),
+        lambda: count_rows(payments, estimate=wants_estimated_count(request)),
+        # All agents and projects for the filter dropdowns
+        lambda: list(Agent.objects.all().order_by('username')),
+        lambda: list(Project.objects.all().order_by('name')),
+    )
     
     context = {
-        "payments": payments,
+        "payments": page,
         "total_payments": total_payments,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "page_query": querystring_without_cursor(request),
         "search_query": search_query,
         "agent_filter": agent_filter,
         "project_filter": project_filter,
@@ -602,6 +714,56 @@ def all_payments(request):
         "agents": agents,
         "projects": projects,
     }
-    return render(request, "all_payments.html", context)
+    return await aio.render_async(request, "all_payments.html", context)
 
 
+
+
+# Global search
+@login_required(login_url='admin-login')
+def global_search(request):
+    if not request.user.is_staff:
+        messages.error(request, "Access denied. Admin privileges required.")
+        return redirect('admin-login')
+
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    kinds = [kind] if kind in dict(SearchEntry.KIND_CHOICES) else None
+
+    context = {
+        "query": query,
+        "kind": kind,
+        "kind_choices": SearchEntry.KIND_CHOICES,
+        "results": search(query, kinds=kinds, limit=settings.SEARCH_RESULTS_LIMIT),
+    }
+    return render(request, "search.html", context)
+
+
+def search_suggest(request):
+    """Typeahead results for the global search box, as JSON."""
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({"results": []}, status=403)
+    results = search(request.GET.get('q', ''), limit=settings.SEARCH_SUGGEST_LIMIT)
+    return JsonResponse({
+        "results": [
+            {"kind": entry.kind, "title": entry.title, "detail": entry.detail, "url": entry.url}
+            for entry in results
+        ]
+    })
+
+
+def db_pool_stats(request):
+    """Database connection statistics for this worker, and all of the app's connections on PostgreSQL."""
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({"error": "Admin privileges required."}, status=403)
+    db = settings.DATABASES['default']
+    return JsonResponse({
+        "worker": dbpool.snapshot(),
+        "server": dbpool.server_connections(),
+        "config": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "conn_max_age": db.get('CONN_MAX_AGE', 0),
+            "health_checks": db.get('CONN_HEALTH_CHECKS', False),
+            "async_query_threads": settings.ASYNC_QUERY_THREADS,
+        },
+    })
@@ -58,6 +58,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it times the whole stack; removes itself unless REQUEST_PROFILING is on
+    'realestate.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,7 +73,8 @@ ROOT_URLCONF = 'realestate_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, plus render timing for the request profiler
+        'BACKEND': 'realestate.profiling.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'realestate' / 'templates'],  # add this
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,26 +92,51 @@ WSGI_APPLICATION = 'realestate_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# The realestate.backends engines are Django's own, plus connection
+# statistics for /ops/db-pool/ (realestate/dbpool.py).
+# SERVER_MODE is how start.sh and gunicorn.conf.py serve the app: 'wsgi' or 'asgi'.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
 if os.getenv("USE_SQLITE", "false").lower() == "true":
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'realestate.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
 else:
+    # Production profile: each gunicorn thread keeps its connection for
+    # DB_CONN_MAX_AGE seconds and checks it is alive before reusing it;
+    # gunicorn.conf.py keeps workers × threads within DB_POOL_SIZE. Under
+    # ASGI every request runs on a fresh thread, so a kept connection would
+    # never be reused; connections are closed per request there instead
+    # (put PgBouncer in front to pool them).
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'realestate.backends.postgresql',
             'NAME': os.getenv('DB_NAME'),
             'USER': os.getenv('DB_USER'),
             'PASSWORD': os.getenv('DB_PASSWORD'),
             'HOST': os.getenv('DB_HOST', 'localhost'),
-            'PORT': '5432',
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if SERVER_MODE == 'asgi' else int(os.getenv('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction mode can't keep the server-side
+            # cursors the list exports stream through
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+                # Names this app's sessions in pg_stat_activity
+                'application_name': os.getenv('DB_APPLICATION_NAME', 'realestate'),
+                # Notice dead peers (e.g. after a failover) on idle kept connections
+                'keepalives': 1,
+                'keepalives_idle': 60,
+            },
         }
     }
 
-
+# Connections this deployment may hold open at once, across every worker;
+# gunicorn.conf.py derives the worker count from it.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
 
 
 AUTH_USER_MODEL = 'realestate.Agent'
@@ -116,6 +144,99 @@ LOGIN_URL = '/agent-login/'
 LOGIN_REDIRECT_URL = '/agent-dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
+# "View All" list pages: rows per keyset page, and whether the header total
+# is an exact COUNT(*) ('exact') or the PostgreSQL planner estimate ('estimate').
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '50'))
+LIST_COUNT_MODE = os.getenv('LIST_COUNT_MODE', 'exact')
+# Rows fetched per server-side cursor round trip when streaming list exports
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+# Largest ?limit= the JSON API accepts
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '200'))
+
+
+# Cache
+# Set REDIS_URL so every gunicorn worker shares one cache (and sees the same
+# invalidations); otherwise each process keeps its own in-memory copy.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Admin dashboard totals are invalidated on every relevant write; the TTL
+# only bounds staleness for writes that bypass the model signals.
+DASHBOARD_STATS_TTL = int(os.getenv('DASHBOARD_STATS_TTL', '3600'))
+# Leaderboard standings are moved in place on each points change; the TTL
+# bounds drift between per-process caches when REDIS_URL is not set.
+LEADERBOARD_TTL = int(os.getenv('LEADERBOARD_TTL', '600'))
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', '50'))
+
+# Gifts above an agent's level after their PV drops (a payment deleted or
+# reduced): 'revoke_pending' withdraws the undelivered ones, 'keep' leaves them.
+UNEARNED_GIFT_POLICY = os.getenv('UNEARNED_GIFT_POLICY', 'revoke_pending')
+# Seconds a process reuses its copy of the gift catalog; gift edits drop the
+# copy of the process that made them at once, and the TTL bounds the others.
+GIFT_CATALOG_TTL = int(os.getenv('GIFT_CATALOG_TTL', '300'))
+
+# Global search: rows on the results page, and in the typeahead dropdown
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', '50'))
+SEARCH_SUGGEST_LIMIT = int(os.getenv('SEARCH_SUGGEST_LIMIT', '8'))
+
+# Public marketing pages (realestate/pagecache.py): seconds a rendered page
+# is reused, and the browser max-age (0 = always revalidate, answered by a 304)
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '86400'))
+PAGE_CACHE_MAX_AGE = int(os.getenv('PAGE_CACHE_MAX_AGE', '0'))
+# Cached pages are keyed on the release, so a deploy never serves the last
+# one's pages; defaults to a hash of the templates and the static manifest
+PAGE_CACHE_RELEASE = os.getenv('RELEASE_VERSION', '')
+
+# Background jobs (realestate/jobs.py). Deployments queue payment side effects
+# for `manage.py run_workers` (the Procfile's worker process, or start.sh) so
+# requests return at once. JOBS_EAGER runs them inline in the request's
+# transaction instead: the default under DEBUG, and in the tests.
+JOBS_EAGER = os.getenv('JOBS_EAGER', str(DEBUG)).lower() == 'true'
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+# Retry n waits JOB_RETRY_BASE_SECONDS × 2^(n-1), at most JOB_RETRY_MAX_SECONDS
+JOB_RETRY_BASE_SECONDS = int(os.getenv('JOB_RETRY_BASE_SECONDS', '10'))
+JOB_RETRY_MAX_SECONDS = int(os.getenv('JOB_RETRY_MAX_SECONDS', '3600'))
+# A job running longer than this is assumed orphaned by a dead worker and requeued
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '600'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+
+# Worker threads (each with its own DB connection) that the async dashboard
+# and list views spread their independent queries over; 0 runs them in turn
+ASYNC_QUERY_THREADS = int(os.getenv('ASYNC_QUERY_THREADS', '4'))
+
+
+# Request profiling (realestate/profiling.py): Server-Timing header on every
+# response, and a JSON log line for requests over either threshold.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'false').lower() == 'true'
+REQUEST_PROFILING_SLOW_MS = float(os.getenv('REQUEST_PROFILING_SLOW_MS', '500'))
+REQUEST_PROFILING_MAX_QUERIES = int(os.getenv('REQUEST_PROFILING_MAX_QUERIES', '50'))
+# Identical statements run this many times in one request are reported as N+1 suspects
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = int(os.getenv('REQUEST_PROFILING_DUPLICATE_THRESHOLD', '3'))
+REQUEST_PROFILING_TOP_QUERIES = int(os.getenv('REQUEST_PROFILING_TOP_QUERIES', '5'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'realestate.profiling': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'realestate.jobs': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 
 # Password validation
@@ -158,6 +279,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Ensure staticfiles directory exists
 os.makedirs(STATIC_ROOT, exist_ok=True)
 
-# Add whitenoise middleware for static files
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+# Bootstrap, Font Awesome and the shared app.css are served from
+# realestate/static. collectstatic writes content-hashed copies plus gzip and
+# brotli versions, which WhiteNoise serves with far-future immutable cache
+# headers. DEBUG has no manifest, so it uses the plain names (as do the tests,
+# through TEST_RUNNER).
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Runs the tests with the plain static storage: they render pages without collectstatic
+TEST_RUNNER = 'realestate_project.test_runner.TestRunner'
+
+# Add whitenoise middleware for static files (after the profiler and SecurityMiddleware)
+MIDDLEWARE.insert(2, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
@@ -0,0 +1,37 @@
+"""
+Test runner for ``manage.py test``.
+
+Tests render pages without running collectstatic first, so there is no
+manifest for the hashed static storage to read; the whole run uses the
+plain storage instead. Jobs run eagerly, so a test sees a payment's side
+effects as soon as it is saved; tests of the queue turn JOBS_EAGER off
+themselves. Other runners (pytest-django, IDEs) should apply
+``TEST_SETTINGS`` the same way.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+PLAIN_STATIC_STORAGES = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+TEST_SETTINGS = {
+    'STORAGES': PLAIN_STATIC_STORAGES,
+    'JOBS_EAGER': True,
+}
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -23,6 +23,14 @@ except Exception as e:
 echo "📊 Running migrations..."
 python manage.py migrate
 
+# Collect static files (hashed and compressed for WhiteNoise)
+echo "📦 Collecting static files..."
+python manage.py collectstatic --noinput
+
+# Cached public pages embed the previous deploy's asset URLs
+echo "🧹 Purging page cache..."
+python manage.py purge_page_cache
+
 # Setup gifts
 echo "🎁 Setting up gifts..."
 python manage.py setup_gifts
@@ -31,6 +39,16 @@ python manage.py setup_gifts
 echo "👤 Creating admin user..."
 python manage.py createsu
 
-# Start server
+# Payment side effects are queued for a job worker unless JOBS_EAGER=true
+if [ "$JOBS_EAGER" != "true" ]; then
+    echo "👷 Starting job workers..."
+    python manage.py run_workers &
+fi
+
+# Start server: workers, threads and worker class come from gunicorn.conf.py
+# (SERVER_MODE=asgi serves through uvicorn workers)
 echo "🎉 Starting web server..."
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn realestate_project.asgi:application --bind 0.0.0.0:$PORT
+fi
 exec gunicorn realestate_project.wsgi:application --bind 0.0.0.0:$PORT